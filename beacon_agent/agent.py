@@ -1,102 +1,612 @@
+import asyncio
 import json
 import logging
+import threading
 import time
+from urllib.parse import urlencode
 
 import requests
 
 from beacon_agent import AGENT_VERSION
+from . import async_http
 from .agent_config import AgentConfig
-from .custom_logging import CustomLogging
+from .cadence_controller import CadenceController
+from .config_watcher import ConfigWatcher
+from .custom_logging import CustomLogging, LazyJson
+from .kuma_message import KumaMessage
+from .process_reader import ProcessReader
+from .self_monitor import SelfMonitor
+from .status_server import StatusServer
 from .system_metrics_reader import SystemMetricsReader
+from .systemd_notifier import SystemdNotifier
+from .tick_scheduler import TickScheduler
 
 
 class BeaconAgent:
-    def __init__(self, config_file):
+    # the connect and read timeout of a push, far below the watchdog interval, so that an unreachable UptimeKuma does
+    # not get the agent killed by systemd
+    PUSH_TIMEOUT = (5, 10)
+
+    def __init__(self, config_file, collectors=None, log_level=None, read_only_state=False):
+        """
+        Args:
+        config_file (str): The path of the config file
+        collectors (list): Optional names of the only collectors to initialise, e.g. for a one-shot run
+        log_level (str): Optional log level, overriding the configured level
+        read_only_state (bool): Only read the state files of the readers, e.g. for a one-shot run next to the daemon
+        """
 
         custom_logging = CustomLogging()
-        custom_logging.configure_logging()
+        custom_logging.configure_logging(level=log_level)
 
         logging.info(f"Initializing Beacon Agent {AGENT_VERSION} with config file {config_file}")
 
-        try:
-            with open(config_file, 'r') as file:
-                config_json = json.load(file)
-            logging.info(f"Read config file: {config_file}")
-        except FileNotFoundError:
-            logging.error(f"Config file does not exist at {config_file}!")
-            exit(1)
-
-        self.config = AgentConfig(config_json)
+        self.config_file = config_file
+        self.config = self.load_config(config_file)
+        if read_only_state:
+            self.config.config.setdefault('agent', {})['read_only_state'] = True
+        custom_logging.configure_logging(self.config, level=log_level)
+        self._apply_agent_config(self._agent_settings(self.config))
 
-        self.api_type = self.config.get_config_value(['agent', 'api_type'])
-        self.api_url = self.config.get_config_value(['agent', 'api_url'])
-        self.api_key = self.config.get_config_value(['agent', 'api_key'])
-
-        self.refresh_interval_seconds = self.config.get_config_value(['agent', 'refresh_interval_seconds'], default=10)
-        self.notify_delay_seconds = self.config.get_config_value(['agent', 'notify_delay_minutes'], default=10) * 60
-        self.notify_threshold_percent = self.config.get_config_value(['agent', 'notify_threshold_percent'], default=90)
-        self.system_metrics_reader = SystemMetricsReader(self.config)
+        self.engine = self.config.get_config_value(['agent', 'engine'], default='blocking')
+        self.scheduler = TickScheduler(self.refresh_interval_seconds,
+                                       self.config.get_config_value(['agent', 'tick_jitter_seconds'], default=0))
+        self.status_socket = self.config.get_config_value(['agent', 'status_socket'],
+                                                          default='/run/beacon-agent/status.sock')
+        self.watch_config = self.config.get_config_value(['agent', 'watch_config'], default=True)
+        self.system_metrics_reader = SystemMetricsReader(self.config, collectors)
+        self.cadence = CadenceController(self.config, SystemMetricsReader.COLLECTORS)
+        self.self_monitor = SelfMonitor()
+        # the tick loop pings the watchdog while sleeping and after every collector, a hung collector stops the pings
+        self.notifier = SystemdNotifier()
+        self.scheduler.set_heartbeat(self.notifier.ping, self.notifier.watchdog_interval)
+        self.system_metrics_reader.on_collected = lambda name: self.notifier.ping()
+        self.status_server = None
+        self.status_task = None
+        self.config_watcher = None
+        # set when a reload replaced readers, so that the engines register the new event sources
+        self.event_sources_changed = False
+        self.streams = []
+        self.registered_fds = []
+        self.updated_at = None
+        self.last_evaluation = None
         self.last_notify_time = 0
         self.previous_threshold_nok = False
+        # the message of the latest evaluation, which the heartbeat pushes while the collectors refresh the metrics
+        self.snapshot_message = None
+        self.heartbeat_worker = None
+        self.push_lock = threading.Lock()
+        # the same for the heartbeat task and the tick loop of the asyncio engine, created in its event loop
+        self.async_push_lock = None
         self.metrics = {}
         self.latency = 0
+        self.wake_event = None
+        # the collectors to refresh due to events since the last refresh, None for all collectors
+        self.pending_collectors = set()
+        self.pending_push = False
 
         logging.info(
             f"Refreshing metrics every {self.refresh_interval_seconds}s, notifying if a threshold reaches {self.notify_threshold_percent}%, or after {self.notify_delay_seconds}s")
 
+    @staticmethod
+    def _agent_settings(config):
+        """
+        Reads the settings of the agent itself, which can be changed by a reload.
+
+        Returns:
+        dict: The attributes of the agent to set
+        """
+        notify_delay_seconds = config.get_config_value(['agent', 'notify_delay_minutes'], default=10) * 60
+        return {
+            'api_type': config.get_config_value(['agent', 'api_type']),
+            'api_url': config.get_config_value(['agent', 'api_url']),
+            'api_key': config.get_config_value(['agent', 'api_key']),
+            'kuma_method': config.get_config_value(['agent', 'kuma_method'], default='GET').upper(),
+            'kuma_max_message_bytes': config.get_config_value(['agent', 'kuma_max_message_bytes'], default=1024),
+            'refresh_interval_seconds': config.get_config_value(['agent', 'refresh_interval_seconds'], default=10),
+            'notify_delay_seconds': notify_delay_seconds,
+            'notify_threshold_percent': config.get_config_value(['agent', 'notify_threshold_percent'], default=90),
+            'pressure_replaces_percent': config.get_config_value(['pressure', 'replace_percent_checks'],
+                                                                 default=False),
+            # by default the latest state is pushed as often as without a change, also while a collector hangs
+            'heartbeat_interval_seconds': config.get_config_value(['agent', 'heartbeat_interval_seconds'],
+                                                                  default=notify_delay_seconds),
+            # seconds, or a map of collector names and a default to seconds, 0 for 3 times the interval of a collector
+            'max_staleness_seconds': config.get_config_value(['agent', 'max_staleness_seconds'], default=0),
+        }
+
+    def _apply_agent_config(self, settings):
+        for name, value in settings.items():
+            setattr(self, name, value)
+
+    def reload_config(self):
+        """
+        Reads the config file again and applies the changes without a restart. Only the readers whose config
+        sections changed are re-created, all other readers keep their state. If the file can not be read or the new
+        configuration is invalid, the current configuration is kept.
+
+        Returns:
+        list: The collectors to refresh with the new configuration
+        """
+        try:
+            with open(self.config_file, 'r') as file:
+                config = AgentConfig(json.load(file))
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to reload config file {self.config_file}, keeping the current configuration: {e}")
+            return []
+
+        old_config = self.config
+        if not any(old_config.differs(config, [section]) for section in set(old_config.config) | set(config.config)):
+            logging.info(f"Config file {self.config_file} is unchanged")
+            return []
+
+        # everything which can fail is prepared first, the readers are replaced last, so that an invalid
+        # configuration, e.g. a missing api_url, leaves the agent unchanged
+        try:
+            settings = self._agent_settings(config)
+            jitter_seconds = config.get_config_value(['agent', 'tick_jitter_seconds'], default=0)
+            cadence = CadenceController(config, SystemMetricsReader.COLLECTORS)
+            collectors = self.system_metrics_reader.reload(old_config, config)
+        except Exception as e:
+            logging.error(f"Failed to apply config file {self.config_file}, keeping the current configuration: "
+                          f"{type(e).__name__}: {e}")
+            return []
+
+        self.config = config
+        if old_config.differs(config, ['agent', 'logging']):
+            CustomLogging().configure_logging(config)
+        self._apply_agent_config(settings)
+        self.scheduler.jitter_seconds = jitter_seconds
+        cadence.last_run = self.cadence.last_run
+        self.cadence = cadence
+        self.scheduler.set_interval(self.refresh_interval_seconds)
+        self._start_heartbeat()
+        for key, value in (('engine', self.engine), ('status_socket', self.status_socket),
+                           ('watch_config', self.watch_config)):
+            if old_config.differs(config, ['agent', key]):
+                logging.warning(f"Changing {key} of the agent requires a restart, still using {value}")
+
+        if collectors:
+            self.event_sources_changed = True
+        logging.info(f"Reloaded config file {self.config_file}, refreshing every {self.refresh_interval_seconds}s, "
+                     f"notifying if a threshold reaches {self.notify_threshold_percent}%, or after "
+                     f"{self.notify_delay_seconds}s")
+        return collectors
+
+    @staticmethod
+    def load_config(config_file):
+        try:
+            with open(config_file, 'r') as file:
+                config_json = json.load(file)
+            logging.info(f"Read config file: {config_file}")
+        except FileNotFoundError:
+            logging.error(f"Config file does not exist at {config_file}!")
+            exit(1)
+
+        return AgentConfig(config_json)
+
     @staticmethod
     def has_smart_critical_warning(item):
         key, disk = item
         return "smart_health_status" in disk and disk["smart_health_status"] != 'OK'
 
+    @staticmethod
+    def has_smart_trend_degrading(item):
+        key, disk = item
+        return isinstance(disk, dict) and disk.get("smart_trend_status") == 'DEGRADING'
+
     @staticmethod
     def is_container_not_running(item):
         key, containers = item
         running_elements = list(filter(lambda element: element["state"] != "running", containers))
         return running_elements is not None and len(running_elements) > 0
 
+    @staticmethod
+    def is_container_failing(item):
+        key, containers = item
+        return any(container.get('failures') for container in containers)
+
+    @staticmethod
+    def has_container_threshold_reached(item):
+        key, containers = item
+        return any(element.get("thresholds_reached") for element in containers)
+
     @staticmethod
     def is_vm_lxc_not_running(vm_lxc):
         return vm_lxc['status'] != "running"
 
-    def _read_metrics(self):
-        start = time.time()
-        self.metrics = self.system_metrics_reader.get_system_metrics()
-        self.metrics["version"] = AGENT_VERSION
-        self.latency = round(time.time() - start, 3)
+    def _read_metrics(self, collectors=None):
+        start = time.monotonic()
+        collectors = self._due_collectors(collectors)
+        self._complete_metrics(self.system_metrics_reader.get_system_metrics(collectors), start)
+
+    async def _read_metrics_async(self, collectors=None):
+        start = time.monotonic()
+        collectors = self._due_collectors(collectors)
+        self._complete_metrics(await self.system_metrics_reader.get_system_metrics_async(collectors), start)
+
+    def _due_collectors(self, collectors):
+        # a tick runs the collectors which are due, an event the collectors it requested
+        if collectors is None:
+            collectors = self.cadence.due_collectors()
+        self.cadence.record_run(collectors)
+        return collectors
+
+    def _complete_metrics(self, metrics, start):
+        # the metrics are completed before they replace the previous ones, the status server thread reads them
+        if self.cadence.enabled:
+            self.scheduler.set_interval(
+                self.cadence.update(metrics, check_percent=not self._percent_checks_replaced(metrics)))
+            metrics["cadence"] = self.cadence.get_stats()
+        metrics["version"] = AGENT_VERSION
+        metrics["scheduler"] = self.scheduler.get_stats()
+        self.latency = round(time.monotonic() - start, 3)
+        self.self_monitor.record_latency(self.latency)
+        metrics["agent"] = self.self_monitor.get_stats(self.scheduler.overrun_count)
+        metrics["sections"] = self._section_ages()
+        self.metrics = metrics
+        self.updated_at = time.time()
+        self.notifier.ping()
         logging.info(f"Metrics refresh took {self.latency}s")
 
+    def run(self):
+        """Runs the agent with the configured engine, either blocking or asyncio"""
+        try:
+            if self.engine == 'asyncio':
+                asyncio.run(self.monitor_system_async())
+            else:
+                if self.engine != 'blocking':
+                    logging.error(f"Unknown engine {self.engine}! Using blocking engine!")
+                self.monitor_system()
+        finally:
+            if self.status_server is not None:
+                self.status_server.close()
+            self.notifier.stopping()
+
+    def run_once(self, collectors=None, output_format='json', push=False):
+        """
+        Runs the given collectors, or all collectors, once and concurrently, prints the result and optionally pushes
+        it, e.g. for cron or an external monitoring system.
+
+        Args:
+        collectors (list): The names of the collectors to run, None for all collectors
+        output_format (str): json, or nagios for a single line with performance data
+        push (bool): Whether to push the result to the configured api_url
+
+        Returns:
+        int: The exit code of a Nagios plugin: 0 OK, 1 WARNING, 2 CRITICAL, 3 UNKNOWN
+        """
+        try:
+            message, error_msg = asyncio.run(self._run_once_async(collectors, push))
+        except Exception as e:
+            logging.exception("One-shot collection failed")
+            print(f"BEACON UNKNOWN - {e}" if output_format == 'nagios' else json.dumps({'error': str(e)}))
+            return 3
+
+        severity = message.highest_severity()
+        exit_code = {KumaMessage.CRITICAL: 2, KumaMessage.WARNING: 1}.get(severity, 0)
+        text = message.build().strip() or "No findings"
+        if output_format == 'nagios':
+            label = {0: 'OK', 1: 'WARNING', 2: 'CRITICAL'}[exit_code]
+            print(f"BEACON {label} - {text}{self._perfdata()}")
+        else:
+            print(json.dumps({'status': message.status(), 'exit_code': exit_code, 'message': text,
+                              'metrics': self.metrics}, indent=2, default=str))
+        return exit_code
+
+    async def _run_once_async(self, collectors, push):
+        await self._read_metrics_async(collectors)
+        _, error_msg = self._threshold_reached()
+        if push:
+            await self.send_metrics_async(error_msg)
+        return self._kuma_message(error_msg), error_msg
+
+    def _perfdata(self):
+        perfdata = []
+        if 'cpu_load_percent' in self.metrics:
+            perfdata.append(f"cpu={self.metrics['cpu_load_percent']}%;{self.notify_threshold_percent}")
+            perfdata.append(f"memory={self.metrics['memory_info']['percent']}%;{self.notify_threshold_percent}")
+        for fs in self.metrics.get('disk_usage', []):
+            perfdata.append(f"'{fs['mount_point']}'={fs['used_percent']}%;{self.notify_threshold_percent}")
+        if 'load_avg' in self.metrics:
+            perfdata.append(f"load1={self.metrics['load_avg']['1_min']}")
+        return f" | {' '.join(perfdata)}" if perfdata else ""
+
     def monitor_system(self):
         logging.info(f"Beacon-Agent started and refreshing system state every {self.refresh_interval_seconds}s")
+        if self._create_status_server():
+            self.status_server.serve_in_thread()
 
         # Send metrics once on startup
         self._read_metrics()
-        self.send_metrics()
+        # ready before the push, an unreachable UptimeKuma must not exceed the start timeout of systemd
+        self.notifier.ready(f"Refreshing every {self.refresh_interval_seconds}s")
+        _, error_msg = self._notify_required(force=True)
+        self.send_metrics(error_msg)
         logging.info(f"Initial system state sent.")
+        self._start_heartbeat()
 
+        event_sources = self._event_sources()
+        self.scheduler.start()
         while True:
-            self._read_metrics()
+            if self.event_sources_changed:
+                event_sources = self._event_sources()
+            woken = self.scheduler.sleep(event_sources)
+            if woken:
+                event_source, reason = woken
+                self._on_collector_event(reason, event_source.refresh_collectors, event_source.push_immediately)
+
+            collectors, push = self._take_pending_refresh(woken is not None)
+            self._read_metrics(collectors)
 
-            last_notify_delay = time.time() - self.last_notify_time
-            threshold_reached, error_msg = self._threshold_reached()
-            if error_msg or last_notify_delay > self.notify_delay_seconds or threshold_reached or (
-                    not threshold_reached and self.previous_threshold_nok):
-                self.previous_threshold_nok = threshold_reached
+            notify, error_msg = self._notify_required(force=push)
+            if notify:
                 self.send_metrics(error_msg)
-            time.sleep(self.refresh_interval_seconds)
 
-    def _threshold_reached(self) -> tuple[bool, list]:
-        cpu_threshold = self.metrics['cpu_load_percent'] > self.notify_threshold_percent
-        memory_threshold = self.metrics['memory_info']['percent']
+    async def monitor_system_async(self):
+        """
+        The asyncio engine: all collectors run as coroutines and together with the event streams of the readers
+        share a single event loop in a single thread. An event from a stream triggers an immediate refresh.
+        """
+        logging.info(f"Beacon-Agent started with asyncio engine and refreshing system state every "
+                     f"{self.refresh_interval_seconds}s")
+
+        self.wake_event = asyncio.Event()
+        self.async_push_lock = asyncio.Lock()
+        if self._create_status_server():
+            self.status_task = asyncio.create_task(self.status_server.serve_async())
+        self._register_event_sources_async()
+
+        try:
+            # Send metrics once on startup
+            await self._read_metrics_async()
+            # ready before the push, an unreachable UptimeKuma must not exceed the start timeout of systemd
+            self.notifier.ready(f"Refreshing every {self.refresh_interval_seconds}s")
+            _, error_msg = self._notify_required(force=True)
+            await self.send_metrics_async(error_msg)
+            logging.info(f"Initial system state sent.")
+            self._start_heartbeat()
+
+            self.scheduler.start()
+            while True:
+                woken = await self.scheduler.sleep_async(self.wake_event)
+
+                collectors, push = self._take_pending_refresh(woken)
+                await self._read_metrics_async(collectors)
+
+                notify, error_msg = self._notify_required(force=push)
+                if notify:
+                    await self.send_metrics_async(error_msg)
+        finally:
+            if self.heartbeat_worker is not None:
+                self.heartbeat_worker.cancel()
+                self.heartbeat_worker = None
+            self._unregister_event_sources_async()
+            if self.status_task is not None:
+                self.status_task.cancel()
+                self.status_task = None
+            if self.config_watcher is not None:
+                self.config_watcher.close()
+
+    def _start_heartbeat(self):
+        """
+        Starts pushing the latest evaluation every heartbeat_interval_seconds, independently of the collectors, so
+        that a slow or hung collector does not get the host marked down. The asyncio engine runs the heartbeat as a
+        task, the blocking engine in a daemon thread.
+        """
+        if not self.heartbeat_interval_seconds or self.heartbeat_worker is not None:
+            return
+        if self.engine == 'asyncio':
+            self.heartbeat_worker = asyncio.get_running_loop().create_task(self._heartbeat_async())
+        else:
+            self.heartbeat_worker = threading.Thread(target=self._heartbeat, name='heartbeat', daemon=True)
+            self.heartbeat_worker.start()
+        logging.info(f"Pushing the latest state at least every {self.heartbeat_interval_seconds}s")
+
+    def _heartbeat_delay(self):
+        """Returns the seconds until the next heartbeat is due, or None if it is due now"""
+        if not self.heartbeat_interval_seconds:
+            # disabled by a reload, check again later
+            return self.refresh_interval_seconds
+        delay = self.heartbeat_interval_seconds - (time.monotonic() - self.last_notify_time)
+        if delay > 0 or self.snapshot_message is None:
+            return max(delay, 1)
+        return None
+
+    def _heartbeat(self):
+        while True:
+            delay = self._heartbeat_delay()
+            if delay is not None:
+                time.sleep(delay)
+                continue
+            status, kuma_text = self._finish_kuma_message(self.snapshot_message.copy())
+            if self.api_type == 'UptimeKuma':
+                # a push of the tick loop in progress is just as recent
+                self._push_to_uptime_kuma(status, kuma_text, wait=False)
+            else:
+                logging.info(f"Simulated heartbeat with status {status}: {kuma_text}")
+            self.last_notify_time = time.monotonic()
+
+    async def _heartbeat_async(self):
+        while True:
+            delay = self._heartbeat_delay()
+            if delay is not None:
+                await asyncio.sleep(delay)
+                continue
+            status, kuma_text = self._finish_kuma_message(self.snapshot_message.copy())
+            if self.api_type == 'UptimeKuma':
+                # a push of the tick loop in progress is just as recent
+                await self._push_to_uptime_kuma_async(status, kuma_text, wait=False)
+            else:
+                logging.info(f"Simulated heartbeat with status {status}: {kuma_text}")
+            self.last_notify_time = time.monotonic()
+
+    def _max_staleness(self, name):
+        max_staleness = self.max_staleness_seconds
+        if isinstance(max_staleness, dict):
+            max_staleness = max_staleness.get(name, max_staleness.get('default'))
+        if max_staleness:
+            return max_staleness
+        # by default a collector may miss two runs
+        interval = self.cadence.collector_interval(name) if self.cadence.enabled else self.refresh_interval_seconds
+        return max(60, 3 * interval)
+
+    def _section_ages(self):
+        """
+        Returns the age of the metrics of each collector which reports any, and the maximum age before they are
+        stale. The metrics of a collector age while it is slow, hung or its circuit breaker is open.
+        """
+        now = time.time()
+        fragment_keys = self.system_metrics_reader.fragment_keys
+        # copied, the heartbeat thread reads the timings while the collectors update them
+        timings = list(self.system_metrics_reader.collector_timings.items())
+        return {name: {'age_seconds': round(now - timing['collected_at'], 1),
+                       'max_age_seconds': self._max_staleness(name)}
+                for name, timing in timings if fragment_keys.get(name)}
+
+    def _stale_sections(self):
+        return {name: section for name, section in self._section_ages().items() if
+                section['age_seconds'] > section['max_age_seconds']}
+
+    def _event_sources(self):
+        self.event_sources_changed = False
+        event_sources = self.system_metrics_reader.event_sources()
+        if self.config_watcher is None:
+            self.config_watcher = ConfigWatcher(self.config_file, self.reload_config, self.watch_config)
+        event_sources.append(self.config_watcher)
+        return event_sources
+
+    def _create_status_server(self):
+        """
+        Creates the status server, which is served independently of the tick, so that the status can be queried while
+        a collector is busy. Returns True if it listens.
+        """
+        if self.status_socket:
+            self.status_server = StatusServer(self.status_socket, self.get_status)
+        return self.status_server is not None and self.status_server.socket is not None
+
+    def _register_event_sources_async(self):
+        loop = asyncio.get_running_loop()
+        self.streams = [asyncio.create_task(stream) for stream in
+                        self.system_metrics_reader.event_streams(self._on_collector_event)]
+        # the descriptors are remembered, as a reader which was replaced by a reload has already closed its own
+        self.registered_fds = []
+        for event_source in self._event_sources():
+            loop.add_reader(event_source.fileno(), self._on_event_source_readable, event_source)
+            self.registered_fds.append(event_source.fileno())
+
+    def _unregister_event_sources_async(self):
+        loop = asyncio.get_running_loop()
+        for stream in self.streams:
+            stream.cancel()
+        for fd in self.registered_fds:
+            loop.remove_reader(fd)
+
+    def get_status(self, collector=None):
+        """
+        Returns the latest metrics, their evaluation and the collector timings, without running any collector.
+
+        Args:
+        collector (str): Optional name of a collector, to return only its metrics and timing
+
+        Returns:
+        dict: The status, as served on the status socket
+        """
+        # copied, the status is serialized by the status thread while the tick loop updates the timings
+        timings = dict(self.system_metrics_reader.collector_timings)
+        status = {'version': AGENT_VERSION, 'engine': self.engine, 'updated_at': self.updated_at,
+                  'collector': collector}
+        if collector is None:
+            status['metrics'] = self.metrics
+            status['collectors'] = timings
+            status['sections'] = self._section_ages()
+            if self.last_evaluation is not None:
+                kuma_status, kuma_text = self._build_kuma_message(self.last_evaluation['error_msg'])
+                status['evaluation'] = dict(self.last_evaluation, status=kuma_status, message=kuma_text)
+            return status
+
+        if collector not in SystemMetricsReader.COLLECTORS:
+            raise KeyError(collector)
+        status['metrics'] = {key: self.metrics[key] for key in
+                             self.system_metrics_reader.fragment_keys.get(collector, []) if key in self.metrics}
+        status['collectors'] = {collector: timings[collector]} if collector in timings else {}
+        return status
+
+    def _on_event_source_readable(self, event_source):
+        reason = event_source.handle_events()
+        if self.event_sources_changed:
+            self._unregister_event_sources_async()
+            self._register_event_sources_async()
+        if reason:
+            self._on_collector_event(reason, event_source.refresh_collectors, event_source.push_immediately)
+
+    def _on_collector_event(self, reason, collectors=None, push=False):
+        """
+        Requests an immediate refresh of the given collectors, or of all collectors if None, and optionally an
+        immediate push of the refreshed state.
+        """
+        logging.info(f"{reason}, refreshing {', '.join(collectors) if collectors else 'system state'} now")
+        if collectors is None or self.pending_collectors is None:
+            self.pending_collectors = None
+        else:
+            self.pending_collectors.update(collectors)
+        self.pending_push = self.pending_push or push
+        if self.wake_event is not None:
+            self.wake_event.set()
+
+    def _take_pending_refresh(self, woken):
+        """
+        Returns the collectors to refresh, None for all collectors, and whether to push immediately. A due tick
+        always refreshes all collectors, a wake up by an event only the collectors requested by the events.
+        """
+        collectors = sorted(self.pending_collectors) if woken and self.pending_collectors else None
+        push = woken and self.pending_push
+        self.pending_collectors = set()
+        self.pending_push = False
+        return collectors, push
+
+    def _notify_required(self, force=False):
+        last_notify_delay = time.monotonic() - self.last_notify_time
+        threshold_reached, error_msg = self._threshold_reached()
+        self.last_evaluation = {'threshold_reached': bool(threshold_reached), 'error_msg': error_msg}
+        self.snapshot_message = self._kuma_message(error_msg)
+        if force or error_msg or last_notify_delay > self.notify_delay_seconds or threshold_reached or (
+                not threshold_reached and self.previous_threshold_nok):
+            self.previous_threshold_nok = threshold_reached
+            return True, error_msg
+        return False, error_msg
+
+    def _percent_checks_replaced(self, metrics=None):
+        # with the stall thresholds of the pressure collector, high CPU or memory usage alone is not a problem
+        return self.pressure_replaces_percent and 'pressure' in (self.metrics if metrics is None else metrics)
 
-        most_filled_fs = max(self.metrics['disk_usage'], key=lambda x: x['used_percent'])
+    def _usage_thresholds(self):
+        """
+        Returns the CPU and memory usage to check against the threshold, and the most filled file system. A one-shot
+        run without the sys_info collector has none of them.
+        """
+        cpu_threshold = self.metrics.get('cpu_load_percent', 0)
+        memory_threshold = self.metrics.get('memory_info', {}).get('percent', 0)
+        if self._percent_checks_replaced():
+            cpu_threshold = memory_threshold = 0
+        most_filled_fs = max(self.metrics.get('disk_usage', []), key=lambda x: x['used_percent'],
+                             default={'mount_point': None, 'used_percent': 0})
+        return cpu_threshold, memory_threshold, most_filled_fs
+
+    def _threshold_reached(self) -> tuple[bool, list]:
+        cpu_threshold, memory_threshold, most_filled_fs = self._usage_thresholds()
         disk_threshold = most_filled_fs['used_percent']
         logging.debug(
             f"Most filled file system is mounted on {most_filled_fs['mount_point']} at {most_filled_fs['used_percent']}% used")
 
         error_msg = []
+        for name, breaker in self.metrics.get('collector_errors', {}).items():
+            # the errors which the collectors report in their metrics are added below
+            if breaker['raised']:
+                error_msg.append(f"Collector {name} failed: {breaker['error']}")
 
         disks_with_critical_warnings = []
+        disks_degrading = []
         if 'smart_monitor_data' in self.metrics:
             data = self.metrics['smart_monitor_data']
             if 'error' in data:
@@ -106,19 +616,86 @@ class BeaconAgent:
             if disks_with_critical_warnings:
                 logging.warning(
                     f"The following disks have a critical warning: {', '.join(disks_with_critical_warnings.keys())}")
+            disks_degrading = dict(filter(self.has_smart_trend_degrading, data.items()))
+            if disks_degrading:
+                logging.warning(f"The following disks are degrading: {', '.join(disks_degrading.keys())}")
 
         missing_disks = None
         if 'missing_disks' in self.metrics:
             missing_disks = self.metrics['missing_disks']
             logging.error(f"The following disks are missing: {json.dumps(missing_disks)}")
 
+        removed_disks = None
+        if 'removed_disks' in self.metrics:
+            removed_disks = self.metrics['removed_disks']
+            logging.error(f"The following disks were removed: {', '.join(disk['id'] for disk in removed_disks)}")
+
+        disks_filling = [fs['mount_point'] for fs in self.metrics.get('disk_usage', []) if fs.get('thresholds_reached')]
+        if disks_filling:
+            logging.warning(f"The following file systems are filling up: {', '.join(disks_filling)}")
+
+        disks_over_io_threshold = []
+        interfaces_over_threshold = []
+        if 'network' in self.metrics:
+            interfaces_over_threshold = [name for name, interface in self.metrics['network'].items() if
+                                         interface.get('thresholds_reached')]
+            if interfaces_over_threshold:
+                logging.warning(
+                    f"The following network interfaces reached a threshold: {', '.join(interfaces_over_threshold)}")
+
+        pools_not_healthy = []
+        if 'storage_pools' in self.metrics:
+            pools_not_healthy = [name for name, pool in self.metrics['storage_pools'].items() if
+                                 pool.get('thresholds_reached')]
+            if pools_not_healthy:
+                logging.error(f"The following storage pools are not healthy: {', '.join(pools_not_healthy)}")
+
+        pressure_reached = []
+        if 'pressure' in self.metrics:
+            pressure_reached = [resource for resource, stats in self.metrics['pressure'].items() if
+                                stats.get('thresholds_reached')]
+            if pressure_reached:
+                logging.warning(f"The following resources reached a pressure threshold: {', '.join(pressure_reached)}")
+
+        kernel_errors = []
+        if 'kernel_log' in self.metrics:
+            kernel_errors = self.metrics['kernel_log'].get('thresholds_reached', [])
+            if kernel_errors:
+                logging.error("Kernel log errors: %s", ', '.join(kernel_errors))
+
+        temperature_reached = []
+        if 'temperatures' in self.metrics:
+            temperature_reached = self.metrics['temperatures'].get('thresholds_reached', [])
+            if temperature_reached:
+                logging.warning("Temperature threshold reached: %s", ', '.join(temperature_reached))
+
+        if 'disk_io' in self.metrics:
+            disks_over_io_threshold = [name for name, stats in self.metrics['disk_io'].items() if
+                                       stats.get('thresholds_reached')]
+            if disks_over_io_threshold:
+                logging.warning(
+                    f"The following disks reached an I/O threshold: {', '.join(disks_over_io_threshold)}")
+
         containers_not_running = []
+        containers_failing = []
+        containers_over_threshold = []
         if 'docker_projects' in self.metrics:
             containers_not_running = dict(
                 filter(self.is_container_not_running, self.metrics['docker_projects'].items()))
             if containers_not_running:
                 logging.warning(
                     f"The following containers are not running: {', '.join(containers_not_running.keys())}")
+            containers_failing = dict(filter(self.is_container_failing, self.metrics['docker_projects'].items()))
+            if containers_failing:
+                logging.warning(
+                    f"The following projects have unhealthy or restarting containers: "
+                    f"{', '.join(containers_failing.keys())}")
+            containers_over_threshold = dict(
+                filter(self.has_container_threshold_reached, self.metrics['docker_projects'].items()))
+            if containers_over_threshold:
+                logging.warning(
+                    f"The following projects have containers over a threshold: "
+                    f"{', '.join(containers_over_threshold.keys())}")
 
         vms_not_running = []
         lxc_not_running = []
@@ -140,25 +717,33 @@ class BeaconAgent:
                     logging.warning(
                         f"The following LXCs are not running: {', '.join(lxc_not_running.keys())}")
 
+        # logged with arguments, so that a repetition with another value is suppressed by the DuplicateFilter
         if cpu_threshold > self.notify_threshold_percent:
-            logging.warning(f"CPU threshold reached at {cpu_threshold}%")
+            logging.warning("CPU threshold reached at %s%%", cpu_threshold)
         if memory_threshold > self.notify_threshold_percent:
-            logging.warning(f"Memory threshold reached at {memory_threshold}%")
+            logging.warning("Memory threshold reached at %s%%", memory_threshold)
         if disk_threshold > self.notify_threshold_percent:
-            logging.warning(
-                f"Disk threshold reached at {most_filled_fs['mount_point']} at {most_filled_fs['used_percent']}% used")
+            logging.warning("Disk threshold reached at %s at %s%% used", most_filled_fs['mount_point'],
+                            most_filled_fs['used_percent'])
 
-        security_upgrade_count = self.metrics["package_security_upgrade_count"]
+        security_upgrade_count = self.metrics.get("package_security_upgrade_count", 0)
         if security_upgrade_count > 0:
-            logging.warning(f"{security_upgrade_count} security package require upgrading!")
+            logging.warning("%s security package require upgrading!", security_upgrade_count)
+
+        stale_sections = self._stale_sections()
+        if stale_sections:
+            logging.warning(f"The metrics of the following collectors are stale: {', '.join(stale_sections)}")
 
         return (cpu_threshold > self.notify_threshold_percent or
                 memory_threshold > self.notify_threshold_percent or
                 disk_threshold > self.notify_threshold_percent or
                 security_upgrade_count > 0 or
-                disks_with_critical_warnings or missing_disks or
-                containers_not_running or
-                vms_not_running or lxc_not_running), error_msg
+                disks_with_critical_warnings or disks_degrading or missing_disks or removed_disks or disks_over_io_threshold or
+                disks_filling or
+                interfaces_over_threshold or pools_not_healthy or temperature_reached or pressure_reached or
+                kernel_errors or
+                containers_not_running or containers_failing or containers_over_threshold or
+                vms_not_running or lxc_not_running or stale_sections), error_msg
 
     def send_metrics(self, error_msg=None):
         if self.api_type == 'Simulated':
@@ -168,7 +753,14 @@ class BeaconAgent:
         else:
             logging.error("Unknown api_type! Sending simulated!")
             self._send_simulated(error_msg)
-        self.last_notify_time = time.time()
+        self.last_notify_time = time.monotonic()
+
+    async def send_metrics_async(self, error_msg=None):
+        if self.api_type == 'UptimeKuma':
+            await self._send_to_uptime_kuma_async(error_msg)
+            self.last_notify_time = time.monotonic()
+        else:
+            self.send_metrics(error_msg)
 
     def _send_simulated(self, error_msg=None):
         logging.info("Doing a simulated send of:")
@@ -176,109 +768,248 @@ class BeaconAgent:
         logging.info("Successful simulated send")
 
     def _send_to_uptime_kuma(self, error_msg=None):
+        self._push_to_uptime_kuma(*self._build_kuma_message(error_msg))
+
+    def _push_to_uptime_kuma(self, status, kuma_text, wait=True):
+        """
+        Pushes the given status and message. The heartbeat thread and the tick loop must not push concurrently, so
+        that an older state does not overtake a newer one. The tick loop waits for a push of the heartbeat, which is
+        bounded by PUSH_TIMEOUT, the heartbeat skips its push if the tick loop is pushing (wait=False).
+        """
+        if not self.push_lock.acquire(blocking=wait):
+            logging.debug("Skipping the heartbeat, a push is in progress")
+            return
+        try:
+            url = f"{self.api_url}/{self.api_key}"
+            logging.info(f"Sending status {status} to UptimeKuma at URL {self.api_url}")
+            logging.info(f"Kuma message: {kuma_text}")
+            # UptimeKuma reads the push only from the query string, with POST only the message is sent in the body
+            params = {"status": status, "ping": self.latency}
+            if self.kuma_method == 'POST':
+                response = requests.post(url, params=params, data={"msg": kuma_text}, timeout=self.PUSH_TIMEOUT)
+            else:
+                response = requests.get(url, dict(params, msg=kuma_text), timeout=self.PUSH_TIMEOUT)
+            self._log_kuma_response(response)
+        except requests.exceptions.RequestException as e:
+            logging.info(f"Error sending data: {e}")
+        finally:
+            self.push_lock.release()
+
+    async def _send_to_uptime_kuma_async(self, error_msg=None):
+        await self._push_to_uptime_kuma_async(*self._build_kuma_message(error_msg))
+
+    async def _push_to_uptime_kuma_async(self, status, kuma_text, wait=True):
+        """Asynchronous variant of _push_to_uptime_kuma(), the pushes are serialized with async_push_lock"""
+        if self.async_push_lock is None:
+            # a one-shot run pushes only once
+            await self._send_push_async(status, kuma_text)
+            return
+        if not wait and self.async_push_lock.locked():
+            logging.debug("Skipping the heartbeat, a push is in progress")
+            return
+        async with self.async_push_lock:
+            await self._send_push_async(status, kuma_text)
+
+    async def _send_push_async(self, status, kuma_text):
+        url = f"{self.api_url}/{self.api_key}"
+        logging.info(f"Sending status {status} to UptimeKuma at URL {self.api_url}")
+        logging.info(f"Kuma message: {kuma_text}")
+        params = {"status": status, "ping": self.latency}
+        try:
+            if self.kuma_method == 'POST':
+                response = await async_http.request(
+                    'POST', url, params, headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                    data=urlencode({"msg": kuma_text}), timeout=self.PUSH_TIMEOUT)
+            else:
+                response = await async_http.request('GET', url, dict(params, msg=kuma_text), timeout=self.PUSH_TIMEOUT)
+            self._log_kuma_response(response)
+        except async_http.RequestException as e:
+            logging.info(f"Error sending data: {e}")
+
+    @staticmethod
+    def _log_kuma_response(response):
+        if response.status_code == 200:
+            logging.info("Data sent successfully to UptimeKuma")
+        else:
+            logging.info(f"Failed to send data. Status code: {response.status_code}")
+
+    def _build_kuma_message(self, error_msg=None):
+        return self._finish_kuma_message(self._kuma_message(error_msg))
+
+    def _finish_kuma_message(self, message):
+        """
+        Adds the stale metrics at the time of the push to the message of an evaluation.
+
+        Returns:
+        tuple: The status and the text of the message
+        """
+        for name, section in self._stale_sections().items():
+            message.add(KumaMessage.CRITICAL, f"Metrics of {name} are {round(section['age_seconds'])}s old")
+        return message.status(), message.build(trailer=f"Agent:{AGENT_VERSION}. ")
+
+    def _kuma_message(self, error_msg=None):
         metrics = self.metrics
 
         # extract what we need for UptimeKuma:
-        status = "up"
-        kuma_text = ""
+        message = KumaMessage(self.kuma_max_message_bytes)
 
-        cpu_threshold = metrics['cpu_load_percent'] > self.notify_threshold_percent
-        memory_threshold = metrics['memory_info']['percent']
-        most_filled_fs = max(metrics['disk_usage'], key=lambda x: x['used_percent'])
+        cpu_threshold, memory_threshold, most_filled_fs = self._usage_thresholds()
         disk_threshold = most_filled_fs['used_percent']
+        top_processes = metrics.get('top_processes', {})
         if cpu_threshold > self.notify_threshold_percent:
-            status = "down"
-            kuma_text += f"CPU threshold reached at {cpu_threshold}%. "
+            text = f"CPU threshold reached at {cpu_threshold}%"
+            if top_processes.get('cpu'):
+                text += f". Top CPU: {ProcessReader.format_top(top_processes['cpu'], 'cpu')}"
+            message.add(KumaMessage.WARNING, text)
         if memory_threshold > self.notify_threshold_percent:
-            status = "down"
-            kuma_text += f"Memory threshold reached at {memory_threshold}%. "
+            text = f"Memory threshold reached at {memory_threshold}%"
+            if top_processes.get('memory'):
+                text += f". Top memory: {ProcessReader.format_top(top_processes['memory'], 'memory')}"
+            message.add(KumaMessage.WARNING, text)
         if disk_threshold > self.notify_threshold_percent:
-            status = "down"
-            kuma_text += f"Disk threshold reached at {most_filled_fs['mount_point']} at {most_filled_fs['used_percent']}% used. "
+            message.add(KumaMessage.WARNING,
+                        f"Disk threshold reached at {most_filled_fs['mount_point']} at {most_filled_fs['used_percent']}% used")
+        for fs in metrics.get('disk_usage', []):
+            if fs.get('thresholds_reached'):
+                message.add(KumaMessage.WARNING, f"Disk {fs['mount_point']} {', '.join(fs['thresholds_reached'])}")
+
+        for resource, stats in metrics.get('pressure', {}).items():
+            if stats.get('thresholds_reached'):
+                label = {'cpu': 'CPU', 'memory': 'Memory', 'io': 'I/O'}[resource]
+                text = f"{label} pressure {', '.join(stats['thresholds_reached'])}"
+                if top_processes.get(resource):
+                    text += f". Top {label}: {ProcessReader.format_top(top_processes[resource], resource)}"
+                message.add(KumaMessage.WARNING, text)
 
-        if status == "up":
-            kuma_text += "CPU, RAM and Disks OK. "
+        if message.status() == "up" and 'cpu_load_percent' in metrics:
+            message.add(KumaMessage.INFO, "CPU, RAM and Disks OK")
 
         if 'package_security_upgrade_count' in metrics:
             security_upgrade_count = metrics["package_security_upgrade_count"]
             if security_upgrade_count == 0:
-                kuma_text += "No security package require upgrading. "
+                message.add(KumaMessage.INFO, "No security package require upgrading")
             else:
-                status = "down"
-                kuma_text += f"{security_upgrade_count} security package require upgrading! "
+                message.add(KumaMessage.WARNING, f"{security_upgrade_count} security package require upgrading!")
 
         missing_disks = None
         if 'missing_disks' in self.metrics:
             missing_disks = self.metrics['missing_disks']
-            status = "down"
-            kuma_text += f"Missing disks: {json.dumps(missing_disks)}. "
+            message.add(KumaMessage.CRITICAL, f"Missing disks: {json.dumps(missing_disks)}")
+        if 'removed_disks' in self.metrics:
+            for disk in self.metrics['removed_disks']:
+                text = f"Disk {disk['name']} ({disk['id']}) removed"
+                if 'replaced_by' in disk:
+                    text += f", replaced by {disk['replaced_by']}"
+                message.add(KumaMessage.CRITICAL, text)
         if 'smart_monitor_data' in metrics:
             disks_with_critical_warnings = dict(
                 filter(self.has_smart_critical_warning, metrics['smart_monitor_data'].items()))
-            if len(disks_with_critical_warnings) == 0 and missing_disks is None:
-                kuma_text += "All disks OK. "
+            disks_degrading = dict(filter(self.has_smart_trend_degrading, metrics['smart_monitor_data'].items()))
+            if (len(disks_with_critical_warnings) == 0 and len(disks_degrading) == 0 and missing_disks is None and
+                    'removed_disks' not in metrics):
+                message.add(KumaMessage.INFO, "All disks OK")
             else:
-                status = "down"
-                for item in disks_with_critical_warnings.items():
-                    label, disk = item
-                    kuma_text += f"Disk {label} FAILED. "
+                message.add_group(KumaMessage.CRITICAL,
+                                  [f"Disk {label} FAILED" for label in disks_with_critical_warnings.keys()],
+                                  f"{len(disks_with_critical_warnings)} disks FAILED")
+                message.add_group(KumaMessage.CRITICAL,
+                                  [f"Disk {label} DEGRADING: {', '.join(disk['smart_trend_findings'])}" for
+                                   label, disk in disks_degrading.items()],
+                                  f"{len(disks_degrading)} disks DEGRADING")
+
+        if 'storage_pools' in metrics:
+            for name, pool in metrics['storage_pools'].items():
+                if pool.get('thresholds_reached'):
+                    text = f"Pool {name} {', '.join(pool['thresholds_reached'])}"
+                    if 'progress' in pool:
+                        text += f", {pool['progress']['action']} at {pool['progress']['percent']}%"
+                    message.add(KumaMessage.CRITICAL, text)
+
+        if 'kernel_log' in metrics:
+            kernel_errors = metrics['kernel_log'].get('thresholds_reached', [])
+            message.add_group(KumaMessage.CRITICAL, [f"Kernel log {text}" for text in kernel_errors],
+                              f"Kernel log errors on {len(kernel_errors)} devices")
+
+        if 'temperatures' in metrics:
+            temperature_reached = metrics['temperatures'].get('thresholds_reached', [])
+            message.add_group(KumaMessage.WARNING, [f"Temperature {text}" for text in temperature_reached],
+                              f"{len(temperature_reached)} temperature sensors over threshold, max at "
+                              f"{metrics['temperatures']['max_celsius']}°C")
+
+        if 'disk_io' in metrics:
+            for name, stats in metrics['disk_io'].items():
+                if stats.get('thresholds_reached'):
+                    message.add(KumaMessage.WARNING, f"Disk {name} {', '.join(stats['thresholds_reached'])}")
+
+        if 'network' in metrics:
+            for name, interface in metrics['network'].items():
+                if interface.get('thresholds_reached'):
+                    message.add(KumaMessage.CRITICAL, f"Network {name} {', '.join(interface['thresholds_reached'])}")
 
         if 'docker_projects' in metrics:
             containers_not_running = dict(
                 filter(self.is_container_not_running, metrics['docker_projects'].items()))
-            if len(containers_not_running) == 0:
-                kuma_text += "All containers running. "
+            containers_failing = dict(filter(self.is_container_failing, metrics['docker_projects'].items()))
+            if len(containers_not_running) == 0 and len(containers_failing) == 0:
+                message.add(KumaMessage.INFO, "All containers running")
             else:
-                status = "down"
                 for item in containers_not_running.items():
                     label, containers = item
                     stopped_containers = list(filter(lambda element: element["state"] != "running", containers))
-                    for container in stopped_containers:
-                        kuma_text += f"Container {label}:{container['name']} state={container['state']}. "
+                    message.add_group(KumaMessage.CRITICAL,
+                                      [f"Container {label}:{container['name']} state={container['state']}"
+                                       f"{self._container_exit(container)}" for container in stopped_containers],
+                                      f"{len(stopped_containers)} containers stopped in project {label}")
+                for label, containers in containers_failing.items():
+                    failing_containers = [container for container in containers if container.get('failures')]
+                    message.add_group(KumaMessage.CRITICAL,
+                                      [f"Container {label}:{container['name']} {', '.join(container['failures'])}"
+                                       for container in failing_containers],
+                                      f"{len(failing_containers)} containers unhealthy or restarting in project "
+                                      f"{label}")
+
+            for label, containers in metrics['docker_projects'].items():
+                containers_over_threshold = [container for container in containers if
+                                             container.get('thresholds_reached')]
+                message.add_group(KumaMessage.WARNING,
+                                  [f"Container {label}:{container['name']} {', '.join(container['thresholds_reached'])}"
+                                   for container in containers_over_threshold],
+                                  f"{len(containers_over_threshold)} containers over threshold in project {label}")
 
         if "proxmox_data" in metrics:
             proxmox_data = metrics["proxmox_data"]
             if 'vms' in proxmox_data:
                 vms_not_running = {vm['name']: vm for vm in proxmox_data['vms'] if self.is_vm_lxc_not_running(vm)}
                 if len(vms_not_running) == 0:
-                    kuma_text += "All VMs running. "
+                    message.add(KumaMessage.INFO, "All VMs running")
                 else:
-                    status = "down"
-                    for item in vms_not_running.items():
-                        label, vm = item
-                        kuma_text += f"VM {label} state={vm['status']}. "
+                    message.add_group(KumaMessage.CRITICAL,
+                                      [f"VM {label} state={vm['status']}" for label, vm in vms_not_running.items()],
+                                      f"{len(vms_not_running)} VMs not running")
 
             if 'containers' in proxmox_data:
                 lxc_not_running = {lxc['name']: lxc for lxc in proxmox_data['containers'] if
                                    self.is_vm_lxc_not_running(lxc)}
                 if len(lxc_not_running) == 0:
-                    kuma_text += "All LXCs running. "
+                    message.add(KumaMessage.INFO, "All LXCs running")
                 else:
-                    status = "down"
-                    for item in lxc_not_running.items():
-                        label, lxc = item
-                        kuma_text += f"LXC {label} state={lxc['status']}. "
+                    message.add_group(KumaMessage.CRITICAL,
+                                      [f"LXC {label} state={lxc['status']}" for label, lxc in lxc_not_running.items()],
+                                      f"{len(lxc_not_running)} LXCs not running")
 
         if error_msg:
-            status = "down"
-            kuma_text += f"ERROR_MSG:{error_msg}. "
+            message.add(KumaMessage.CRITICAL, f"ERROR_MSG:{error_msg}")
 
-        kuma_text += f"Agent:{AGENT_VERSION}. "
+        return message
 
-        url = f"{self.api_url}/{self.api_key}"
-        logging.info(f"Sending status {status} to UptimeKuma at URL {self.api_url}")
-        logging.info(f"Kuma message: {kuma_text}")
-        try:
-            response = requests.get(url, {"status": status, "msg": kuma_text, "ping": self.latency})
-            if response.status_code == 200:
-                logging.info("Data sent successfully to UptimeKuma")
-            else:
-                logging.info(f"Failed to send data. Status code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            logging.info(f"Error sending data: {e}")
+    @staticmethod
+    def _container_exit(container):
+        if container['state'] != 'exited' or container.get('exit_code') is None:
+            return ""
+        return f", exit code {container['exit_code']}{', OOM killed' if container.get('oom_killed') else ''}"
 
     def _pretty_print_metrics(self, error_msg=None):
-        logging.info(json.dumps(self.metrics, indent=2))
+        logging.info("%s", LazyJson(self.metrics))
         if error_msg:
             logging.info(f"Error message: {error_msg}")
 
@@ -287,7 +1018,7 @@ def main():
     agent = BeaconAgent(config_file='../example_config.json')
 
     try:
-        agent.monitor_system()
+        agent.run()
     except KeyboardInterrupt:
         logging.info("\nMonitoring interrupted. Exiting gracefully...")
 
@@ -31,3 +31,25 @@ class AgentConfig:
             raise ValueError(f"The key path {'.'.join(key_path)} leads to a None value.")
 
         return current_dict
+
+    def differs(self, other, key_path):
+        """
+        Checks if the value at the specified key path differs from the value in the other configuration, where a
+        missing key is the same as None.
+
+        Parameters:
+        other (AgentConfig): The configuration to compare with.
+        key_path (list): List of nested keys leading to the value to compare.
+
+        Returns:
+        True if the values differ.
+        """
+        return self._find_value(key_path) != other._find_value(key_path)
+
+    def _find_value(self, key_path):
+        current_dict = self.config
+        for key in key_path:
+            if not isinstance(current_dict, dict) or key not in current_dict:
+                return None
+            current_dict = current_dict[key]
+        return current_dict
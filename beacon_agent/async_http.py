@@ -0,0 +1,309 @@
+import asyncio
+import base64
+import json
+import ssl
+import urllib.request
+from urllib.parse import unquote, urlsplit, urlencode
+
+from beacon_agent import AGENT_VERSION
+
+
+# the largest response body which is read, e.g. of a Proxmox API call
+MAX_RESPONSE_BYTES = 16 * 1024 * 1024
+
+
+class RequestException(Exception):
+    """Raised when a request could not be performed, e.g. connection refused or timed out"""
+
+
+class HTTPError(RequestException):
+    def __init__(self, message, response):
+        super().__init__(message)
+        self.response = response
+
+
+class HttpResponse:
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise HTTPError(f"{self.status_code} Error for url: {self.url}", self)
+
+
+async def request(method, url, params=None, headers=None, data=None, verify_tls=True, timeout=(5, 5)):
+    """
+    Minimal asynchronous HTTP/1.1 client on top of asyncio streams, so that the asyncio engine does not need any
+    additional dependency. Each request uses its own connection. As with requests, the proxies of the environment
+    variables HTTP_PROXY, HTTPS_PROXY and NO_PROXY are used, https through a CONNECT tunnel.
+
+    Args:
+    method (str): The HTTP method, e.g. GET or POST
+    url (str): The URL, http or https
+    params (dict): Optional query parameters, appended to the URL
+    headers (dict): Optional additional request headers
+    data (str|bytes): Optional request body
+    verify_tls (bool): Whether to validate the server certificate
+    timeout (float|tuple): The timeout in seconds to connect, and to send the request and read the response
+
+    Returns:
+    HttpResponse: The response, even for non 2xx status codes. Use raise_for_status() to check.
+    """
+    connect_timeout, read_timeout = _split_timeout(timeout)
+    parts = urlsplit(url)
+    reader, writer, proxy_headers = await _open_connection(parts, verify_tls, connect_timeout)
+
+    try:
+        status_code, response_headers, content = await asyncio.wait_for(_exchange(
+            reader, writer, _build_request(method, parts, params, headers, data, False, proxy_headers), method),
+            read_timeout)
+    except asyncio.TimeoutError:
+        raise RequestException(f"Request to {parts.netloc} timed out")
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        raise RequestException(f"Failed to read response from {parts.netloc}: {e}")
+    finally:
+        writer.close()
+
+    return HttpResponse(url, status_code, response_headers, content)
+
+
+class PersistentConnection:
+    """
+    A keep-alive HTTP/1.1 connection to a single server, which is opened on the first request and reused for the
+    following ones. It is reopened if the server closed it, so a request on a stale connection is retried once.
+    Requests on one connection must not be concurrent, use one connection per task.
+    """
+
+    def __init__(self, verify_tls=True, timeout=(5, 5)):
+        self.verify_tls = verify_tls
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.server = None
+        self.proxy_headers = None
+        self.request_count = 0
+
+    async def request(self, method, url, params=None, headers=None, data=None):
+        """Same as request(), but on the persistent connection"""
+        connect_timeout, read_timeout = _split_timeout(self.timeout)
+        parts = urlsplit(url)
+        server = (parts.scheme, parts.hostname, parts.port)
+        if server != self.server:
+            self.close()
+
+        reused = self.writer is not None
+        if not reused:
+            self.reader, self.writer, self.proxy_headers = await _open_connection(parts, self.verify_tls,
+                                                                                  connect_timeout)
+            self.server = server
+
+        try:
+            status_code, response_headers, content = await asyncio.wait_for(_exchange(
+                self.reader, self.writer,
+                _build_request(method, parts, params, headers, data, True, self.proxy_headers), method),
+                read_timeout)
+        except asyncio.TimeoutError:
+            self.close()
+            raise RequestException(f"Request to {parts.netloc} timed out")
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            self.close()
+            if reused:
+                # the server closed the idle connection, which is not an error
+                return await self.request(method, url, params, headers, data)
+            raise RequestException(f"Failed to read response from {parts.netloc}: {e}")
+
+        self.request_count += 1
+        if (response_headers.get('connection', '').lower() == 'close' or
+                ('content-length' not in response_headers and
+                 response_headers.get('transfer-encoding', '').lower() != 'chunked')):
+            self.close()
+        return HttpResponse(url, status_code, response_headers, content)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+        self.server = None
+        self.proxy_headers = None
+
+
+def _split_timeout(timeout):
+    return timeout if isinstance(timeout, tuple) else (timeout, timeout)
+
+
+async def _open_connection(parts, verify_tls, connect_timeout):
+    """
+    Opens a connection to the server of the given URL, directly or through the proxy of the environment.
+
+    Returns:
+    tuple: The reader, the writer and the headers for a request through a http proxy, which is sent with the
+           absolute URL, or None if the request is sent directly to the server
+    """
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    proxy = _proxy_for(parts)
+    try:
+        if proxy is None:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(parts.hostname, port, ssl=_ssl_context(secure, verify_tls)), connect_timeout)
+            return reader, writer, None
+        if not secure:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(proxy.hostname, proxy.port or 80), connect_timeout)
+            return reader, writer, _proxy_headers(proxy)
+        reader, writer = await asyncio.wait_for(
+            _open_tunnel(proxy, parts.hostname, port, _ssl_context(secure, verify_tls)), connect_timeout)
+        return reader, writer, None
+    except asyncio.TimeoutError:
+        raise RequestException(f"Connection to {parts.hostname}:{port} timed out")
+    except ConnectionRefusedError as e:
+        raise RequestException(f"Connection refused: {e}")
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        raise RequestException(str(e))
+
+
+def _proxy_for(parts):
+    """Returns the split URL of the proxy to use for the given URL, or None, from the environment as requests does"""
+    if urllib.request.proxy_bypass_environment(parts.hostname):
+        return None
+    proxy = urllib.request.getproxies_environment().get(parts.scheme)
+    if not proxy:
+        return None
+    return urlsplit(proxy if '://' in proxy else f"http://{proxy}")
+
+
+def _proxy_headers(proxy):
+    if proxy.username is None:
+        return {}
+    credentials = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+    return {'Proxy-Authorization': f"Basic {base64.b64encode(credentials.encode('utf-8')).decode('ascii')}"}
+
+
+async def _open_tunnel(proxy, host, port, ssl_context):
+    """Opens a CONNECT tunnel through the given proxy to the given server, and starts TLS in it"""
+    reader, writer = await asyncio.open_connection(proxy.hostname, proxy.port or 80)
+    try:
+        head = f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        head += ''.join(f"{key}: {value}\r\n" for key, value in _proxy_headers(proxy).items())
+        writer.write(f"{head}\r\n".encode('latin-1'))
+        await writer.drain()
+        status_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        if len(status_line.split(b' ', 2)) < 2 or status_line.split(b' ', 2)[1] != b'200':
+            raise ValueError(f"Proxy {proxy.hostname} refused the tunnel to {host}:{port}: "
+                             f"{status_line.decode('latin-1').strip()}")
+        # the TLS connection is started on a duplicate of the socket, the proxy does not send anything before it
+        sock = writer.get_extra_info('socket').dup()
+    finally:
+        writer.close()
+    return await asyncio.open_connection(sock=sock, ssl=ssl_context, server_hostname=host)
+
+
+def _ssl_context(secure, verify_tls):
+    if not secure:
+        return None
+    context = ssl.create_default_context()
+    if not verify_tls:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _build_request(method, parts, params, headers, data, keep_alive, proxy_headers=None):
+    path = parts.path or '/'
+    query = parts.query
+    if params:
+        query = f"{query}&{urlencode(params)}" if query else urlencode(params)
+    if query:
+        path = f"{path}?{query}"
+    if proxy_headers is not None:
+        # a http proxy gets the absolute URL, without the credentials
+        path = f"{parts.scheme}://{parts.netloc.rsplit('@', 1)[-1]}{path}"
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    request_headers = {
+        'Host': parts.netloc.rsplit('@', 1)[-1],
+        'User-Agent': f"beacon-agent/{AGENT_VERSION}",
+        'Accept-Encoding': 'identity',
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }
+    if data is not None:
+        request_headers['Content-Length'] = str(len(data))
+    if proxy_headers:
+        request_headers.update(proxy_headers)
+    if headers:
+        request_headers.update(headers)
+
+    head = f"{method} {path} HTTP/1.1\r\n"
+    head += ''.join(f"{key}: {value}\r\n" for key, value in request_headers.items())
+    head += "\r\n"
+    return head.encode('latin-1') + (data or b'')
+
+
+async def _exchange(reader, writer, request_bytes, method):
+    writer.write(request_bytes)
+    await writer.drain()
+    return await _read_response(reader, method)
+
+
+async def _read_response(reader, method):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ValueError("Connection closed before a response was received")
+    status_code = int(status_line.split(b' ', 2)[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, value = line.decode('latin-1').split(':', 1)
+        headers[key.strip().lower()] = value.strip()
+
+    if method == 'HEAD' or status_code in (204, 304) or 100 <= status_code < 200:
+        return status_code, headers, b''
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        content = b''
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                # skip optional trailers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            if len(content) + size > MAX_RESPONSE_BYTES:
+                raise ValueError(f"Response larger than {MAX_RESPONSE_BYTES} bytes")
+            content += await reader.readexactly(size)
+            await reader.readexactly(2)
+        return status_code, headers, content
+
+    if 'content-length' in headers:
+        length = int(headers['content-length'])
+        if length > MAX_RESPONSE_BYTES:
+            raise ValueError(f"Response larger than {MAX_RESPONSE_BYTES} bytes")
+        return status_code, headers, await reader.readexactly(length)
+
+    # the body ends when the server closes the connection
+    content = b''
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            return status_code, headers, content
+        content += data
+        if len(content) > MAX_RESPONSE_BYTES:
+            raise ValueError(f"Response larger than {MAX_RESPONSE_BYTES} bytes")
@@ -0,0 +1,38 @@
+import asyncio
+import subprocess
+
+
+async def run_process(command, env=None, timeout=None, encoding='utf-8'):
+    """
+    Asynchronous counterpart of subprocess.run(command, stdout=PIPE, stderr=PIPE, text=True).
+
+    Args:
+    command (list): The command and its arguments
+    env (dict): Optional environment for the process
+    timeout (float): Optional timeout in seconds, after which the process is killed
+
+    Returns:
+    subprocess.CompletedProcess: The same result type as subprocess.run(), so that readers can share their parsing
+    code between the blocking and the asyncio engine.
+    """
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE, env=env)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        _kill(process)
+        await process.wait()
+        raise subprocess.TimeoutExpired(command, timeout)
+    except asyncio.CancelledError:
+        _kill(process)
+        raise
+
+    return subprocess.CompletedProcess(command, process.returncode, stdout.decode(encoding),
+                                       stderr.decode(encoding))
+
+
+def _kill(process):
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
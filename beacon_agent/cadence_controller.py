@@ -0,0 +1,119 @@
+import logging
+import math
+import time
+
+
+class CadenceController:
+    """
+    Adapts how often the collectors run to the state of the host. While the host is busy, i.e. the CPU load or a
+    pressure stall average is high, the expensive collectors which fork processes or call APIs are stretched, doubling
+    their interval on every busy tick up to max_interval_seconds, and halving it again on every calm tick. While the
+    CPU or memory usage is close to notify_threshold_percent, the tick interval is tightened to min_interval_seconds,
+    so that crossing the threshold is detected early. The cheap collectors run on every tick.
+    """
+
+    EXPENSIVE_COLLECTORS = ['packages', 'smart', 'docker', 'proxmox', 'storage_pools']
+
+    def __init__(self, config, collectors, clock=time.monotonic):
+        self.enabled = config.get_config_value(["cadence", "enabled"], default=False)
+        self.collectors = collectors
+        self.clock = clock
+        self.base_interval = config.get_config_value(["agent", "refresh_interval_seconds"], default=10)
+        self.tick_interval = self.base_interval
+        self.stretch = 1
+        self.busy = []
+        self.near_threshold = []
+        # collector name -> monotonic time of its last run
+        self.last_run = {}
+        if not self.enabled:
+            return
+
+        self.min_interval = min(self.base_interval, config.get_config_value(
+            ["cadence", "min_interval_seconds"], default=max(1, self.base_interval / 5)))
+        self.max_interval = max(self.base_interval, config.get_config_value(
+            ["cadence", "max_interval_seconds"], default=self.base_interval * 30))
+        self.expensive_collectors = config.get_config_value(["cadence", "expensive_collectors"],
+                                                            default=self.EXPENSIVE_COLLECTORS)
+        self.busy_cpu_percent = config.get_config_value(["cadence", "busy_cpu_percent"], default=85)
+        self.busy_pressure_percent = config.get_config_value(["cadence", "busy_pressure_percent"], default=25)
+        notify_threshold_percent = config.get_config_value(["agent", "notify_threshold_percent"], default=90)
+        self.near_threshold_percent = config.get_config_value(["cadence", "near_threshold_percent"],
+                                                              default=notify_threshold_percent - 10)
+
+        logging.info(f"Enabled adaptive cadence between {self.min_interval}s and {self.max_interval}s")
+
+    def collector_interval(self, name):
+        if name in self.expensive_collectors:
+            return self._stretched_interval(self.stretch)
+        return self.tick_interval
+
+    def _stretched_interval(self, stretch):
+        return min(self.base_interval * stretch, self.max_interval)
+
+    def due_collectors(self):
+        """
+        Returns the collectors which are due on this tick, or None if all are due. A collector is due if its interval
+        passed, with a tolerance of half a tick so that the jitter of the ticks does not skip it.
+        """
+        if not self.enabled:
+            return None
+
+        now = self.clock()
+        due = [name for name in self.collectors if name not in self.last_run or
+               now - self.last_run[name] >= self.collector_interval(name) - self.tick_interval / 2]
+        return None if len(due) == len(self.collectors) else due
+
+    def record_run(self, collectors=None):
+        now = self.clock()
+        for name in collectors or self.collectors:
+            self.last_run[name] = now
+
+    def update(self, metrics, check_percent=True):
+        """
+        Adapts the intervals to the latest metrics.
+
+        Args:
+        metrics (dict): The latest metrics
+        check_percent (bool): Whether the CPU and memory usage are checked against the threshold at all
+
+        Returns:
+        float: The new tick interval in seconds
+        """
+        if not self.enabled:
+            return self.tick_interval
+
+        self.busy = []
+        if metrics.get('cpu_load_percent', 0) >= self.busy_cpu_percent:
+            self.busy.append('cpu')
+        for resource, stats in metrics.get('pressure', {}).items():
+            if stats.get('some_avg10', 0) >= self.busy_pressure_percent:
+                self.busy.append(f"{resource} pressure")
+
+        max_stretch = math.ceil(self.max_interval / self.base_interval)
+        stretch = min(self.stretch * 2, max_stretch) if self.busy else max(1, self.stretch // 2)
+        if stretch != self.stretch:
+            logging.info(f"Running expensive collectors every {self._stretched_interval(stretch)}s"
+                         f"{', host is busy: ' + ', '.join(self.busy) if self.busy else ''}")
+            self.stretch = stretch
+
+        self.near_threshold = []
+        if check_percent:
+            if metrics.get('cpu_load_percent', 0) >= self.near_threshold_percent:
+                self.near_threshold.append('cpu')
+            if metrics.get('memory_info', {}).get('percent', 0) >= self.near_threshold_percent:
+                self.near_threshold.append('memory')
+
+        tick_interval = self.min_interval if self.near_threshold else self.base_interval
+        if tick_interval != self.tick_interval:
+            logging.info(f"Refreshing every {tick_interval}s"
+                         f"{', close to threshold: ' + ', '.join(self.near_threshold) if self.near_threshold else ''}")
+            self.tick_interval = tick_interval
+        return self.tick_interval
+
+    def get_stats(self):
+        return {
+            'tick_interval_seconds': self.tick_interval,
+            'busy': self.busy,
+            'near_threshold': self.near_threshold,
+            'collector_intervals': {name: self.collector_interval(name) for name in self.collectors}
+        }
@@ -0,0 +1,206 @@
+import logging
+import os
+import time
+
+
+class ContainerCgroup:
+    """The cached file descriptors and the previous counters of the cgroup of a single container"""
+
+    FILES = ['cpu.stat', 'memory.current', 'memory.max', 'memory.stat', 'io.stat']
+
+    def __init__(self, path):
+        self.path = path
+        self.fds = {}
+        for name in self.FILES:
+            try:
+                self.fds[name] = os.open(os.path.join(path, name), os.O_RDONLY)
+            except OSError:
+                # e.g. the io controller is not enabled for this cgroup
+                pass
+        self.prev_time = None
+        self.prev_cpu_usec = None
+        self.prev_io = None
+
+    def read(self, name):
+        fd = self.fds.get(name)
+        if fd is None:
+            return None
+        return os.pread(fd, 65536, 0).decode()
+
+    def close(self):
+        for fd in self.fds.values():
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self.fds = {}
+
+
+class CgroupReader:
+    """
+    Reads the CPU, memory and I/O usage of Docker containers directly from their cgroup v2 files, which is much
+    cheaper than docker stats. The files of each container are opened once and then re-read with pread() on every
+    tick, rates are calculated from the deltas to the previous tick.
+    """
+
+    def __init__(self, config):
+        self.cgroup_root = config.get_config_value(["docker", "cgroup_root"], default='/sys/fs/cgroup')
+        self.enabled = config.get_config_value(["docker", "resource_usage"], default=True)
+        self.cpu_threshold_percent = config.get_config_value(["docker", "cpu_threshold_percent"], default=0)
+        self.memory_threshold_percent = config.get_config_value(["docker", "memory_threshold_percent"], default=0)
+        self.cgroups = {}
+
+        if not self.enabled:
+            return
+
+        if not os.path.exists(os.path.join(self.cgroup_root, 'cgroup.controllers')):
+            logging.warning("cgroup v2 is not available, container resource usage disabled")
+            self.enabled = False
+            return
+
+        # systemd cgroup driver first, then the cgroupfs driver
+        self.scope_dirs = [(os.path.join(self.cgroup_root, 'system.slice'), 'docker-', '.scope'),
+                           (os.path.join(self.cgroup_root, 'docker'), '', '')]
+        logging.info("Enabled container resource usage from cgroup v2")
+
+    def attach_resource_usage(self, projects):
+        """
+        Adds the resource usage to each running container in the given projects, and the list of reached thresholds
+        if any thresholds are configured.
+        """
+        if not self.enabled or not projects:
+            return projects
+
+        now = time.monotonic()
+        containers = [container for containers in projects.values() for container in containers if
+                      container['state'] == 'running']
+        self._update_cgroups(container['container_id'] for container in containers)
+
+        for container in containers:
+            cgroup = self.cgroups.get(container['container_id'])
+            if cgroup is None:
+                continue
+            try:
+                resources = self._read_resources(cgroup, now)
+            except OSError as e:
+                logging.warning(f"Failed to read cgroup of container {container['name']}: {e}")
+                cgroup.close()
+                del self.cgroups[container['container_id']]
+                continue
+
+            container['resources'] = resources
+            thresholds_reached = self._evaluate_thresholds(resources)
+            if thresholds_reached:
+                container['thresholds_reached'] = thresholds_reached
+
+        return projects
+
+    def close(self):
+        for cgroup in self.cgroups.values():
+            cgroup.close()
+        self.cgroups = {}
+
+    def _update_cgroups(self, container_ids):
+        container_ids = set(container_ids)
+
+        # close the cgroups of removed or stopped containers
+        for container_id in list(self.cgroups.keys()):
+            if container_id not in container_ids:
+                self.cgroups.pop(container_id).close()
+
+        unknown_ids = container_ids - self.cgroups.keys()
+        if not unknown_ids:
+            return
+
+        # docker ps only returns the short ID, so the cgroup directories are matched by prefix
+        for scope_dir, prefix, suffix in self.scope_dirs:
+            try:
+                entries = os.listdir(scope_dir)
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.startswith(prefix) or not entry.endswith(suffix):
+                    continue
+                full_id = entry[len(prefix):len(entry) - len(suffix)]
+                for container_id in unknown_ids:
+                    if full_id.startswith(container_id):
+                        self.cgroups[container_id] = ContainerCgroup(os.path.join(scope_dir, entry))
+                        unknown_ids.discard(container_id)
+                        break
+            if not unknown_ids:
+                return
+
+        logging.debug(f"No cgroup found for containers: {', '.join(unknown_ids)}")
+
+    def _read_resources(self, cgroup, now):
+        cpu_usec = self._parse_flat_keyed(cgroup.read('cpu.stat')).get('usage_usec', 0)
+        memory_bytes = int(cgroup.read('memory.current') or 0)
+        memory_max = (cgroup.read('memory.max') or 'max').strip()
+        memory_limit_bytes = None if memory_max == 'max' else int(memory_max)
+        io = self._parse_io_stat(cgroup.read('io.stat'))
+
+        resources = {
+            'cpu_percent': None,
+            'memory_bytes': memory_bytes,
+            'memory_limit_bytes': memory_limit_bytes,
+            'memory_percent': None,
+            'io_read_bytes_per_second': None,
+            'io_write_bytes_per_second': None
+        }
+
+        if memory_limit_bytes:
+            # like docker stats, don't count the reclaimable page cache against the limit
+            inactive_file = self._parse_flat_keyed(cgroup.read('memory.stat')).get('inactive_file', 0)
+            resources['memory_percent'] = round(
+                max(0, memory_bytes - inactive_file) / memory_limit_bytes * 100, 1)
+
+        if cgroup.prev_time is not None and now > cgroup.prev_time:
+            elapsed = now - cgroup.prev_time
+            # percent of a single CPU, as in docker stats
+            resources['cpu_percent'] = round((cpu_usec - cgroup.prev_cpu_usec) / (elapsed * 1_000_000) * 100, 1)
+            resources['io_read_bytes_per_second'] = int((io[0] - cgroup.prev_io[0]) / elapsed)
+            resources['io_write_bytes_per_second'] = int((io[1] - cgroup.prev_io[1]) / elapsed)
+
+        cgroup.prev_time = now
+        cgroup.prev_cpu_usec = cpu_usec
+        cgroup.prev_io = io
+        return resources
+
+    def _evaluate_thresholds(self, resources):
+        thresholds_reached = []
+        cpu_percent = resources['cpu_percent']
+        if self.cpu_threshold_percent and cpu_percent is not None and cpu_percent > self.cpu_threshold_percent:
+            thresholds_reached.append(f"CPU at {cpu_percent}%")
+        memory_percent = resources['memory_percent']
+        if (self.memory_threshold_percent and memory_percent is not None and
+                memory_percent > self.memory_threshold_percent):
+            thresholds_reached.append(f"Memory at {memory_percent}% of limit")
+        return thresholds_reached
+
+    @staticmethod
+    def _parse_flat_keyed(content):
+        """Parses a flat keyed cgroup file, e.g. cpu.stat, into a dictionary of ints"""
+        values = {}
+        if not content:
+            return values
+        for line in content.splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                values[parts[0]] = int(parts[1])
+        return values
+
+    @staticmethod
+    def _parse_io_stat(content):
+        """Returns the sum of the read and written bytes over all devices of io.stat"""
+        read_bytes = 0
+        write_bytes = 0
+        if not content:
+            return read_bytes, write_bytes
+        for line in content.splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition('=')
+                if key == 'rbytes':
+                    read_bytes += int(value)
+                elif key == 'wbytes':
+                    write_bytes += int(value)
+        return read_bytes, write_bytes
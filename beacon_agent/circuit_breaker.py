@@ -0,0 +1,64 @@
+import time
+
+
+class CircuitBreaker:
+    """
+    Protects the tick from a failing collector, e.g. an unreachable Proxmox API which costs the full timeouts on every
+    call. After failure_threshold consecutive failures the breaker opens and the collector is not called until the
+    backoff expired, which doubles with every failed trial up to max_backoff_seconds. Then a single trial call is
+    allowed (half open): a success closes the breaker, a failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, backoff_seconds=30, max_backoff_seconds=1800, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.clock = clock
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+        self.last_error = None
+        self.raised = False
+
+    def allow(self):
+        """Returns True if the collector may be called, i.e. the breaker is closed or a trial call is due"""
+        if self.state == self.OPEN:
+            if self.clock() < self.retry_at:
+                return False
+            self.state = self.HALF_OPEN
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = None
+        self.last_error = None
+        self.raised = False
+
+    def record_failure(self, error, raised=False):
+        """
+        Args:
+        error (str): The error of the collector
+        raised (bool): Whether the collector raised an exception, i.e. the error is not part of its metrics
+        """
+        self.failures += 1
+        self.last_error = error
+        self.raised = raised
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            backoff = min(self.backoff_seconds * 2 ** self.opened, self.max_backoff_seconds)
+            self.opened += 1
+            self.state = self.OPEN
+            self.retry_at = self.clock() + backoff
+
+    def get_stats(self):
+        stats = {'state': self.state, 'failures': self.failures, 'error': self.last_error, 'raised': self.raised}
+        if self.state == self.OPEN:
+            stats['retry_in_seconds'] = round(max(0.0, self.retry_at - self.clock()), 1)
+        return stats
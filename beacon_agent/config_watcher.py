@@ -0,0 +1,135 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import signal
+import struct
+
+# see linux/inotify.h
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+INOTIFY_EVENT = struct.Struct('=iIII')
+
+
+class ConfigWatcher:
+    """
+    Reloads the configuration on SIGHUP, e.g. from systemctl reload, or when the config file is written. The directory
+    of the config file is watched with inotify, so that editors which replace the file by renaming a new one over it
+    are noticed as well.
+
+    The watcher is an event source of the engines: the signal handler and inotify both wake up a single epoll
+    descriptor, handle_events() then calls on_change(), which returns the collectors to refresh with the new
+    configuration.
+    """
+
+    push_immediately = False
+
+    def __init__(self, config_file, on_change, watch_file=True):
+        """
+        Args:
+        config_file (str): The path of the config file
+        on_change (callable): Reloads the configuration, returns the list of collectors to refresh
+        watch_file (bool): Whether to reload when the file is written, otherwise only on SIGHUP
+        """
+        self.config_file = os.path.abspath(config_file)
+        self.on_change = on_change
+        self.refresh_collectors = []
+        self.inotify_fd = None
+        self.previous_handler = None
+
+        self.epoll = select.epoll()
+        self.signal_read_fd, self.signal_write_fd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.epoll.register(self.signal_read_fd, select.EPOLLIN)
+        self.previous_handler = signal.signal(signal.SIGHUP, self._on_sighup)
+
+        if watch_file:
+            self.inotify_fd = self._watch_directory(os.path.dirname(self.config_file))
+            if self.inotify_fd is not None:
+                self.epoll.register(self.inotify_fd, select.EPOLLIN)
+
+        logging.info(f"Reloading {self.config_file} on SIGHUP{' or when written' if self.inotify_fd else ''}")
+
+    @staticmethod
+    def _watch_directory(directory):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                errno = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno, os.strerror(errno))
+            return fd
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Failed to watch {directory} with inotify, reloading the config only on SIGHUP: {e}")
+            return None
+
+    def _on_sighup(self, signum, frame):
+        try:
+            os.write(self.signal_write_fd, b'\0')
+        except BlockingIOError:
+            # a reload is already pending
+            pass
+
+    def fileno(self):
+        return self.epoll.fileno()
+
+    def handle_events(self):
+        reload = False
+        for fd, _ in self.epoll.poll(0):
+            if fd == self.signal_read_fd and self._drain(fd):
+                logging.info("Received SIGHUP")
+                reload = True
+            elif fd == self.inotify_fd:
+                reload = self._config_file_written() or reload
+        if not reload:
+            return None
+
+        self.refresh_collectors = self.on_change()
+        if not self.refresh_collectors:
+            return None
+        return "Configuration reloaded"
+
+    @staticmethod
+    def _drain(fd):
+        data = b''
+        while True:
+            try:
+                chunk = os.read(fd, 4096)
+            except BlockingIOError:
+                return len(data) > 0
+            if not chunk:
+                return len(data) > 0
+            data += chunk
+
+    def _config_file_written(self):
+        """Returns True if one of the pending inotify events is for the config file"""
+        written = False
+        file_name = os.fsencode(os.path.basename(self.config_file))
+        while True:
+            try:
+                buffer = os.read(self.inotify_fd, 4096)
+            except BlockingIOError:
+                return written
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(buffer):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += INOTIFY_EVENT.size
+                name = buffer[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if name == file_name:
+                    written = True
+
+    def close(self):
+        signal.signal(signal.SIGHUP, self.previous_handler or signal.SIG_DFL)
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+        os.close(self.signal_read_fd)
+        os.close(self.signal_write_fd)
+        self.epoll.close()
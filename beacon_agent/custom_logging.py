@@ -1,23 +1,171 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 
-from .customer_logging_formatter import CustomLoggingFormatter
+from .customer_logging_formatter import CustomLoggingFormatter, JsonLinesFormatter
+
+
+class LazyJson:
+    """
+    Renders an object as JSON only when the log record is formatted, so that a large dump costs nothing if its level
+    is disabled, e.g. logging.debug("%s", LazyJson(metrics))
+    """
+
+    def __init__(self, obj, indent=2):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=self.indent, default=str)
+
+
+class DuplicateFilter(logging.Filter):
+    """
+    Suppresses repetitions of a message of at least the given level within interval_seconds, e.g. a threshold
+    warning which is logged on every tick while the condition persists. Messages are identified by their logger,
+    level and format string, so that a message logged with changing arguments, e.g.
+    logging.warning("CPU threshold reached at %s%%", usage), counts as a repetition. An f-string is already rendered,
+    so it is only a repetition with the same text. The next message after the interval reports how often it was
+    suppressed.
+    """
+
+    def __init__(self, interval_seconds, level=logging.WARNING, clock=time.monotonic):
+        super().__init__()
+        self.interval_seconds = interval_seconds
+        self.level = level
+        self.clock = clock
+        # (logger, level, unformatted message) -> [time it was last logged, number of suppressed repetitions]
+        self.last_logged = {}
+        # the tick loop and the heartbeat thread log concurrently
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level or self.interval_seconds <= 0 or not isinstance(record.msg, str):
+            return True
+
+        key = (record.name, record.levelno, record.msg)
+        with self.lock:
+            now = self.clock()
+            last_logged = self.last_logged.get(key)
+            if last_logged is not None and now - last_logged[0] < self.interval_seconds:
+                last_logged[1] += 1
+                return False
+
+            self.last_logged[key] = [now, 0]
+            if len(self.last_logged) > 1000:
+                self.last_logged = {key: value for key, value in self.last_logged.items() if
+                                    now - value[0] < self.interval_seconds}
+        if last_logged is not None and last_logged[1]:
+            record.msg = (f"{record.getMessage()} (repeated {last_logged[1]} times in the last "
+                          f"{round(now - last_logged[0])}s)")
+            record.args = None
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits the messages below ERROR to messages_per_minute with a token bucket, so that a burst of messages does not
+    get the agent throttled by journald. Errors are never dropped. The next message which passes reports the number of
+    dropped messages.
+    """
+
+    def __init__(self, messages_per_minute, clock=time.monotonic):
+        super().__init__()
+        self.rate = messages_per_minute / 60
+        self.capacity = messages_per_minute
+        self.clock = clock
+        self.tokens = messages_per_minute
+        self.last_refill = clock()
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR or self.capacity <= 0:
+            return True
+
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            if self.tokens < 1:
+                self.dropped += 1
+                return False
+
+            self.tokens -= 1
+            dropped = self.dropped
+            self.dropped = 0
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} messages dropped by the rate limit)"
+            record.args = None
+        return True
 
 
 class CustomLogging:
+    # the handler and queue listener installed on the root logger, replaced when logging is configured again
+    handler = None
+    listener = None
+
     def __init__(self):
         self.formatter = CustomLoggingFormatter(datefmt='%Y-%m-%d %H:%M:%S',
                                                 fmt='%(asctime)s.%(msecs)03d %(module)s %(levelname)s: %(message)s',
                                                 fixed_length=15)
 
-    def configure_logging(self):
+    def configure_logging(self, config=None, level=None):
+        """
+        Configures the root logger. By default the records are handed over to a queue and written to the console by
+        a background thread, so that formatting and a slow journald do not block the agent.
+
+        Args:
+        config (AgentConfig): Optional configuration with a logging section in the agent section, see README
+        level (str): Optional log level, overriding the configured level
+        """
+        settings = {}
+        if config is not None:
+            settings = config.get_config_value(['agent', 'logging'], default={})
+        level = logging.getLevelName(str(level or settings.get('level', 'INFO')).upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
         logger = logging.root
-        logger.setLevel(logging.INFO)
+        logger.setLevel(level)
+        self._remove_handler(logger)
 
         # Create console handler
         ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
+        ch.setLevel(level)
+        ch.setFormatter(JsonLinesFormatter() if settings.get('format') == 'json' else self.formatter)
+
+        handler = ch
+        if settings.get('asynchronous', True):
+            # the records are formatted by the listener thread, only the message is rendered by the caller
+            handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+            CustomLogging.listener = logging.handlers.QueueListener(handler.queue, ch)
+            CustomLogging.listener.start()
 
-        ch.setFormatter(self.formatter)
+        handler.addFilter(DuplicateFilter(settings.get('dedup_seconds', 300)))
+        handler.addFilter(RateLimitFilter(settings.get('max_messages_per_minute', 600)))
 
         # Add handler to the logger
-        logger.addHandler(ch)
+        logger.addHandler(handler)
+        CustomLogging.handler = handler
+
+    @staticmethod
+    def _remove_handler(logger):
+        if CustomLogging.handler is not None:
+            logger.removeHandler(CustomLogging.handler)
+            CustomLogging.handler = None
+        if CustomLogging.listener is not None:
+            CustomLogging.listener.stop()
+            CustomLogging.listener = None
+
+
+@atexit.register
+def _flush_logging():
+    # write the queued records before the interpreter exits
+    if CustomLogging.listener is not None:
+        CustomLogging.listener.stop()
+        CustomLogging.listener = None
@@ -1,3 +1,4 @@
+import json
 import logging
 
 
@@ -12,3 +13,17 @@ class CustomLoggingFormatter(logging.Formatter):
                         :self.fixed_length]  # Pad with spaces and truncate if necessary
         return super().format(record)
 
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats each record as a single line of JSON, e.g. for journald or a log shipper"""
+
+    def format(self, record):
+        entry = {
+            'time': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
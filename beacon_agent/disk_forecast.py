@@ -0,0 +1,131 @@
+import logging
+import math
+import time
+
+
+class FillRegression:
+    """
+    Exponentially weighted least squares regression of the usage of a file system over time, updated in O(1) per
+    sample: only the weighted sums are kept, not the samples. The weight of a sample halves every half_life seconds,
+    so the slope follows the recent trend. The time axis is moved to the latest sample on every update, which keeps
+    the sums small and the slope numerically stable.
+    """
+
+    __slots__ = ('decay_seconds', 'first_time', 'last_time', 'samples', 'sum_w', 'sum_t', 'sum_y', 'sum_tt', 'sum_ty')
+
+    def __init__(self, half_life_seconds):
+        self.decay_seconds = half_life_seconds / math.log(2)
+        self.first_time = None
+        self.last_time = None
+        self.samples = 0
+        self.sum_w = self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = 0.0
+
+    def add(self, t, y):
+        if self.last_time is not None:
+            shift = t - self.last_time
+            if shift <= 0:
+                return
+            # decay the previous samples and move the origin of the time axis from the last sample to t
+            decay = math.exp(-shift / self.decay_seconds)
+            self.sum_tt = decay * (self.sum_tt - 2 * shift * self.sum_t + shift * shift * self.sum_w)
+            self.sum_ty = decay * (self.sum_ty - shift * self.sum_y)
+            self.sum_t = decay * (self.sum_t - shift * self.sum_w)
+            self.sum_y *= decay
+            self.sum_w *= decay
+        else:
+            self.first_time = t
+
+        # the new sample is at t = 0, so it adds nothing to sum_t, sum_tt and sum_ty
+        self.sum_w += 1
+        self.sum_y += y
+        self.last_time = t
+        self.samples += 1
+
+    def slope(self):
+        """Returns the change of the usage per second, or None if there are not enough samples"""
+        denominator = self.sum_w * self.sum_tt - self.sum_t * self.sum_t
+        if self.samples < 3 or denominator <= 0:
+            return None
+        return (self.sum_w * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+    def span(self):
+        return 0 if self.first_time is None else self.last_time - self.first_time
+
+
+class DiskFillForecaster:
+    """
+    Forecasts when each file system of disk_usage is full, from the trend of its usage over the last hours, so that a
+    runaway log or backup job is reported before the disk usage reaches notify_threshold_percent.
+    """
+
+    def __init__(self, config, clock=time.monotonic):
+        self.enabled = config.get_config_value(["disk_forecast", "enabled"], default=False)
+        self.clock = clock
+        # mount point -> FillRegression
+        self.regressions = {}
+        if not self.enabled:
+            return
+
+        self.half_life_seconds = config.get_config_value(["disk_forecast", "half_life_minutes"], default=60) * 60
+        self.full_within_hours = config.get_config_value(["disk_forecast", "full_within_hours"], default=24)
+        self.min_span_seconds = config.get_config_value(["disk_forecast", "min_span_minutes"], default=15) * 60
+
+        logging.info("Enabled DiskFillForecaster")
+
+    def annotate(self, disk_usage):
+        """
+        Adds the current usage of each file system to its regression, and its fill rate and time to full to the
+        entries of disk_usage. A file system which is full within full_within_hours gets thresholds_reached.
+        """
+        if not self.enabled:
+            return
+
+        now = self.clock()
+        mount_points = set()
+        for fs in disk_usage:
+            mount_point = fs['mount_point']
+            mount_points.add(mount_point)
+            regression = self.regressions.get(mount_point)
+            if regression is None:
+                regression = self.regressions[mount_point] = FillRegression(self.half_life_seconds)
+            regression.add(now, fs['used'])
+
+            slope = regression.slope()
+            if slope is None or regression.span() < self.min_span_seconds:
+                continue
+            fs['fill_rate_per_hour'] = round(slope * 3600)
+            if slope <= 0:
+                fs['time_to_full_hours'] = None
+                continue
+            hours = fs['available'] / slope / 3600
+            fs['time_to_full_hours'] = round(hours, 1)
+            if hours <= self.full_within_hours:
+                fs['thresholds_reached'] = [f"full in {self._format_hours(hours)}"]
+
+        # forget the regressions of unmounted file systems
+        for mount_point in self.regressions.keys() - mount_points:
+            del self.regressions[mount_point]
+
+    @staticmethod
+    def _format_hours(hours):
+        if hours < 1:
+            return f"{max(1, round(hours * 60))}min"
+        return f"{round(hours, 1)}h"
+
+
+if __name__ == "__main__":
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    # a file system filling with 1 GB per hour with some noise, sampled every 10 seconds for an hour
+    clock_time = [0.0]
+    forecaster = DiskFillForecaster(AgentConfig({"disk_forecast": {"enabled": True}}), clock=lambda: clock_time[0])
+    for i in range(360):
+        clock_time[0] = i * 10.0
+        usage = [{'mount_point': '/', 'used': 50_000_000 + i * 2778 + (i % 7) * 1000,
+                  'available': 20_000_000 - i * 2778}]
+        forecaster.annotate(usage)
+    logging.info(usage)
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+
+from .state_file import write_state_file
+
+
+class DiskInventory:
+    """
+    Keeps a baseline inventory of the physical disks keyed by their WWN or serial number, persisted to a state file.
+    On every tick a cheap scan of /sys/block is compared against the baseline, so that a removed or replaced disk is
+    detected within one tick, independent of the device names and without running smartctl.
+
+    New disks are added to the baseline, except removable devices like USB sticks. A removed disk is reported until
+    it is acknowledged with acknowledge(), e.g. by beacon-agent acknowledge-disks, or the state file is deleted, which
+    accepts the current disks as the new baseline. A change of the state file is picked up on the next tick.
+    """
+
+    # files which contain a stable identity of the disk, in order of preference
+    IDENTITY_FILES = ['wwid', 'device/wwid', 'device/serial', 'serial']
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["disk_inventory", "enabled"], default=False)
+        if not self.enabled:
+            return
+
+        state_dir = config.get_config_value(["agent", "state_dir"], default='/var/lib/beacon-agent')
+        self.state_file = config.get_config_value(["disk_inventory", "state_file"],
+                                                  default=os.path.join(state_dir, 'disk_inventory.json'))
+        # e.g. a one-shot run, which must not change the baseline of the daemon
+        self.read_only = config.get_config_value(["agent", "read_only_state"], default=False)
+        self.state_stamp = None
+        self.baseline = self._load_baseline()
+
+        logging.info(f"Enabled DiskInventory with {len(self.baseline)} known disks")
+
+    def _stat_state_file(self):
+        """Returns the modification time and inode of the state file, or None if it does not exist"""
+        try:
+            stat = os.stat(self.state_file)
+            return stat.st_mtime_ns, stat.st_ino
+        except OSError:
+            return None
+
+    def _load_baseline(self):
+        self.state_stamp = self._stat_state_file()
+        try:
+            with open(self.state_file, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to read disk inventory {self.state_file}, starting with a new baseline: {e}")
+            return {}
+
+    def _save_baseline(self):
+        try:
+            write_state_file(self.state_file, self.baseline, indent=2)
+            self.state_stamp = self._stat_state_file()
+        except OSError as e:
+            logging.error(f"Failed to write disk inventory {self.state_file}: {e}")
+
+    @staticmethod
+    def _read_sysfs(path):
+        try:
+            with open(path, 'r') as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    @classmethod
+    def identify(cls, name):
+        """Returns the WWN or serial number of the given disk, e.g. sda or nvme0, or None if it has none"""
+        if name.startswith('nvme') and 'n' not in name[4:]:
+            # the S.M.A.R.T. readers use the controller, which has the serial number
+            return cls._read_sysfs(f'/sys/class/nvme/{name}/serial')
+
+        for identity_file in cls.IDENTITY_FILES:
+            identity = cls._read_sysfs(f'/sys/block/{name}/{identity_file}')
+            if identity:
+                return identity
+        return None
+
+    @classmethod
+    def scan(cls):
+        """Returns the currently present physical disks as a dictionary of identity to disk details"""
+        disks = {}
+        for name in os.listdir('/sys/block'):
+            block_dir = f'/sys/block/{name}'
+            # virtual devices, e.g. loop, zram, dm and md don't have a device
+            if not os.path.exists(f'{block_dir}/device'):
+                continue
+            # removable devices like USB sticks and card readers come and go
+            if cls._read_sysfs(f'{block_dir}/removable') == '1':
+                continue
+
+            identity = cls.identify(name)
+            if not identity:
+                logging.debug(f"Disk {name} has no WWN or serial, can not add it to the inventory")
+                continue
+
+            disks[identity] = {
+                'name': name,
+                'model': cls._read_sysfs(f'{block_dir}/device/model') or ''
+            }
+        return disks
+
+    def read_removed_disks(self):
+        """
+        Returns the disks of the baseline which are not present anymore, or None if all known disks are present. If
+        the device name of a removed disk is now used by another disk, that disk is added as replaced_by.
+        """
+        if not self.enabled:
+            return None
+
+        if self._stat_state_file() != self.state_stamp:
+            # acknowledged by another process, or deleted to accept the current disks
+            logging.info(f"Disk inventory {self.state_file} changed, reloading the baseline")
+            self.baseline = self._load_baseline()
+
+        disks = self.scan()
+
+        changed = False
+        for identity, disk in disks.items():
+            known_disk = self.baseline.get(identity)
+            if known_disk is None:
+                logging.info(f"Adding disk {disk['name']} ({identity}) to the inventory")
+                self.baseline[identity] = disk
+                changed = True
+            elif known_disk['name'] != disk['name']:
+                # the device names were reshuffled, e.g. after a reboot, which is not a problem
+                known_disk['name'] = disk['name']
+                changed = True
+        if changed and not self.read_only:
+            self._save_baseline()
+
+        current_names = {disk['name']: identity for identity, disk in disks.items()}
+        removed_disks = []
+        for identity, disk in self.baseline.items():
+            if identity in disks:
+                continue
+            removed_disk = {'name': disk['name'], 'id': identity, 'model': disk['model']}
+            if disk['name'] in current_names:
+                removed_disk['replaced_by'] = current_names[disk['name']]
+            removed_disks.append(removed_disk)
+
+        return removed_disks or None
+
+    def acknowledge(self):
+        """
+        Accepts the currently present disks as the new baseline, so that removed disks are not reported anymore.
+
+        Returns:
+        list: The identities of the disks which were removed from the baseline
+        """
+        disks = self.scan()
+        removed = [identity for identity in self.baseline if identity not in disks]
+        self.baseline = disks
+        self._save_baseline()
+        return removed
+
+
+if __name__ == "__main__":
+    from .custom_logging import CustomLogging
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    logging.info(json.dumps(DiskInventory.scan(), indent=2))
@@ -0,0 +1,104 @@
+import logging
+import os
+import time
+
+
+class DiskIoReader:
+    """
+    Reads /proc/diskstats once per tick and calculates the IOPS, throughput, utilisation and average await of all
+    whole disks from the deltas of the counters to the previous tick.
+    """
+
+    # the indices of the used counters after the major, minor and device name columns
+    READS, SECTORS_READ, MS_READING, WRITES, SECTORS_WRITTEN, MS_WRITING, MS_DOING_IO = 0, 2, 3, 4, 6, 7, 9
+    SECTOR_SIZE = 512
+    IGNORED_PREFIXES = ('loop', 'ram', 'zram', 'sr', 'fd')
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["disk_io", "enabled"], default=False)
+        if not self.enabled:
+            return
+
+        self.devices = config.get_config_value(["disk_io", "devices"], default=[])
+        self.util_threshold_percent = config.get_config_value(["disk_io", "util_threshold_percent"], default=0)
+        self.await_threshold_ms = config.get_config_value(["disk_io", "await_threshold_ms"], default=0)
+
+        # device name -> counters of the previous tick
+        self.prev_counters = {}
+        self.prev_time = None
+        # device name -> whether it is a whole disk, i.e. not a partition
+        self.whole_disks = {}
+
+        logging.info("Enabled DiskIoReader")
+
+    def read_disk_io(self):
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        with open('/proc/diskstats', 'r') as f:
+            lines = f.readlines()
+
+        counters = {}
+        for line in lines:
+            fields = line.split()
+            name = fields[2]
+            if self._is_monitored(name):
+                counters[name] = tuple(map(int, fields[3:14]))
+
+        disk_io = {}
+        if self.prev_time is not None:
+            elapsed = now - self.prev_time
+            for name, current in counters.items():
+                prev = self.prev_counters.get(name)
+                if prev is not None:
+                    disk_io[name] = self._calculate(
+                        [curr_value - prev_value for curr_value, prev_value in zip(current, prev)], elapsed)
+
+        self.prev_counters = counters
+        self.prev_time = now
+        return disk_io
+
+    def _is_monitored(self, name):
+        if self.devices:
+            return name in self.devices
+
+        whole_disk = self.whole_disks.get(name)
+        if whole_disk is None:
+            whole_disk = not name.startswith(self.IGNORED_PREFIXES) and os.path.exists(f'/sys/block/{name}')
+            self.whole_disks[name] = whole_disk
+        return whole_disk
+
+    def _calculate(self, delta, elapsed):
+        ios = delta[self.READS] + delta[self.WRITES]
+        stats = {
+            'read_iops': round(delta[self.READS] / elapsed, 1),
+            'write_iops': round(delta[self.WRITES] / elapsed, 1),
+            'read_bytes_per_second': int(delta[self.SECTORS_READ] * self.SECTOR_SIZE / elapsed),
+            'write_bytes_per_second': int(delta[self.SECTORS_WRITTEN] * self.SECTOR_SIZE / elapsed),
+            'util_percent': round(min(100.0, delta[self.MS_DOING_IO] / (elapsed * 1000) * 100), 1),
+            'await_ms': round((delta[self.MS_READING] + delta[self.MS_WRITING]) / ios, 2) if ios else 0.0
+        }
+
+        thresholds_reached = []
+        if self.util_threshold_percent and stats['util_percent'] > self.util_threshold_percent:
+            thresholds_reached.append(f"utilisation at {stats['util_percent']}%")
+        if self.await_threshold_ms and stats['await_ms'] > self.await_threshold_ms:
+            thresholds_reached.append(f"await at {stats['await_ms']}ms")
+        if thresholds_reached:
+            stats['thresholds_reached'] = thresholds_reached
+        return stats
+
+
+if __name__ == "__main__":
+    import json
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    disk_io_reader = DiskIoReader(AgentConfig({"disk_io": {"enabled": True}}))
+    disk_io_reader.read_disk_io()
+    time.sleep(1)
+    logging.info(json.dumps(disk_io_reader.read_disk_io(), indent=2))
@@ -1,7 +1,13 @@
+import asyncio
 import shutil
 import subprocess
 import json
 import logging
+import time
+from collections import deque
+
+from .async_subprocess import run_process
+from .cgroup_reader import CgroupReader
 
 
 class DockerReader:
@@ -16,26 +22,29 @@ class DockerReader:
             self.enabled = False
             return
 
+        # whether to inspect the health, restarts and exit code of the containers
+        self.inspect_state = config.get_config_value(["docker", "inspect_state"], default=True)
+        self.restart_threshold = config.get_config_value(["docker", "restart_threshold"], default=3)
+        self.restart_window_seconds = config.get_config_value(["docker", "restart_window_minutes"], default=10) * 60
+        # container id -> (monotonic time, restart count) whenever the restart count changed, oldest first
+        self.restart_history = {}
+
+        self.cgroup_reader = CgroupReader(config)
         logging.info("Enabled DockerReader")
 
+    def close(self):
+        if self.enabled:
+            self.cgroup_reader.close()
+
     @staticmethod
-    def _run_command(command):
+    def _run_command(command, partial=False):
         """
         Run a shell command and return the output.
         Handles permission errors and other issues gracefully.
         """
         try:
             result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-            if result.returncode != 0:
-                # Check for permission denied error in stderr
-                if "permission denied" in result.stderr.lower():
-                    logging.error(f"Permission denied while running command: {' '.join(command)}")
-                else:
-                    logging.error(f"Error running command {command}: {result.stderr}")
-                return None
-
-            return result.stdout
+            return DockerReader._evaluate_result(command, result, partial)
 
         except PermissionError as e:
             logging.error(f"PermissionError: {e}. You may need elevated privileges to run this command.")
@@ -49,15 +58,67 @@ class DockerReader:
             logging.error(f"An unexpected error occurred: {e}")
             return None
 
+    @staticmethod
+    async def _run_command_async(command, partial=False):
+        """Asynchronous variant of _run_command() for the asyncio engine"""
+        try:
+            result = await run_process(command)
+            return DockerReader._evaluate_result(command, result, partial)
+
+        except PermissionError as e:
+            logging.error(f"PermissionError: {e}. You may need elevated privileges to run this command.")
+            return None
+
+        except Exception as e:
+            logging.error(f"An unexpected error occurred: {e}")
+            return None
+
+    @staticmethod
+    def _evaluate_result(command, result, partial=False):
+        """
+        Returns the output of the command, or None if it failed. With partial, the output of a failed command is
+        returned if there is any, e.g. of docker inspect if one of the containers was removed in the meantime.
+        """
+        if result.returncode != 0 and partial and result.stdout:
+            logging.debug(f"Command {' '.join(command[:2])} partially failed: {result.stderr}")
+        elif result.returncode != 0:
+            # Check for permission denied error in stderr
+            if "permission denied" in result.stderr.lower():
+                logging.error(f"Permission denied while running command: {' '.join(command)}")
+            else:
+                logging.error(f"Error running command {command}: {result.stderr}")
+            return None
+
+        return result.stdout
+
+    PS_COMMAND = ["docker", "ps", "--all", "--format", "{{json .}}"]
+    # only the state of the containers, one JSON object per line
+    INSPECT_COMMAND = ["docker", "inspect", "--type", "container", "--format",
+                       '{"Id":{{json .Id}},"RestartCount":{{json .RestartCount}},"State":{{json .State}}}']
+    EVENTS_COMMAND = ["docker", "events", "--filter", "type=container", "--filter", "event=start",
+                      "--filter", "event=die", "--filter", "event=oom", "--filter", "event=health_status",
+                      "--format", "{{json .}}"]
+
     def _get_docker_containers(self):
         """Get details of all running Docker containers."""
         if shutil.which("docker") is None:
             logging.error("docker command is not available. Please disable docker reader!")
             return []
 
-        command = ["docker", "ps", "--all", "--format", "{{json .}}"]
-        output = self._run_command(command)
+        output = self._run_command(self.PS_COMMAND)
+        return self._parse_containers(output)
 
+    async def _get_docker_containers_async(self):
+        """Asynchronous variant of _get_docker_containers()"""
+        if shutil.which("docker") is None:
+            logging.error("docker command is not available. Please disable docker reader!")
+            return []
+
+        output = await self._run_command_async(self.PS_COMMAND)
+        return self._parse_containers(output)
+
+    @staticmethod
+    def _parse_containers(output):
         if not output:
             return []
 
@@ -77,7 +138,88 @@ class DockerReader:
         if not self.enabled:
             return None
 
-        containers = self._get_docker_containers()
+        projects = self._group_by_project(self._get_docker_containers())
+        if self.inspect_state and projects:
+            self._attach_state(projects, self._run_command(self._inspect_command(projects), partial=True))
+        return self.cgroup_reader.attach_resource_usage(projects)
+
+    async def list_projects_async(self):
+        """Asynchronous variant of list_projects()"""
+        if not self.enabled:
+            return None
+
+        projects = self._group_by_project(await self._get_docker_containers_async())
+        if self.inspect_state and projects:
+            self._attach_state(projects,
+                               await self._run_command_async(self._inspect_command(projects), partial=True))
+        return self.cgroup_reader.attach_resource_usage(projects)
+
+    def _inspect_command(self, projects):
+        # a single docker inspect for all containers instead of one per container
+        return self.INSPECT_COMMAND + [container['container_id'] for containers in projects.values() for
+                                       container in containers]
+
+    def _attach_state(self, projects, output):
+        """
+        Adds the health, restart count, exit code and whether the container was killed for running out of memory
+        to each container, from the output of the INSPECT_COMMAND. A running container which is unhealthy or restarted
+        at least restart_threshold times within restart_window_minutes gets a list of failures. oom_killed is only
+        reported, docker keeps it set until the container is restarted, so it would keep the monitor down.
+        """
+        states = {}
+        for line in (output or '').splitlines():
+            try:
+                inspected = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping malformed docker inspect line: {line}")
+                continue
+            # docker ps reports the short id
+            states[inspected['Id'][:12]] = inspected
+
+        now = time.monotonic()
+        container_ids = set()
+        for containers in projects.values():
+            for container in containers:
+                inspected = states.get(container['container_id'][:12])
+                if inspected is None:
+                    continue
+                state = inspected.get('State') or {}
+                health = state.get('Health') or {}
+                container_ids.add(container['container_id'])
+                container['health'] = health.get('Status')
+                container['restart_count'] = inspected.get('RestartCount', 0)
+                container['restarts'] = self._count_restarts(container['container_id'], container['restart_count'], now)
+                container['exit_code'] = state.get('ExitCode')
+                container['oom_killed'] = state.get('OOMKilled', False)
+
+                failures = []
+                if container['health'] == 'unhealthy':
+                    failures.append(f"unhealthy for {health.get('FailingStreak', 0)} checks")
+                if container['restarts'] >= self.restart_threshold > 0:
+                    failures.append(f"restarted {container['restarts']} times in "
+                                    f"{round(self.restart_window_seconds / 60)}min")
+                if failures:
+                    container['failures'] = failures
+
+        # forget the removed containers
+        for container_id in self.restart_history.keys() - container_ids:
+            del self.restart_history[container_id]
+
+    def _count_restarts(self, container_id, restart_count, now):
+        """Returns how often the container was restarted by docker within restart_window_seconds"""
+        history = self.restart_history.get(container_id)
+        if history is None or restart_count < history[-1][1]:
+            # a new container, or the count was reset by a manual start
+            history = self.restart_history[container_id] = deque([(now, restart_count)])
+        elif restart_count != history[-1][1]:
+            history.append((now, restart_count))
+
+        # keep the last change before the window as the count at its start
+        while len(history) > 1 and history[1][0] <= now - self.restart_window_seconds:
+            history.popleft()
+        return restart_count - history[0][1]
+
+    def _group_by_project(self, containers):
         projects = {}
 
         for container in containers:
@@ -104,6 +246,50 @@ class DockerReader:
 
         return projects
 
+    async def watch_events(self, on_event, restart_delay_seconds=10):
+        """
+        Follow the output of docker events and call on_event(reason, collectors) whenever a container is started,
+        dies or changes its health, so that the asyncio engine can refresh immediately instead of on the next tick.
+        """
+        if not self.enabled:
+            return
+
+        while True:
+            try:
+                process = await asyncio.create_subprocess_exec(*self.EVENTS_COMMAND, stdout=asyncio.subprocess.PIPE,
+                                                               stderr=asyncio.subprocess.DEVNULL)
+            except Exception as e:
+                logging.error(f"Failed to follow docker events: {e}")
+                await asyncio.sleep(restart_delay_seconds)
+                continue
+
+            try:
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+                    reason = self._parse_event(line)
+                    if reason:
+                        on_event(reason, ['docker'])
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+            logging.warning(f"docker events stopped, restarting in {restart_delay_seconds}s")
+            await asyncio.sleep(restart_delay_seconds)
+
+    @staticmethod
+    def _parse_event(line):
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            logging.warning(f"Skipping malformed docker event: {line}")
+            return None
+
+        name = event.get('Actor', {}).get('Attributes', {}).get('name', event.get('id', '')[:12])
+        return f"Docker container {name} {event.get('Action', event.get('status'))}"
+
     @staticmethod
     def _parse_docker_labels(label_str):
         """
@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+
+from .state_file import write_state_file
+
+
+class KernelLogReader:
+    """
+    Follows the kernel log on /dev/kmsg for disk, controller and hardware errors, which usually show up long before
+    the S.M.A.R.T. status changes. Only new records are read: the sequence number of the last read record is persisted
+    together with the boot id, so that a restart of the agent continues where it stopped, and a reboot starts with the
+    records of the new boot. With read_only_state, e.g. in a one-shot run, the whole ring buffer is read and the state
+    is neither read nor written.
+
+    The errors are counted per device and kind within window_minutes, aged by the timestamps of the records, so that
+    the replayed records of a new boot do not count as recent errors. A device reaches the threshold with at least
+    device_threshold errors within the window, so that a single error, e.g. of an empty optical drive, is not reported.
+    A burst of at least burst_threshold errors within burst_window_seconds requests an immediate push.
+    """
+
+    KMSG = '/dev/kmsg'
+    BOOT_ID = '/proc/sys/kernel/random/boot_id'
+
+    # (kind, pattern), the device is the named group device if present
+    PATTERNS = [
+        ('io_error', r'I/O error, dev (?P<device>[^,\s]+)'),
+        ('io_error', r'Buffer I/O error on dev(?:ice)? (?P<device>[^,\s]+)'),
+        ('medium_error', r'\[(?P<device>sd[a-z]+)\].*(?:Medium Error|Unrecovered read error)'),
+        ('ata_error', r'^(?P<device>ata\d+(?:\.\d+)?): (?:hard resetting link|failed command|exception Emask|SError)'),
+        ('nvme_error', r'^nvme (?P<device>nvme\d+): (?:I/O \d+ QID \d+ timeout|controller is down|'
+                       r'Removing after probe failure|Device not ready|resetting controller)'),
+        ('fs_error', r'^(?:EXT4-fs error|BTRFS error|BTRFS critical) \(device (?P<device>[^)\s]+)\)'),
+        ('fs_error', r'^XFS \((?P<device>[^)]+)\): (?:.*metadata I/O error|Corruption)'),
+        ('mce', r'(?:mce: \[Hardware Error\]|Machine check events logged)'),
+        ('edac', r'^EDAC (?P<device>MC\d+): \d+ (?:CE|UE) '),
+    ]
+
+    # the collectors to refresh on a burst of errors, and the new state is pushed immediately
+    refresh_collectors = ['kernel_log']
+    push_immediately = True
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["kernel_log", "enabled"], default=False)
+        self.fd = None
+        if not self.enabled:
+            return
+
+        state_dir = config.get_config_value(["agent", "state_dir"], default='/var/lib/beacon-agent')
+        self.state_file = config.get_config_value(["kernel_log", "state_file"],
+                                                  default=os.path.join(state_dir, 'kernel_log.json'))
+        self.read_only = config.get_config_value(["agent", "read_only_state"], default=False)
+        self.window_seconds = config.get_config_value(["kernel_log", "window_minutes"], default=60) * 60
+        self.device_threshold = config.get_config_value(["kernel_log", "device_threshold"], default=3)
+        self.burst_threshold = config.get_config_value(["kernel_log", "burst_threshold"], default=5)
+        self.burst_window_seconds = config.get_config_value(["kernel_log", "burst_window_seconds"], default=60)
+        self.max_recent = config.get_config_value(["kernel_log", "max_recent"], default=5)
+        patterns = config.get_config_value(["kernel_log", "patterns"], default=[])
+        # a list of [kind, pattern] pairs, or a map of kind to a single pattern
+        if isinstance(patterns, dict):
+            patterns = list(patterns.items())
+        self.patterns = [(kind, re.compile(pattern)) for kind, pattern in self.PATTERNS + patterns]
+
+        # (monotonic time of the record, device, kind) of the errors within the window
+        self.errors = deque()
+        self.recent = deque(maxlen=self.max_recent)
+        self.last_burst_time = None
+        self.boot_id = self._read_boot_id()
+        self.seq = None
+        self.saved_seq = None
+
+        try:
+            self.fd = os.open(self.KMSG, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError as e:
+            logging.warning(f"Failed to open {self.KMSG}, kernel log errors are not reported: {e}")
+            self.enabled = False
+            return
+
+        state = self._load_state() if not self.read_only else None
+        if state is None:
+            # e.g. a one-shot run does not continue at the position of the daemon, but reads the whole ring buffer, of
+            # which only the errors within the window are reported
+            logging.debug("Reading the whole kernel log")
+        elif state.get('boot_id') == self.boot_id:
+            # skip the records which were already read before the restart
+            self.seq = state.get('seq')
+        elif state:
+            logging.info("Reading the kernel log of the new boot")
+        else:
+            # the first start, only report new errors
+            os.lseek(self.fd, 0, os.SEEK_END)
+        self.saved_seq = self.seq
+
+        logging.info("Enabled KernelLogReader")
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to read kernel log state {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self):
+        try:
+            write_state_file(self.state_file, {'boot_id': self.boot_id, 'seq': self.seq})
+            self.saved_seq = self.seq
+        except OSError as e:
+            logging.error(f"Failed to write kernel log state {self.state_file}: {e}")
+
+    def _read_boot_id(self):
+        try:
+            with open(self.BOOT_ID, 'r') as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def handle_events(self):
+        """
+        Reads all new kernel log records and counts the matching errors.
+
+        Returns:
+        str: The reason for an immediate push if there was a burst of errors, or None
+        """
+        new_errors = 0
+        while True:
+            try:
+                # each read returns a single record
+                record = os.read(self.fd, 8192)
+            except BlockingIOError:
+                break
+            except BrokenPipeError:
+                # records were overwritten in the ring buffer before we read them, continue with the next one
+                logging.warning("Missed kernel log records, the ring buffer was overwritten")
+                continue
+            except OSError as e:
+                logging.warning(f"Failed to read the kernel log: {e}")
+                break
+            if not record:
+                break
+            new_errors += self.handle_record(record.decode('utf-8', errors='replace'))
+
+        if new_errors == 0:
+            return None
+        now = time.monotonic()
+        burst_errors = sum(1 for error_time, _, _ in self.errors if now - error_time <= self.burst_window_seconds)
+        if burst_errors >= self.burst_threshold and (
+                self.last_burst_time is None or now - self.last_burst_time > self.burst_window_seconds):
+            self.last_burst_time = now
+            return f"{burst_errors} kernel errors within {self.burst_window_seconds}s"
+        return None
+
+    def handle_record(self, record):
+        """
+        Parses a single /dev/kmsg record of the form "priority,seq,timestamp,flags;message" and counts it if it
+        matches a pattern.
+
+        Returns:
+        int: 1 if the record is an error, 0 otherwise
+        """
+        header, _, text = record.partition(';')
+        fields = header.split(',')
+        try:
+            seq = int(fields[1])
+            # the timestamp is in microseconds since boot, on the same clock as time.monotonic()
+            record_time = min(int(fields[2]) / 1_000_000, time.monotonic())
+        except (IndexError, ValueError):
+            logging.debug(f"Skipping malformed kernel log record: {record[:100]}")
+            return 0
+        if self.seq is not None and seq <= self.seq:
+            return 0
+        self.seq = seq
+
+        # continuation lines with the device properties start with a space
+        message = text.split('\n', 1)[0]
+        for kind, pattern in self.patterns:
+            match = pattern.search(message)
+            if match:
+                device = match.groupdict().get('device') or kind
+                self.errors.append((record_time, device, kind))
+                self.recent.append(message[:200])
+                return 1
+        return 0
+
+    def read_kernel_log(self):
+        if not self.enabled:
+            return None
+
+        # also handles the records if the engine does not wait on the descriptor
+        self.handle_events()
+        if self.seq != self.saved_seq and not self.read_only:
+            self._save_state()
+
+        now = time.monotonic()
+        while self.errors and now - self.errors[0][0] > self.window_seconds:
+            self.errors.popleft()
+
+        devices = {}
+        for _, device, kind in self.errors:
+            kinds = devices.setdefault(device, {})
+            kinds[kind] = kinds.get(kind, 0) + 1
+
+        kernel_log = {'errors': devices}
+        if devices:
+            kernel_log['recent'] = list(self.recent)
+        thresholds_reached = [f"{device} {', '.join(f'{count} {kind}' for kind, count in kinds.items())}" for
+                              device, kinds in devices.items() if sum(kinds.values()) >= self.device_threshold]
+        if thresholds_reached:
+            kernel_log['thresholds_reached'] = thresholds_reached
+        return kernel_log
+
+
+if __name__ == "__main__":
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    reader = KernelLogReader(AgentConfig({"kernel_log": {"enabled": True, "state_file": "/tmp/kernel_log.json"}}))
+    logging.info(json.dumps(reader.read_kernel_log(), indent=2))
@@ -0,0 +1,106 @@
+from urllib.parse import quote_plus
+
+
+class KumaMessage:
+    """
+    Collects the findings of a tick and builds the UptimeKuma message within a byte budget, measured URL-encoded as
+    the message is sent in the query string. Findings are ordered by
+    severity, so that critical findings are never pushed out by warnings or OK messages, and findings which do not fit
+    are summarised as "+N more".
+
+    The status is down as soon as one finding is critical or a warning.
+    """
+
+    CRITICAL = 0
+    WARNING = 1
+    INFO = 2
+
+    def __init__(self, max_bytes=1024, max_group_items=3):
+        """
+        Args:
+        max_bytes (int): The maximum size of the message in bytes, URL-encoded
+        max_group_items (int): The maximum number of findings of a group before they are collapsed into a summary
+        """
+        self.max_bytes = max_bytes
+        self.max_group_items = max_group_items
+        # list of (severity, text), in the order they were added
+        self.findings = []
+
+    def copy(self):
+        message = KumaMessage(self.max_bytes, self.max_group_items)
+        message.findings = list(self.findings)
+        return message
+
+    def add(self, severity, text):
+        self.findings.append((severity, text))
+
+    def add_group(self, severity, texts, summary):
+        """
+        Adds the given findings, or only the summary if there are more than max_group_items of them, e.g. "37
+        containers stopped in project X" instead of a finding for each container.
+        """
+        if len(texts) > self.max_group_items:
+            self.add(severity, summary)
+        else:
+            for text in texts:
+                self.add(severity, text)
+
+    def status(self):
+        return "down" if any(severity < self.INFO for severity, _ in self.findings) else "up"
+
+    def highest_severity(self):
+        """Returns the severity of the most severe finding, or None if there are no findings"""
+        return min((severity for severity, _ in self.findings), default=None)
+
+    def build(self, trailer=""):
+        """
+        Builds the message from the most severe findings which fit into the budget, followed by the given trailer.
+
+        Returns:
+        str: The message, at most max_bytes long
+        """
+        budget = self.max_bytes - self._size(trailer)
+        message = ""
+        used = 0
+        ordered = sorted(self.findings, key=lambda finding: finding[0])
+        for index, (severity, text) in enumerate(ordered):
+            text = f"{text}. "
+            size = self._size(text)
+            remaining = len(ordered) - index - 1
+            # keep room for the summary of the findings which do not fit
+            reserve = self._size(f"+{remaining} more. ") if remaining else 0
+            if used + size + reserve <= budget:
+                message += text
+                used += size
+                continue
+
+            if message:
+                remaining += 1
+            else:
+                # the most severe finding is truncated instead of being dropped
+                message = self._truncate(text, budget - reserve)
+            if remaining:
+                message += f"+{remaining} more. "
+            break
+
+        return message + trailer
+
+    @staticmethod
+    def _size(text):
+        # e.g. a comma takes 3 bytes in the query string, a non-ASCII character 6 to 12
+        return len(quote_plus(text))
+
+    @staticmethod
+    def _truncate(text, max_bytes):
+        if max_bytes <= 4:
+            return ""
+        if KumaMessage._size(text) <= max_bytes:
+            return text
+        truncated = ""
+        used = KumaMessage._size("... ")
+        for character in text:
+            used += KumaMessage._size(character)
+            if used > max_bytes:
+                break
+            truncated += character
+        return truncated + "... "
@@ -0,0 +1,202 @@
+import logging
+import os
+import socket
+import struct
+import time
+
+# rtnetlink multicast groups and message types, see linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+RTM_NEWLINK, RTM_DELLINK, RTM_NEWADDR, RTM_DELADDR = 16, 17, 20, 21
+IFF_RUNNING = 0x40
+
+NLMSG_HEADER = struct.Struct('=IHHII')
+IFINFO_MSG = struct.Struct('=BxHiII')
+
+
+class NetworkReader:
+    """
+    Follows the link and address changes of the network interfaces by subscribing to rtnetlink events, so that the
+    IP addresses are refreshed on a change without polling. The subscription is independent of the network section,
+    which enables reading the counters of /proc/net/dev on every tick to calculate the throughput, errors and drops of
+    each interface.
+    """
+
+    IGNORED_PREFIXES = ('lo', 'docker', 'br-', 'veth', 'ifb')
+
+    # the collectors to refresh on an event, a link going down is pushed by the threshold check
+    refresh_collectors = ['system_info', 'network']
+    push_immediately = False
+
+    def __init__(self, config, watch_addresses=True):
+        """
+        Args:
+        config (AgentConfig): The configuration
+        watch_addresses (bool): Whether to follow the address changes for the system_info collector
+        """
+        self.enabled = config.get_config_value(["network", "enabled"], default=False)
+        self.watch_addresses = watch_addresses
+        self.socket = None
+        self.interfaces = []
+        # start with a change, so that the addresses are read on the first tick
+        self.addresses_changed = True
+        if not self.enabled and not watch_addresses:
+            return
+
+        if self.enabled:
+            self.error_rate_threshold = config.get_config_value(["network", "error_rate_threshold"], default=0)
+            self.interfaces = config.get_config_value(["network", "interfaces"], default=[])
+            if not self.interfaces:
+                # check the link state of all interfaces which are up on startup
+                self.interfaces = [name for name in os.listdir('/sys/class/net') if
+                                   not name.startswith(self.IGNORED_PREFIXES) and self._read_operstate(name) == 'up']
+            self.prev_counters = {}
+            self.prev_time = None
+
+        try:
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW | socket.SOCK_NONBLOCK,
+                                        socket.NETLINK_ROUTE)
+            self.socket.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Failed to subscribe to rtnetlink events, refreshing addresses on every tick: {e}")
+            self.socket = None
+
+        if self.enabled:
+            logging.info(f"Enabled NetworkReader, checking link state of {', '.join(self.interfaces)}")
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def handle_events(self):
+        """
+        Reads all pending rtnetlink messages. Address changes are only marked, so that the addresses are refreshed
+        with the next tick. A link going up or down on a checked interface requests an immediate refresh.
+
+        Returns:
+        str: The reason for an immediate refresh, or None
+        """
+        reason = None
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except BlockingIOError:
+                return reason
+            except OSError as e:
+                # e.g. ENOBUFS if we did not keep up, so simply refresh everything
+                logging.warning(f"Failed to read rtnetlink events: {e}")
+                self.addresses_changed = True
+                return reason
+
+            for message_type, payload in self._parse_messages(data):
+                if message_type in (RTM_NEWADDR, RTM_DELADDR):
+                    self.addresses_changed = True
+                elif message_type in (RTM_NEWLINK, RTM_DELLINK) and len(payload) >= IFINFO_MSG.size:
+                    self.addresses_changed = True
+                    _, _, index, flags, _ = IFINFO_MSG.unpack_from(payload)
+                    try:
+                        name = socket.if_indextoname(index)
+                    except OSError:
+                        continue
+                    if name in self.interfaces:
+                        state = 'up' if message_type == RTM_NEWLINK and flags & IFF_RUNNING else 'down'
+                        reason = f"Link {name} changed to {state}"
+
+    @staticmethod
+    def _parse_messages(data):
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            length, message_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if length < NLMSG_HEADER.size:
+                break
+            yield message_type, data[offset + NLMSG_HEADER.size:offset + length]
+            # messages are aligned to 4 bytes
+            offset += (length + 3) & ~3
+
+    def consume_addresses_changed(self):
+        """Returns True if the addresses changed since the last call, i.e. they need to be refreshed"""
+        if self.socket is None:
+            # without events the addresses are re-read on every tick, which is cheap
+            return self.enabled or self.watch_addresses
+        # also handles the events if the engine does not wait on the socket
+        self.handle_events()
+        addresses_changed = self.addresses_changed
+        self.addresses_changed = False
+        return addresses_changed
+
+    def read_network(self):
+        if not self.enabled:
+            return None
+
+        if self.socket is not None:
+            # also handles the events if the engine does not wait on the socket
+            self.handle_events()
+
+        now = time.monotonic()
+        counters = self._read_counters()
+
+        network = {}
+        elapsed = now - self.prev_time if self.prev_time is not None else None
+        for name in list(counters.keys()) + [name for name in self.interfaces if name not in counters]:
+            interface = {'operstate': self._read_operstate(name)}
+            current = counters.get(name)
+            prev = self.prev_counters.get(name)
+            if elapsed and current is not None and prev is not None:
+                rx_bytes, rx_errors, rx_drops, tx_bytes, tx_errors, tx_drops = (
+                    (curr_value - prev_value) / elapsed for curr_value, prev_value in zip(current, prev))
+                interface.update({
+                    'rx_bytes_per_second': int(rx_bytes),
+                    'tx_bytes_per_second': int(tx_bytes),
+                    'rx_errors_per_second': round(rx_errors, 2),
+                    'tx_errors_per_second': round(tx_errors, 2),
+                    'rx_drops_per_second': round(rx_drops, 2),
+                    'tx_drops_per_second': round(tx_drops, 2)
+                })
+
+            thresholds_reached = self._evaluate_thresholds(name, interface)
+            if thresholds_reached:
+                interface['thresholds_reached'] = thresholds_reached
+            network[name] = interface
+
+        self.prev_counters = counters
+        self.prev_time = now
+        return network
+
+    def _evaluate_thresholds(self, name, interface):
+        thresholds_reached = []
+        if name in self.interfaces and interface['operstate'] not in ('up', 'unknown'):
+            thresholds_reached.append(f"link {interface['operstate']}")
+        if self.error_rate_threshold and 'rx_errors_per_second' in interface:
+            error_rate = sum(interface[key] for key in ('rx_errors_per_second', 'tx_errors_per_second',
+                                                        'rx_drops_per_second', 'tx_drops_per_second'))
+            if error_rate > self.error_rate_threshold:
+                thresholds_reached.append(f"{round(error_rate, 2)} errors and drops per second")
+        return thresholds_reached
+
+    def _read_counters(self):
+        """Returns the received bytes, errors and drops and the transmitted bytes, errors and drops per interface"""
+        counters = {}
+        with open('/proc/net/dev', 'r') as f:
+            # skip the two header lines
+            for line in f.readlines()[2:]:
+                name, _, values = line.partition(':')
+                name = name.strip()
+                if name.startswith(self.IGNORED_PREFIXES) and name not in self.interfaces:
+                    continue
+                fields = values.split()
+                counters[name] = (int(fields[0]), int(fields[2]), int(fields[3]),
+                                  int(fields[8]), int(fields[10]), int(fields[11]))
+        return counters
+
+    @staticmethod
+    def _read_operstate(name):
+        try:
+            with open(f'/sys/class/net/{name}/operstate', 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return 'missing'
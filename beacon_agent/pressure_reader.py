@@ -0,0 +1,89 @@
+import logging
+import os
+import time
+
+
+class PressureReader:
+    """
+    Reads the Pressure Stall Information of the kernel from /proc/pressure, i.e. the share of time in which tasks were
+    stalled waiting for CPU, memory or I/O. Unlike the CPU and memory percentages, this only rises when the system is
+    actually short of a resource, e.g. a full page cache does not cause memory pressure.
+
+    Besides the averages of the kernel, the stall percentage since the previous tick is calculated from the total
+    stall time.
+    """
+
+    PRESSURE_DIR = '/proc/pressure'
+    RESOURCES = ['cpu', 'memory', 'io']
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["pressure", "enabled"], default=False)
+        if not self.enabled:
+            return
+
+        if not os.path.isdir(self.PRESSURE_DIR):
+            logging.warning("Pressure Stall Information is not available, it requires Linux 4.20 and CONFIG_PSI")
+            self.enabled = False
+            return
+
+        # e.g. {"memory": {"full_avg60": 5}, "io": {"some_tick": 40}}
+        self.thresholds = config.get_config_value(["pressure", "thresholds"], default={})
+        # (resource, kind) -> total stall time in microseconds of the previous tick
+        self.prev_totals = {}
+        self.prev_time = None
+
+        logging.info("Enabled PressureReader")
+
+    def read_pressure(self):
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        elapsed_us = (now - self.prev_time) * 1000000 if self.prev_time is not None else None
+
+        pressure = {}
+        totals = {}
+        for resource in self.RESOURCES:
+            try:
+                with open(f'{self.PRESSURE_DIR}/{resource}', 'r') as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+
+            stats = {}
+            for line in lines:
+                # some avg10=0.89 avg60=1.33 avg300=1.30 total=14094490
+                kind, *fields = line.split()
+                values = dict(field.split('=', 1) for field in fields)
+                for avg in ('avg10', 'avg60', 'avg300'):
+                    stats[f'{kind}_{avg}'] = float(values[avg])
+
+                total = int(values['total'])
+                totals[(resource, kind)] = total
+                prev_total = self.prev_totals.get((resource, kind))
+                if elapsed_us and prev_total is not None:
+                    stats[f'{kind}_tick'] = round(min(100.0, (total - prev_total) / elapsed_us * 100), 2)
+
+            thresholds_reached = [f"{key} at {stats[key]}%" for key, threshold in
+                                  self.thresholds.get(resource, {}).items() if stats.get(key, 0) > threshold]
+            if thresholds_reached:
+                stats['thresholds_reached'] = thresholds_reached
+            pressure[resource] = stats
+
+        self.prev_totals = totals
+        self.prev_time = now
+        return pressure
+
+
+if __name__ == "__main__":
+    import json
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    pressure_reader = PressureReader(AgentConfig({"pressure": {"enabled": True}}))
+    pressure_reader.read_pressure()
+    time.sleep(1)
+    logging.info(json.dumps(pressure_reader.read_pressure(), indent=2))
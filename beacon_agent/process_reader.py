@@ -0,0 +1,107 @@
+import heapq
+import logging
+import os
+import time
+
+
+class ProcessReader:
+    """
+    Finds the top CPU and memory consumers by scanning /proc/[pid]/stat and /proc/[pid]/statm. The CPU time of each
+    process is cached, so the CPU usage is the delta to the previous scan. The scan only runs while the CPU or memory
+    load is near the notify threshold, so that it costs nothing in steady state, but already has a baseline once the
+    threshold is reached.
+    """
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["processes", "enabled"], default=False)
+        if not self.enabled:
+            return
+
+        self.top_n = config.get_config_value(["processes", "top_n"], default=5)
+        notify_threshold_percent = config.get_config_value(["agent", "notify_threshold_percent"], default=90)
+        self.near_threshold_percent = config.get_config_value(["processes", "near_threshold_percent"],
+                                                              default=max(0, notify_threshold_percent - 10))
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.num_cpus = os.cpu_count() or 1
+
+        # pid -> (start time, cpu ticks)
+        self.prev_cpu_ticks = {}
+        self.prev_time = None
+
+        logging.info("Enabled ProcessReader")
+
+    def read_top_processes(self, cpu_load_percent, memory_percent):
+        """
+        Returns the top consumers by CPU and by memory, or None if neither the CPU nor the memory load are near the
+        threshold. The CPU usage is in percent of the whole system, and None on the first scan after activation.
+        """
+        if not self.enabled:
+            return None
+
+        if cpu_load_percent < self.near_threshold_percent and memory_percent < self.near_threshold_percent:
+            if self.prev_time is not None:
+                logging.info("CPU and memory below threshold, stopped scanning processes")
+                self.prev_cpu_ticks = {}
+                self.prev_time = None
+            return None
+
+        now = time.monotonic()
+        elapsed_ticks = None
+        if self.prev_time is not None:
+            elapsed_ticks = (now - self.prev_time) * self.clock_ticks * self.num_cpus
+
+        processes = []
+        cpu_ticks = {}
+        for pid, name, start_time, ticks, rss_pages in self._scan():
+            cpu_ticks[pid] = (start_time, ticks)
+            cpu_percent = None
+            prev = self.prev_cpu_ticks.get(pid)
+            # a different start time means the pid was reused
+            if elapsed_ticks and prev is not None and prev[0] == start_time:
+                cpu_percent = round((ticks - prev[1]) / elapsed_ticks * 100, 1)
+            processes.append((pid, name, cpu_percent, rss_pages * self.page_size))
+
+        self.prev_cpu_ticks = cpu_ticks
+        self.prev_time = now
+
+        return {
+            'cpu': [self._to_dict(p) for p in
+                    heapq.nlargest(self.top_n, processes, key=lambda p: p[2] if p[2] is not None else -1)
+                    if p[2]],
+            'memory': [self._to_dict(p) for p in heapq.nlargest(self.top_n, processes, key=lambda p: p[3])]
+        }
+
+    @staticmethod
+    def _to_dict(process):
+        pid, name, cpu_percent, rss_bytes = process
+        return {'pid': pid, 'name': name, 'cpu_percent': cpu_percent, 'rss_bytes': rss_bytes}
+
+    @staticmethod
+    def _scan():
+        for entry in os.scandir('/proc'):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry.name}/stat', 'rb') as f:
+                    stat = f.read()
+                with open(f'/proc/{entry.name}/statm', 'rb') as f:
+                    statm = f.read()
+            except OSError:
+                # the process exited in the meantime
+                continue
+
+            # the name is in parentheses and may contain spaces and parentheses itself
+            name_start = stat.index(b'(')
+            name_end = stat.rindex(b')')
+            fields = stat[name_end + 2:].split()
+            # fields start at the state (3), so utime (14) is at index 11, stime at 12 and starttime (22) at 19
+            yield (int(entry.name), stat[name_start + 1:name_end].decode(errors='replace'), int(fields[19]),
+                   int(fields[11]) + int(fields[12]), int(statm.split()[1]))
+
+    @staticmethod
+    def format_top(processes, kind):
+        """Formats the top consumers of the given kind (cpu or memory) for a message"""
+        if kind == 'cpu':
+            return ', '.join(f"{p['name']}({p['pid']}) {p['cpu_percent']}%" for p in processes)
+        return ', '.join(f"{p['name']}({p['pid']}) {p['rss_bytes'] // (1024 * 1024)}MiB" for p in processes)
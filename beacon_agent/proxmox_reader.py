@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import shutil
 import socket
@@ -8,6 +9,8 @@ import json
 
 from requests import HTTPError
 
+from . import async_http
+
 
 class ProxmoxReader:
     def __init__(self, config):
@@ -39,19 +42,24 @@ class ProxmoxReader:
         logging.info("Enabled ProxmoxReader")
 
     def _get_vm_details(self):
-        url = f'{self.base_url}/nodes/{self.node_name}/qemu'
         logging.debug(f"Getting qemu details for node {self.node_name}")
-        response = requests.get(url, headers=self.headers, verify=self.verify_tls, timeout=(5, 5))
-        response.raise_for_status()
-        return response.json()['data']
+        return self._get_data(f'{self.base_url}/nodes/{self.node_name}/qemu')
 
     def _get_container_details(self):
-        url = f'{self.base_url}/nodes/{self.node_name}/lxc'
         logging.debug(f"Getting lxc details for node {self.node_name}")
+        return self._get_data(f'{self.base_url}/nodes/{self.node_name}/lxc')
+
+    def _get_data(self, url):
         response = requests.get(url, headers=self.headers, verify=self.verify_tls, timeout=(5, 5))
         response.raise_for_status()
         return response.json()['data']
 
+    async def _get_data_async(self, url):
+        response = await async_http.request('GET', url, headers=self.headers, verify_tls=self.verify_tls,
+                                            timeout=(5, 5))
+        response.raise_for_status()
+        return response.json()['data']
+
     def read_proxmox_data(self):
         if not self.enabled:
             return None
@@ -59,7 +67,28 @@ class ProxmoxReader:
         try:
             vms = self._get_vm_details()
             containers = self._get_container_details()
-        except HTTPError as e:
+        except Exception as e:
+            return self._handle_error(e)
+
+        return self._complete(vms, containers)
+
+    async def read_proxmox_data_async(self):
+        """Asynchronous variant of read_proxmox_data(), fetching the VMs and containers concurrently"""
+        if not self.enabled:
+            return None
+
+        logging.debug(f"Getting qemu and lxc details for node {self.node_name}")
+        try:
+            vms, containers = await asyncio.gather(
+                self._get_data_async(f'{self.base_url}/nodes/{self.node_name}/qemu'),
+                self._get_data_async(f'{self.base_url}/nodes/{self.node_name}/lxc'))
+        except Exception as e:
+            return self._handle_error(e)
+
+        return self._complete(vms, containers)
+
+    def _handle_error(self, e):
+        if isinstance(e, (HTTPError, async_http.HTTPError)):
             status_code = e.response.status_code
             if status_code == 401 or status_code == 403:
                 self.proxmox_data = {"error": f"Unauthorized access: {str(e)}"}
@@ -70,19 +99,20 @@ class ProxmoxReader:
                 logging.exception(e)
                 self.proxmox_data = {"error": f"HTTP error occurred: {e}. Server message: {str(e)}"}
             return self.proxmox_data
-        except Exception as e:
-            if "Name or service not known" in str(e):
-                self.proxmox_data = {"error": f"Unknown host: {self.host}"}
-            elif "timed out" in str(e):
-                self.proxmox_data = {"error": f"Connection to host {self.host} timed out!"}
-            elif "Connection refused" in str(e):
-                self.proxmox_data = {"error": f"Connection refused to host {self.host}!"}
-            else:
-                logging.error(f"Unexpected error: {str(e)}")
-                logging.exception(e)
-                self.proxmox_data = {"error": f"An unexpected error occurred: {str(e)}"}
-            return self.proxmox_data
 
+        if "Name or service not known" in str(e):
+            self.proxmox_data = {"error": f"Unknown host: {self.host}"}
+        elif "timed out" in str(e):
+            self.proxmox_data = {"error": f"Connection to host {self.host} timed out!"}
+        elif "Connection refused" in str(e):
+            self.proxmox_data = {"error": f"Connection refused to host {self.host}!"}
+        else:
+            logging.error(f"Unexpected error: {str(e)}")
+            logging.exception(e)
+            self.proxmox_data = {"error": f"An unexpected error occurred: {str(e)}"}
+        return self.proxmox_data
+
+    def _complete(self, vms, containers):
         self.proxmox_data = {
             'name': self.node_name,
             'vms': vms,
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+from . import async_http
+
+
+class RateLimiter:
+    """A token bucket, allowing bursts of up to the given rate within one second"""
+
+    def __init__(self, rate_per_second, clock=time.monotonic):
+        self.rate = rate_per_second
+        self.clock = clock
+        self.tokens = float(rate_per_second)
+        self.updated = clock()
+
+    async def acquire(self):
+        while True:
+            now = self.clock()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Relay:
+    """
+    Accepts the UptimeKuma pushes of downstream agents and forwards them to the upstream UptimeKuma over a small pool
+    of persistent connections. The downstream agents use the relay as their api_url, e.g.
+    http://relay:8090/api/push, and keep their own api_key.
+
+    A push whose status and message did not change since the last forwarded one is dropped, unless it was forwarded
+    longer than forward_interval_seconds ago, so that the monitor stays up. Pushes which arrive while an older push of
+    the same agent is still queued replace it, so only the latest state is forwarded. The pushes of an agent are
+    forwarded one after the other, a newer push waits until the older one completed, so that it cannot be overtaken.
+    A push which failed to forward is retried every RETRY_SECONDS, unless a newer push of the agent replaces it, until
+    it failed for forward_interval_seconds.
+
+    The relay listens on 127.0.0.1 by default, listen_host must be set to accept the pushes of other hosts.
+    """
+
+    MAX_REQUEST_BYTES = 64 * 1024
+    RETRY_SECONDS = 5
+
+    def __init__(self, config):
+        self.listen_host = config.get_config_value(["relay", "listen_host"], default='127.0.0.1')
+        self.listen_port = config.get_config_value(["relay", "listen_port"], default=8090)
+        self.upstream_url = config.get_config_value(["relay", "upstream_url"], default='')
+        if not self.upstream_url:
+            self.upstream_url = config.get_config_value(["agent", "api_url"])
+        self.connections = config.get_config_value(["relay", "connections"], default=4)
+        self.max_pushes_per_second = config.get_config_value(["relay", "max_pushes_per_second"], default=20)
+        self.forward_interval_seconds = config.get_config_value(["relay", "forward_interval_seconds"], default=60)
+        self.verify_tls = config.get_config_value(["relay", "verify_tls"], default=True)
+
+        # push key -> parameters of the latest push which is not yet forwarded
+        self.pending = {}
+        # push key -> (status, msg, monotonic time) of the last forwarded push, within forward_interval_seconds
+        self.forwarded = {}
+        self.last_eviction = time.monotonic()
+        # push keys which are in the queue, each key is queued at most once
+        self.queued = set()
+        # push keys whose push is being forwarded
+        self.in_flight = set()
+        # push key -> monotonic time of the first failed forward of its pending push
+        self.failing = {}
+        self.queue = None
+        self.stats = {'received': 0, 'deduplicated': 0, 'coalesced': 0, 'forwarded': 0, 'failed': 0}
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.queue = asyncio.Queue()
+        rate_limiter = RateLimiter(self.max_pushes_per_second)
+        workers = [asyncio.create_task(self._forward(rate_limiter)) for _ in range(self.connections)]
+        server = await asyncio.start_server(self._handle_client, self.listen_host, self.listen_port)
+        logging.info(f"Relaying pushes from {self.listen_host}:{self.listen_port} to {self.upstream_url} over "
+                     f"{self.connections} connections, at most {self.max_pushes_per_second} per second")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    def accept_push(self, key, params):
+        """
+        Queues the given push of a downstream agent for forwarding, unless it is a duplicate.
+
+        Returns:
+        bool: True if the push is forwarded, False if it was dropped as a duplicate
+        """
+        self.stats['received'] += 1
+        self._evict_forwarded()
+        status, msg = params.get('status', 'up'), params.get('msg', 'OK')
+        last = self.forwarded.get(key)
+        if (last is not None and key not in self.pending and (status, msg) == last[:2] and
+                time.monotonic() - last[2] < self.forward_interval_seconds):
+            self.stats['deduplicated'] += 1
+            return False
+
+        if key in self.pending:
+            self.stats['coalesced'] += 1
+        self.pending[key] = params
+        self._enqueue(key)
+        return True
+
+    def _enqueue(self, key):
+        # a key in flight is queued again when its push completed
+        if key in self.pending and key not in self.queued and key not in self.in_flight:
+            self.queued.add(key)
+            self.queue.put_nowait(key)
+
+    def _evict_forwarded(self):
+        """Drops the forwarded pushes older than forward_interval_seconds, which are forwarded again anyway"""
+        now = time.monotonic()
+        if now - self.last_eviction < self.forward_interval_seconds:
+            return
+        self.last_eviction = now
+        self.forwarded = {key: last for key, last in self.forwarded.items() if
+                          now - last[2] < self.forward_interval_seconds}
+
+    async def _forward(self, rate_limiter):
+        connection = async_http.PersistentConnection(verify_tls=self.verify_tls)
+        try:
+            while True:
+                key = await self.queue.get()
+                self.queued.discard(key)
+                params = self.pending.pop(key, None)
+                if params is None:
+                    continue
+                self.in_flight.add(key)
+                try:
+                    await rate_limiter.acquire()
+                    forwarded = await self._forward_push(connection, key, params)
+                finally:
+                    self.in_flight.discard(key)
+
+                if forwarded:
+                    self.failing.pop(key, None)
+                    self._enqueue(key)
+                    continue
+                # the agent already got its response, so the push is retried unless a newer one replaced it
+                first_failure = self.failing.setdefault(key, time.monotonic())
+                if key in self.pending:
+                    self.failing.pop(key)
+                    self._enqueue(key)
+                elif time.monotonic() - first_failure < self.forward_interval_seconds:
+                    self.pending[key] = params
+                    asyncio.get_running_loop().call_later(self.RETRY_SECONDS, self._enqueue, key)
+                else:
+                    logging.warning(f"Dropping push of {key[:4]}..., it failed for {self.forward_interval_seconds}s")
+                    self.failing.pop(key)
+        finally:
+            connection.close()
+
+    async def _forward_push(self, connection, key, params):
+        """Returns True if the push was forwarded"""
+        url = f"{self.upstream_url}/{key}"
+        try:
+            # UptimeKuma reads the push only from the query string, also of a downstream POST
+            response = await connection.request('GET', url, params)
+            response.raise_for_status()
+        except async_http.RequestException as e:
+            self.stats['failed'] += 1
+            logging.warning(f"Failed to forward push of {key[:4]}...: {e}")
+            return False
+
+        self.forwarded[key] = (params.get('status', 'up'), params.get('msg', 'OK'), time.monotonic())
+        self.stats['forwarded'] += 1
+        logging.debug(f"Forwarded push of {key[:4]}... with status {params.get('status')}")
+        return True
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status_code, content = self._handle_request(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(self._build_response(status_code, content, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            logging.debug(f"Closing relay client connection: {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        size = len(request_line)
+        while True:
+            line = await reader.readline()
+            size += len(line)
+            if size > self.MAX_REQUEST_BYTES:
+                raise ValueError("Request headers too large")
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, value = line.decode('latin-1').split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > self.MAX_REQUEST_BYTES:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    def _handle_request(self, method, target, headers, body):
+        parts = urlsplit(target)
+        if parts.path == '/stats' and method == 'GET':
+            return 200, {**self.stats, 'queued': len(self.pending), 'in_flight': len(self.in_flight)}
+        if method not in ('GET', 'POST') or '/push/' not in parts.path:
+            return 404, {'ok': False, 'msg': 'Not found'}
+
+        key = parts.path.rsplit('/', 1)[-1]
+        if not key:
+            return 404, {'ok': False, 'msg': 'Missing push token'}
+        params = dict(parse_qsl(parts.query))
+        if method == 'POST' and body:
+            params.update(parse_qsl(body.decode('utf-8', errors='replace')))
+
+        self.accept_push(key, params)
+        return 200, {'ok': True}
+
+    @staticmethod
+    def _build_response(status_code, content, keep_alive):
+        body = json.dumps(content).encode('utf-8')
+        reason = 'OK' if status_code == 200 else 'Not Found'
+        head = (f"HTTP/1.1 {status_code} {reason}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode('latin-1') + body
+
+
+if __name__ == "__main__":
+    import sys
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    # e.g. python -m beacon_agent.relay http://127.0.0.1:3001/api/push
+    relay = Relay(AgentConfig({"relay": {"upstream_url": sys.argv[1], "listen_host": '127.0.0.1'}}))
+    relay.run()
@@ -0,0 +1,73 @@
+import os
+import time
+from collections import deque
+
+
+class SelfMonitor:
+    """
+    Reports the resource usage of the agent itself, and the percentiles of the latency of its last ticks, so that a
+    leaking or slowing agent shows up in its own snapshot.
+    """
+
+    PROC_STATUS = '/proc/self/status'
+
+    def __init__(self, max_samples=100, clock=time.monotonic):
+        self.clock = clock
+        self.latencies = deque(maxlen=max_samples)
+        self.prev_cpu_seconds = None
+        self.prev_time = None
+
+    def record_latency(self, seconds):
+        self.latencies.append(seconds)
+
+    def get_stats(self, overrun_count=0):
+        status = self._read_status()
+        times = os.times()
+        cpu_seconds = times.user + times.system
+        now = self.clock()
+
+        stats = {
+            'pid': os.getpid(),
+            'rss_bytes': status.get('VmRSS', 0) * 1024,
+            'threads': status.get('Threads', 0),
+            'open_fds': self._count_fds(),
+            'cpu_seconds': round(cpu_seconds, 2),
+            'tick_latency_seconds': self._percentiles(),
+            'overrun_count': overrun_count
+        }
+        if self.prev_time is not None and now > self.prev_time:
+            stats['cpu_percent'] = round((cpu_seconds - self.prev_cpu_seconds) / (now - self.prev_time) * 100, 1)
+        self.prev_cpu_seconds = cpu_seconds
+        self.prev_time = now
+        return stats
+
+    def _percentiles(self):
+        if not self.latencies:
+            return {}
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+        return {'p50': percentile(50), 'p90': percentile(90), 'p99': percentile(99), 'max': latencies[-1]}
+
+    def _read_status(self):
+        """Returns the numeric fields of /proc/self/status, e.g. VmRSS in kB and Threads"""
+        status = {}
+        try:
+            with open(self.PROC_STATUS, 'r') as file:
+                for line in file:
+                    key, _, value = line.partition(':')
+                    value = value.split()
+                    if key in ('VmRSS', 'Threads') and value and value[0].isdigit():
+                        status[key] = int(value[0])
+        except OSError:
+            pass
+        return status
+
+    @staticmethod
+    def _count_fds():
+        try:
+            return len(os.listdir('/proc/self/fd'))
+        except OSError:
+            return None
@@ -0,0 +1,197 @@
+import base64
+import json
+import logging
+import os
+import re
+import time
+from array import array
+
+from .disk_inventory import DiskInventory
+from .state_file import write_state_file
+
+
+class TrendSeries:
+    """The samples of a single counter of a disk, as typed arrays of timestamps and values"""
+
+    def __init__(self, times=None, values=None):
+        self.times = times if times is not None else array('d')
+        self.values = values if values is not None else array('q')
+
+    def append(self, timestamp, value, max_samples):
+        self.times.append(timestamp)
+        self.values.append(value)
+        if len(self.times) > max_samples:
+            del self.times[0]
+            del self.values[0]
+
+    def value_at(self, timestamp):
+        """Returns the value at the given time, i.e. of the last sample before it, or the first sample after it"""
+        value = self.values[0]
+        for sample_time, sample_value in zip(self.times, self.values):
+            if sample_time > timestamp:
+                break
+            value = sample_value
+        return value
+
+    def to_json(self):
+        return {
+            't': base64.b64encode(self.times.tobytes()).decode(),
+            'v': base64.b64encode(self.values.tobytes()).decode()
+        }
+
+    @staticmethod
+    def from_json(data):
+        times = array('d')
+        times.frombytes(base64.b64decode(data['t']))
+        values = array('q')
+        values.frombytes(base64.b64decode(data['v']))
+        return TrendSeries(times, values)
+
+
+class SmartTrendStore:
+    """
+    Keeps a compact history of key numeric S.M.A.R.T. and NVMe counters per disk, keyed by the disk's WWN or serial
+    number and persisted across restarts. A sample is stored when the value changes, or at least every
+    sample_interval_seconds, so the history covers a long time with few samples.
+
+    Rate-of-change rules mark a disk as degrading when a counter grows by more than max_increase within
+    window_hours, which usually happens long before the overall health check fails.
+    """
+
+    DEFAULT_ATTRIBUTES = ['Reallocated_Sector_Ct', 'Current_Pending_Sector', 'Offline_Uncorrectable',
+                          'Reported_Uncorrect', 'Reallocated_Event_Count', 'UDMA_CRC_Error_Count',
+                          'media_errors', 'num_err_log_entries', 'percentage_used']
+    DEFAULT_RULES = [
+        {'attribute': 'Reallocated_Sector_Ct', 'max_increase': 0, 'window_hours': 24},
+        {'attribute': 'Current_Pending_Sector', 'max_increase': 0, 'window_hours': 24},
+        {'attribute': 'Offline_Uncorrectable', 'max_increase': 0, 'window_hours': 24},
+        {'attribute': 'media_errors', 'max_increase': 0, 'window_hours': 24},
+    ]
+    NUMBER = re.compile(r'^\s*([0-9][0-9,]*)')
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["smartctl", "trends"], default=True)
+        if not self.enabled:
+            return
+
+        state_dir = config.get_config_value(["agent", "state_dir"], default='/var/lib/beacon-agent')
+        self.state_file = config.get_config_value(["smartctl", "trend_state_file"],
+                                                  default=os.path.join(state_dir, 'smart_trends.json'))
+        # e.g. a one-shot run, which evaluates the history of the daemon without adding to it
+        self.read_only = config.get_config_value(["agent", "read_only_state"], default=False)
+        self.rules = config.get_config_value(["smartctl", "trend_rules"], default=self.DEFAULT_RULES)
+        self.attributes = set(config.get_config_value(["smartctl", "trend_attributes"],
+                                                      default=self.DEFAULT_ATTRIBUTES))
+        self.attributes.update(rule['attribute'] for rule in self.rules)
+        self.sample_interval_seconds = config.get_config_value(["smartctl", "trend_sample_interval_seconds"],
+                                                               default=3600)
+        self.max_samples = config.get_config_value(["smartctl", "trend_max_samples"], default=720)
+
+        # disk identity -> attribute -> TrendSeries
+        self.series = self._load()
+        # device -> disk identity, re-read on every full scan and for hot-plugged devices, a swapped disk may get the
+        # same device name
+        self.identities = {}
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r') as file:
+                data = json.load(file)
+            return {identity: {attribute: TrendSeries.from_json(series) for attribute, series in attributes.items()}
+                    for identity, attributes in data.items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Failed to read S.M.A.R.T. trends {self.state_file}, starting a new history: {e}")
+            return {}
+
+    def _save(self):
+        try:
+            write_state_file(self.state_file, {identity: {attribute: series.to_json()
+                                                          for attribute, series in attributes.items()}
+                                               for identity, attributes in self.series.items()})
+        except OSError as e:
+            logging.error(f"Failed to write S.M.A.R.T. trends {self.state_file}: {e}")
+
+    def forget(self, devices=None):
+        """Drops the cached identities of the given devices, or of all devices if None"""
+        if not self.enabled:
+            return
+        if devices is None:
+            self.identities.clear()
+            return
+        for device in devices:
+            self.identities.pop(device, None)
+
+    def _identify(self, device):
+        identity = self.identities.get(device)
+        if identity is None:
+            identity = DiskInventory.identify(device.rsplit('/', 1)[-1]) or device
+            self.identities[device] = identity
+        return identity
+
+    def _extract_counters(self, disk):
+        """Returns the tracked counters of the given S.M.A.R.T. or NVMe data as ints"""
+        if disk.get('is_nvme') == 'true':
+            raw_values = {key: value for key, value in disk.items() if key in self.attributes}
+        else:
+            raw_values = {name: attribute['RAW_VALUE'] for name, attribute in disk.get('data', {}).items() if
+                          name in self.attributes}
+
+        counters = {}
+        for name, raw_value in raw_values.items():
+            # e.g. "12 (Min/Max 20/40)", "1,234" or "3%"
+            match = self.NUMBER.match(str(raw_value))
+            if match:
+                counters[name] = int(match.group(1).replace(',', ''))
+        return counters
+
+    def record(self, smart_data):
+        """
+        Samples the counters of all disks of the given S.M.A.R.T. data, evaluates the rules and marks degrading disks
+        in the given data with smart_trend_status and smart_trend_findings.
+        """
+        if not self.enabled:
+            return smart_data
+
+        now = time.time()
+        changed = False
+        for device, disk in smart_data.items():
+            if not isinstance(disk, dict) or 'error' in disk:
+                continue
+
+            disk_series = self.series.setdefault(self._identify(device), {})
+            counters = self._extract_counters(disk)
+            for name, value in counters.items():
+                series = disk_series.get(name)
+                if series is None:
+                    series = disk_series[name] = TrendSeries()
+                if (not series.values or series.values[-1] != value or
+                        now - series.times[-1] >= self.sample_interval_seconds):
+                    series.append(now, value, self.max_samples)
+                    changed = True
+
+            # the data of hot-plug reads is based on the previous read, so drop its findings
+            disk.pop('smart_trend_status', None)
+            disk.pop('smart_trend_findings', None)
+            findings = self._evaluate(disk_series, counters, now)
+            if findings:
+                disk['smart_trend_status'] = 'DEGRADING'
+                disk['smart_trend_findings'] = findings
+
+        if changed and not self.read_only:
+            self._save()
+        return smart_data
+
+    def _evaluate(self, disk_series, counters, now):
+        findings = []
+        for rule in self.rules:
+            attribute = rule['attribute']
+            series = disk_series.get(attribute)
+            if series is None or attribute not in counters:
+                continue
+            window_hours = rule.get('window_hours', 24)
+            increase = counters[attribute] - series.value_at(now - window_hours * 3600)
+            if increase > rule.get('max_increase', 0):
+                findings.append(f"{attribute} +{increase} in {window_hours}h")
+        return findings
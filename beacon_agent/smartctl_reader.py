@@ -1,3 +1,4 @@
+import asyncio
 import subprocess
 import logging
 import shutil
@@ -7,6 +8,9 @@ import os
 import re
 import string
 
+from .async_subprocess import run_process
+from .smart_trend_store import SmartTrendStore
+
 
 class SmartCtlReader:
     def __init__(self, config):
@@ -18,33 +22,134 @@ class SmartCtlReader:
         self.devices = []
         self.smart_data = {}
         self.use_ansi = False
+        self.trend_store = SmartTrendStore(config)
+        # the disk inventory detects removed disks by their identity, without the false positives of gaps in the
+        # device names, e.g. after a hot swap
+        self.find_missing_disks = not config.get_config_value(["disk_inventory", "enabled"], default=False)
 
         logging.info("Enabled S.M.A.R.T Reader")
 
     def read_smartdata_for_all_devices(self):
         if not self.enabled:
             return None, None
-        if not self._check_smartctl_available():
-            return {"error": "smartctl command is not available. Please install smartmontools."}, None
-
-        self._list_devices()
-        logging.debug(f"Getting S.M.A.R.T. data for devices: {self.devices}")
+        error = self._prepare_devices()
+        if error:
+            return error, None
 
         smart_data = {}
         for device in self.devices:
             if device.startswith("/dev/nvme"):
-                if shutil.which("nvme") is None:
-                    return {
-                        "error": "nvme command is not available, yet NVME drives were detected! Please install nvme-cli."}, None
                 data = self._get_nvme_status(device)
             else:
                 data = self._get_smart_data(device)
 
             smart_data[device] = data
 
+        return self._complete(smart_data)
+
+    async def read_smartdata_for_all_devices_async(self):
+        """Asynchronous variant of read_smartdata_for_all_devices(), reading all devices concurrently"""
+        if not self.enabled:
+            return None, None
+        error = self._prepare_devices()
+        if error:
+            return error, None
+
+        results = await asyncio.gather(*(
+            self._get_nvme_status_async(device) if device.startswith("/dev/nvme") else self._get_smart_data_async(
+                device) for device in self.devices))
+
+        return self._complete(dict(zip(self.devices, results)))
+
+    def read_smartdata_for_devices(self, devices):
+        """
+        Reads the S.M.A.R.T. data of only the given hot-plugged devices, and updates the data of the previous read.
+
+        Args:
+        devices (list): List of (action, device path) tuples, where action is add, remove or change
+        """
+        if not self.enabled:
+            return None, None
+        if not self._check_smartctl_available():
+            return {"error": "smartctl command is not available. Please install smartmontools."}, None
+
+        smart_data = dict(self.smart_data)
+        for action, device in self._filter_hotplugged(devices, smart_data):
+            if device.startswith("/dev/nvme"):
+                smart_data[device] = self._get_nvme_status(device)
+            else:
+                smart_data[device] = self._get_smart_data(device)
+
+        return self._complete(smart_data)
+
+    async def read_smartdata_for_devices_async(self, devices):
+        """Asynchronous variant of read_smartdata_for_devices()"""
+        if not self.enabled:
+            return None, None
+        if not self._check_smartctl_available():
+            return {"error": "smartctl command is not available. Please install smartmontools."}, None
+
+        smart_data = dict(self.smart_data)
+        for action, device in self._filter_hotplugged(devices, smart_data):
+            if device.startswith("/dev/nvme"):
+                smart_data[device] = await self._get_nvme_status_async(device)
+            else:
+                smart_data[device] = await self._get_smart_data_async(device)
+
+        return self._complete(smart_data)
+
+    def _filter_hotplugged(self, devices, smart_data):
+        """
+        Removes the removed devices from the given smart_data and the device list, and returns the added or changed
+        devices which belong to the same device family as the listed devices, e.g. no /dev/sd* on Synology.
+        """
+        families = {self._device_family(device) for device in self.devices}
+        # the device may now be another disk
+        self.trend_store.forget([device for _, device in devices])
+        to_read = []
+        for action, device in devices:
+            if action == 'remove':
+                smart_data.pop(device, None)
+                if device in self.devices:
+                    self.devices.remove(device)
+                continue
+
+            family = self._device_family(device)
+            if family != 'nvme' and families and family not in families:
+                logging.debug(f"Ignoring hot-plugged device {device} of family {family}")
+                continue
+            if device.startswith("/dev/nvme") and shutil.which("nvme") is None:
+                smart_data[device] = {
+                    "error": "nvme command is not available, yet NVME drives were detected! Please install nvme-cli."}
+                continue
+            if device not in self.devices:
+                self.devices.append(device)
+            to_read.append((action, device))
+        return to_read
+
+    @staticmethod
+    def _device_family(device):
+        match = re.match(r'^/dev/(sata|sd|sg|nvme)', device)
+        return match.group(1) if match else None
+
+    def _prepare_devices(self):
+        if not self._check_smartctl_available():
+            return {"error": "smartctl command is not available. Please install smartmontools."}
+
+        self._list_devices()
+        # a disk may have been swapped without a hot-plug event, e.g. with the hotplug listener disabled
+        self.trend_store.forget()
+        logging.debug(f"Getting S.M.A.R.T. data for devices: {self.devices}")
+
+        if shutil.which("nvme") is None and any(device.startswith("/dev/nvme") for device in self.devices):
+            return {"error": "nvme command is not available, yet NVME drives were detected! Please install nvme-cli."}
+        return None
+
+    def _complete(self, smart_data):
         self.smart_data = {key: smart_data[key] for key in sorted(smart_data.keys())}
+        self.trend_store.record(self.smart_data)
 
-        missing_disks = self.find_missing_indices(self.smart_data)
+        missing_disks = self.find_missing_indices(self.smart_data) if self.find_missing_disks else None
         return self.smart_data, missing_disks
 
     @staticmethod
@@ -112,82 +217,112 @@ class SmartCtlReader:
         if not self._check_smartctl_available():
             return {"error": "smartctl command is not available. Please install smartmontools."}
 
-        smart_data = {'is_nvme': 'false', 'smart_health_status': 'NOK'}
-
         try:
             # Execute the smartctl command
             result = subprocess.run(['smartctl', '-H', device], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                     text=True)
-            if result.returncode not in [0, 255]:
-                if result.stderr:
-                    output = result.stderr.strip()
-                else:
-                    output = result.stdout.strip()
-
-                if "Permission denied" in output:
-                    return {"error": f"Permission denied when accessing {device}. Please run as superuser."}
-                return {"error": f"{output}"}
-
-            # evaluate smart health status
-            output_lines = result.stdout.splitlines()
-            for line in output_lines:
-                if line.startswith('SMART Health Status:') and line == "SMART Health Status: OK":
-                    smart_data['smart_health_status'] = "OK"
-                    break
-                if "SMART overall-health self-assessment test result" in line and "PASSED" in line:
-                    smart_data['smart_health_status'] = "OK"
-                    break
+            smart_data = self._parse_smart_health(device, result)
+            if 'error' in smart_data:
+                return smart_data
 
             # try and get additional data
             result = subprocess.run(['smartctl', '-a', device], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                     text=True)
-            if result.returncode != 0:
-                if "Device does not support Self Test logging" not in result.stdout:
-                    if result.stderr:
-                        return {"error": f"{result.stderr.strip()}"}
-                    return {"error": f"{result.stdout.strip()}"}
+            return self._parse_smart_attributes(result, smart_data)
 
-                smart_data['smart_data_status'] = 'Not available'
-                return smart_data
+        except Exception as e:
+            return {"error": f"Exception occurred: {str(e)}"}
 
-            smart_data['smart_data_status'] = 'Available'
-            smart_data['data'] = {}
-            data = smart_data['data']
-
-            # Process the output and parse the necessary fields
-            output_lines = result.stdout.splitlines()
-
-            for line in output_lines:
-                # Example parsing logic: collect any lines starting with 'ID#', which typically contains attributes.
-                if line.startswith("ID#"):
-                    continue  # Skip header line
-                if line.strip() == "":
-                    continue  # Skip empty lines
-
-                # Example format:
-                # ID# ATTRIBUTE_NAME          FLAG     VALUE WORST THRESH TYPE      UPDATED  WHEN_FAILED RAW_VALUE
-                # 1   Raw_Read_Error_Rate     0x000f   100   100   051    Pre-fail  Always       -       0
-                parts = line.split()
-                if len(parts) > 9:
-                    attr_id = parts[0]
-                    attr_name = parts[1]
-                    data[attr_name] = {
-                        "ID": attr_id,
-                        "FLAG": parts[2],
-                        "VALUE": parts[3],
-                        "WORST": parts[4],
-                        "THRESH": parts[5],
-                        "TYPE": parts[6],
-                        "UPDATED": parts[7],
-                        "WHEN_FAILED": parts[8],
-                        "RAW_VALUE": parts[9]
-                    }
+    async def _get_smart_data_async(self, device):
+        """Asynchronous variant of _get_smart_data()"""
+        logging.debug(f"Getting S.M.A.R.T. data for {device}...")
+        if not self._check_smartctl_available():
+            return {"error": "smartctl command is not available. Please install smartmontools."}
 
-            return smart_data
+        try:
+            smart_data = self._parse_smart_health(device, await run_process(['smartctl', '-H', device]))
+            if 'error' in smart_data:
+                return smart_data
+
+            return self._parse_smart_attributes(await run_process(['smartctl', '-a', device]), smart_data)
 
         except Exception as e:
             return {"error": f"Exception occurred: {str(e)}"}
 
+    @staticmethod
+    def _parse_smart_health(device, result):
+        """Evaluate the output of smartctl -H"""
+        smart_data = {'is_nvme': 'false', 'smart_health_status': 'NOK'}
+
+        if result.returncode not in [0, 255]:
+            if result.stderr:
+                output = result.stderr.strip()
+            else:
+                output = result.stdout.strip()
+
+            if "Permission denied" in output:
+                return {"error": f"Permission denied when accessing {device}. Please run as superuser."}
+            return {"error": f"{output}"}
+
+        # evaluate smart health status
+        output_lines = result.stdout.splitlines()
+        for line in output_lines:
+            if line.startswith('SMART Health Status:') and line == "SMART Health Status: OK":
+                smart_data['smart_health_status'] = "OK"
+                break
+            if "SMART overall-health self-assessment test result" in line and "PASSED" in line:
+                smart_data['smart_health_status'] = "OK"
+                break
+
+        return smart_data
+
+    @staticmethod
+    def _parse_smart_attributes(result, smart_data):
+        """Evaluate the output of smartctl -a and add the attributes to the given smart_data"""
+        if result.returncode != 0:
+            if "Device does not support Self Test logging" not in result.stdout:
+                if result.stderr:
+                    return {"error": f"{result.stderr.strip()}"}
+                return {"error": f"{result.stdout.strip()}"}
+
+            smart_data['smart_data_status'] = 'Not available'
+            return smart_data
+
+        smart_data['smart_data_status'] = 'Available'
+        smart_data['data'] = {}
+        data = smart_data['data']
+
+        # Process the output and parse the necessary fields
+        output_lines = result.stdout.splitlines()
+
+        for line in output_lines:
+            # Example parsing logic: collect any lines starting with 'ID#', which typically contains attributes.
+            if line.startswith("ID#"):
+                continue  # Skip header line
+            if line.strip() == "":
+                continue  # Skip empty lines
+
+            # Example format:
+            # ID# ATTRIBUTE_NAME          FLAG     VALUE WORST THRESH TYPE      UPDATED  WHEN_FAILED RAW_VALUE
+            # 1   Raw_Read_Error_Rate     0x000f   100   100   051    Pre-fail  Always       -       0
+            parts = line.split()
+            if len(parts) > 9:
+                attr_id = parts[0]
+                attr_name = parts[1]
+                data[attr_name] = {
+                    "ID": attr_id,
+                    "FLAG": parts[2],
+                    "VALUE": parts[3],
+                    "WORST": parts[4],
+                    "THRESH": parts[5],
+                    "TYPE": parts[6],
+                    "UPDATED": parts[7],
+                    "WHEN_FAILED": parts[8],
+                    "RAW_VALUE": parts[9]
+                }
+
+        return smart_data
+
     def _get_nvme_status(self, device):
         """
         Get the S.M.A.R.T. status of an NVMe drive using the nvme tool.
@@ -200,31 +335,28 @@ class SmartCtlReader:
         """
 
         logging.debug(f"Getting NVME status data for {device}...")
-        status = {'is_nvme': 'true', 'smart_health_status': 'NOK'}
         try:
             # Run the nvme smart-log command to get S.M.A.R.T. information
-            env = os.environ.copy()
-            if self.use_ansi:
-                env["LANG"] = "ANSI"
             nvme_output = subprocess.run(['nvme', 'smart-log', device], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                         text=True, env=env, encoding='utf-8')
-            if nvme_output.returncode != 0:
-                # Handle permission denied errors gracefully
-                if "Permission denied" in nvme_output.stderr:
-                    return {"error": f"Permission denied when accessing {device}. Please run as superuser."}
-                return {"error": f"Failed to retrieve status for {device}: {nvme_output.stderr.strip()}"}
+                                         text=True, env=self._nvme_env(), encoding='utf-8')
+            return self._parse_nvme_status(device, nvme_output)
 
-            # Parse the output to extract the S.M.A.R.T. information
-            for line in nvme_output.stdout.splitlines():
-                # Example line: "critical_warning: 0"
-                if line:
-                    key, value = line.split(':', 1)
-                    status[key.strip()] = value.strip()
-
-            if "critical_warning" in status and int(status["critical_warning"] or 0) == 0:
-                status['smart_health_status'] = 'OK'
+        except UnicodeDecodeError as e:
+            if self.use_ansi:
+                # already using ANSI, so cancel
+                return {"error": str(e)}
+            logging.warning(f"UnicodeDecodeError: {e}. Retrying with LANG=ANSI.")
+            self.use_ansi = True
+            return self._get_nvme_status(device)
+        except Exception as e:
+            return {"error": str(e)}
 
-            return status
+    async def _get_nvme_status_async(self, device):
+        """Asynchronous variant of _get_nvme_status()"""
+        logging.debug(f"Getting NVME status data for {device}...")
+        try:
+            nvme_output = await run_process(['nvme', 'smart-log', device], env=self._nvme_env())
+            return self._parse_nvme_status(device, nvme_output)
 
         except UnicodeDecodeError as e:
             if self.use_ansi:
@@ -232,10 +364,37 @@ class SmartCtlReader:
                 return {"error": str(e)}
             logging.warning(f"UnicodeDecodeError: {e}. Retrying with LANG=ANSI.")
             self.use_ansi = True
-            return self._get_nvme_status(device)
+            return await self._get_nvme_status_async(device)
         except Exception as e:
             return {"error": str(e)}
 
+    def _nvme_env(self):
+        env = os.environ.copy()
+        if self.use_ansi:
+            env["LANG"] = "ANSI"
+        return env
+
+    @staticmethod
+    def _parse_nvme_status(device, nvme_output):
+        status = {'is_nvme': 'true', 'smart_health_status': 'NOK'}
+        if nvme_output.returncode != 0:
+            # Handle permission denied errors gracefully
+            if "Permission denied" in nvme_output.stderr:
+                return {"error": f"Permission denied when accessing {device}. Please run as superuser."}
+            return {"error": f"Failed to retrieve status for {device}: {nvme_output.stderr.strip()}"}
+
+        # Parse the output to extract the S.M.A.R.T. information
+        for line in nvme_output.stdout.splitlines():
+            # Example line: "critical_warning: 0"
+            if line:
+                key, value = line.split(':', 1)
+                status[key.strip()] = value.strip()
+
+        if "critical_warning" in status and int(status["critical_warning"] or 0) == 0:
+            status['smart_health_status'] = 'OK'
+
+        return status
+
     def _list_devices(self):
         """
         List all potential devices, prioritizing /dev/sata*.
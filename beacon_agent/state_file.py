@@ -0,0 +1,27 @@
+import json
+import os
+import tempfile
+
+
+def write_state_file(state_file, data, **json_args):
+    """
+    Writes the given data as JSON to the state file atomically: the data is written to a unique temporary file in the
+    same directory, which then replaces the state file, so that concurrent writers, e.g. a one-shot run next to the
+    daemon, never write into the same temporary file.
+
+    Raises:
+    OSError: If the state file could not be written
+    """
+    state_dir = os.path.dirname(state_file)
+    os.makedirs(state_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(prefix=f".{os.path.basename(state_file)}.", dir=state_dir)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file, **json_args)
+        os.replace(tmp_file, state_file)
+    except BaseException:
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+
+class StatusServer:
+    """
+    Serves the latest state of the running agent on a unix domain socket, so that it can be queried without running
+    any collector. A client sends a single JSON line, e.g. {"collector": "smart"}, and receives the status as JSON.
+
+    The clients are served independently of the tick, so that a busy host can be queried while a collector runs: in a
+    daemon thread by the blocking engine, and on the event loop by the asyncio engine.
+    """
+
+    # the clients are local and fast, do not let a stuck client block the server
+    CLIENT_TIMEOUT_SECONDS = 1
+
+    def __init__(self, socket_path, get_status):
+        """
+        Args:
+        socket_path (str): The path of the unix socket, an existing socket is replaced
+        get_status (callable): Returns the status for the given collector name, or for all collectors if None
+        """
+        self.socket_path = socket_path
+        self.get_status = get_status
+        self.socket = None
+
+        try:
+            os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.bind(socket_path)
+            os.chmod(socket_path, 0o660)
+            self.socket.listen(8)
+        except OSError as e:
+            logging.warning(f"Failed to listen on status socket {socket_path}: {e}")
+            if self.socket is not None:
+                self.socket.close()
+            self.socket = None
+            return
+
+        logging.info(f"Serving status on {socket_path}")
+
+    def serve_in_thread(self):
+        threading.Thread(target=self._accept_clients, name='status-server', daemon=True).start()
+
+    def _accept_clients(self):
+        server_socket = self.socket
+        while True:
+            try:
+                client, _ = server_socket.accept()
+            except OSError as e:
+                if self.socket is None:
+                    # closed
+                    return
+                logging.warning(f"Failed to accept status client: {e}")
+                time.sleep(1)
+                continue
+
+            with client:
+                try:
+                    self._serve(client)
+                except Exception as e:
+                    # a single client must not stop the server
+                    logging.warning(f"Failed to serve status client: {e}")
+
+    def _serve(self, client):
+        try:
+            client.settimeout(self.CLIENT_TIMEOUT_SECONDS)
+            request = b''
+            while not request.endswith(b'\n') and len(request) < 4096:
+                data = client.recv(4096)
+                if not data:
+                    break
+                request += data
+            client.sendall(self._response(request))
+        except (OSError, ValueError, RuntimeError) as e:
+            logging.debug(f"Failed to serve status client: {e}")
+
+    async def serve_async(self):
+        """Serves the clients on the running event loop until cancelled"""
+        self.socket.setblocking(False)
+        server = await asyncio.start_unix_server(self._serve_async, sock=self.socket)
+        async with server:
+            await server.serve_forever()
+
+    async def _serve_async(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), self.CLIENT_TIMEOUT_SECONDS)
+            writer.write(self._response(request))
+            await asyncio.wait_for(writer.drain(), self.CLIENT_TIMEOUT_SECONDS)
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            logging.debug(f"Failed to serve status client: {e}")
+        except Exception as e:
+            logging.warning(f"Failed to serve status client: {e}")
+        finally:
+            writer.close()
+
+    def _response(self, request):
+        try:
+            query = json.loads(request) if request.strip() else {}
+        except ValueError:
+            query = None
+        collector = query.get('collector') if isinstance(query, dict) else None
+        if not isinstance(query, dict) or not isinstance(collector, (str, type(None))):
+            response = {'error': 'Invalid request, expected e.g. {"collector": "smart"}'}
+        else:
+            try:
+                response = self.get_status(collector)
+            except KeyError:
+                response = {'error': f"Unknown collector {collector}"}
+        return json.dumps(response, default=str).encode('utf-8') + b'\n'
+
+    def close(self):
+        if self.socket is not None:
+            server_socket, self.socket = self.socket, None
+            try:
+                # wakes up the thread blocked in accept()
+                server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server_socket.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+
+def query_status(socket_path, collector=None, timeout=5):
+    """
+    Queries the status of the running agent.
+
+    Returns:
+    dict: The status, see BeaconAgent.get_status()
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps({'collector': collector}).encode('utf-8') + b'\n')
+        response = b''
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            response += data
+    return json.loads(response)
+
+
+def format_status(status):
+    """Formats the status for humans"""
+    if 'error' in status:
+        return f"Error: {status['error']}"
+
+    lines = [f"Beacon Agent {status['version']} ({status['engine']} engine)"]
+    if status.get('updated_at'):
+        lines.append(f"Updated:    {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['updated_at']))} "
+                     f"({round(time.time() - status['updated_at'], 1)}s ago)")
+    evaluation = status.get('evaluation')
+    if evaluation:
+        lines.append(f"Status:     {evaluation['status']}")
+        lines.append(f"Message:    {evaluation['message']}")
+    lines.append("Collectors:")
+    for name, timing in status.get('collectors', {}).items():
+        lines.append(f"  {name:<16} {timing['duration_seconds'] * 1000:8.1f}ms  "
+                     f"{round(time.time() - timing['collected_at'], 1)}s ago")
+    if 'metrics' in status and status.get('collector'):
+        lines.append(json.dumps(status['metrics'], indent=2, default=str))
+    return '\n'.join(lines)
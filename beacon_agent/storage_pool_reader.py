@@ -0,0 +1,241 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+
+from .async_subprocess import run_process
+
+
+class StoragePoolReader:
+    """
+    Reports the health of md RAID arrays from /proc/mdstat and of ZFS pools from the kstats in /proc/spl/kstat/zfs,
+    which are cheap to read on every tick. The details of the ZFS pools, e.g. the progress of a scrub or resilver, are
+    only available from zpool status, so it is run only when the state of a pool changed, or every
+    zpool_status_interval_seconds, and its output is cached in between.
+    """
+
+    MDSTAT = '/proc/mdstat'
+    ZFS_KSTAT = '/proc/spl/kstat/zfs'
+    ZPOOL_STATUS_COMMAND = ['zpool', 'status']
+
+    MD_ARRAY = re.compile(r'^(md\S*) : (\S+)(?: \((?:auto-)?read-only\))?(?: (raid\S+|linear|multipath))?(.*)$')
+    MD_STATUS = re.compile(r'\[(\d+)/(\d+)\] \[([U_]+)\]')
+    # the container of an Intel IMSM or DDF firmware RAID, e.g. "5288 blocks super external:imsm", its arrays refer to
+    # it with e.g. "super external:/md127/0"
+    MD_CONTAINER = re.compile(r'super external:(?!/)')
+    MD_PROGRESS = re.compile(r'(recovery|resync|reshape|check|repair)\s*=\s*([\d.]+)%(?:.*?finish=(\S+))?')
+    ZPOOL_POOL = re.compile(r'^\s*pool: (\S+)')
+    ZPOOL_SCAN = re.compile(r'^\s*scan: (.*)')
+    ZPOOL_PERCENT = re.compile(r'([\d.]+)% done')
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["storage_pools", "enabled"], default=False)
+        if not self.enabled:
+            return
+
+        self.zpool_status_interval_seconds = config.get_config_value(
+            ["storage_pools", "zpool_status_interval_seconds"], default=600)
+
+        self.zpool_available = shutil.which(self.ZPOOL_STATUS_COMMAND[0]) is not None
+        # pool name -> details parsed from zpool status
+        self.zpool_details = {}
+        self.zpool_states = None
+        self.zpool_status_time = None
+        self.prev_arc = None
+
+        logging.info("Enabled StoragePoolReader")
+
+    def read_storage_pools(self):
+        if not self.enabled:
+            return None, None
+        pools, arc, zpool_states = self._read_kstats()
+        if self._zpool_status_required(zpool_states):
+            self.zpool_details = self._run_zpool_status()
+        return self._complete(pools, zpool_states), arc
+
+    async def read_storage_pools_async(self):
+        """Asynchronous variant of read_storage_pools()"""
+        if not self.enabled:
+            return None, None
+        pools, arc, zpool_states = self._read_kstats()
+        if self._zpool_status_required(zpool_states):
+            self.zpool_details = await self._run_zpool_status_async()
+        return self._complete(pools, zpool_states), arc
+
+    def _read_kstats(self):
+        pools = self._read_mdstat()
+        zpool_states = self._read_zpool_states()
+        arc = self._read_arc() if zpool_states else None
+        return pools, arc, zpool_states
+
+    def _read_mdstat(self):
+        try:
+            with open(self.MDSTAT, 'r') as f:
+                return self.parse_mdstat(f.read())
+        except FileNotFoundError:
+            return {}
+
+    @classmethod
+    def parse_mdstat(cls, mdstat):
+        """Parses the content of /proc/mdstat into a dictionary of array name to its state"""
+        arrays = {}
+        array = None
+        for line in mdstat.splitlines():
+            match = cls.MD_ARRAY.match(line)
+            if match:
+                name, state, level, members = match.groups()
+                array = arrays[name] = {'type': 'mdadm', 'level': level or 'unknown', 'state': state}
+                failed = [member.split('[')[0] for member in members.split() if member.endswith('(F)')]
+                if failed:
+                    array['failed_devices'] = failed
+                continue
+            if array is None:
+                continue
+
+            match = cls.MD_STATUS.search(line)
+            if match:
+                array['devices'] = int(match.group(1))
+                array['active_devices'] = int(match.group(2))
+                array['members'] = match.group(3)
+            if cls.MD_CONTAINER.search(line):
+                array['container'] = True
+            match = cls.MD_PROGRESS.search(line)
+            if match:
+                array['progress'] = {'action': match.group(1), 'percent': float(match.group(2))}
+                if match.group(3):
+                    array['progress']['finish'] = match.group(3)
+            if not line.strip():
+                array = None
+
+        for name, array in arrays.items():
+            if array['state'] == 'active' and (array.get('failed_devices') or '_' in array.get('members', '')):
+                array['state'] = 'degraded'
+            thresholds_reached = []
+            # a container only holds the metadata of the disks and is always inactive, its arrays are checked
+            if array['state'] != 'active' and not array.get('container'):
+                thresholds_reached.append(f"array {array['state']}")
+            if thresholds_reached:
+                array['thresholds_reached'] = thresholds_reached
+        return arrays
+
+    def _read_zpool_states(self):
+        """Returns the state of each imported pool, e.g. ONLINE or DEGRADED, from the kstats of OpenZFS 0.8 and later"""
+        try:
+            names = os.listdir(self.ZFS_KSTAT)
+        except FileNotFoundError:
+            return {}
+
+        states = {}
+        for name in names:
+            try:
+                with open(f'{self.ZFS_KSTAT}/{name}/state', 'r') as f:
+                    states[name] = f.read().strip()
+            except (NotADirectoryError, FileNotFoundError):
+                continue
+        return states
+
+    def _read_arc(self):
+        arc = {}
+        try:
+            with open(f'{self.ZFS_KSTAT}/arcstats', 'r') as f:
+                # skip the two header lines, then "name type data"
+                for line in f.readlines()[2:]:
+                    fields = line.split()
+                    if len(fields) == 3 and fields[0] in ('hits', 'misses', 'size', 'c_max'):
+                        arc[fields[0]] = int(fields[2])
+        except (OSError, ValueError):
+            return None
+
+        prev_arc = self.prev_arc
+        self.prev_arc = arc
+        result = {'size_bytes': arc.get('size', 0), 'max_size_bytes': arc.get('c_max', 0)}
+        if prev_arc is not None:
+            hits = arc.get('hits', 0) - prev_arc.get('hits', 0)
+            accesses = hits + arc.get('misses', 0) - prev_arc.get('misses', 0)
+            result['hit_rate_percent'] = round(hits / accesses * 100, 1) if accesses else 100.0
+        return result
+
+    def _zpool_status_required(self, zpool_states):
+        if not zpool_states or not self.zpool_available:
+            return False
+        now = time.monotonic()
+        if (zpool_states == self.zpool_states and self.zpool_status_time is not None and
+                now - self.zpool_status_time < self.zpool_status_interval_seconds):
+            return False
+        self.zpool_states = zpool_states
+        self.zpool_status_time = now
+        return True
+
+    def _run_zpool_status(self):
+        try:
+            result = subprocess.run(self.ZPOOL_STATUS_COMMAND, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.error(f"Failed to run zpool status: {e}")
+            return {}
+        return self.parse_zpool_status(result.stdout)
+
+    async def _run_zpool_status_async(self):
+        try:
+            result = await run_process(self.ZPOOL_STATUS_COMMAND, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.error(f"Failed to run zpool status: {e}")
+            return {}
+        return self.parse_zpool_status(result.stdout)
+
+    @classmethod
+    def parse_zpool_status(cls, output):
+        """Parses the scan line of each pool of the output of zpool status"""
+        details = {}
+        scan_lines = {}
+        pool = None
+        for line in output.splitlines():
+            match = cls.ZPOOL_POOL.match(line)
+            if match:
+                pool = match.group(1)
+                details[pool] = {}
+                continue
+            if pool is None:
+                continue
+
+            match = cls.ZPOOL_SCAN.match(line)
+            if match:
+                scan_lines[pool] = [match.group(1).strip()]
+            elif pool in scan_lines and line.startswith('\t') and line.strip() and ':' not in line.split()[0]:
+                # the progress of a running scan follows on indented lines
+                scan_lines[pool].append(line.strip())
+            elif pool in scan_lines:
+                details[pool]['scan'] = ' '.join(scan_lines.pop(pool))
+        for pool, lines in scan_lines.items():
+            details[pool]['scan'] = ' '.join(lines)
+
+        for pool in details.values():
+            if 'in progress' in pool.get('scan', ''):
+                match = cls.ZPOOL_PERCENT.search(pool['scan'])
+                action = 'resilver' if pool['scan'].startswith('resilver') else 'scrub'
+                pool['progress'] = {'action': action, 'percent': float(match.group(1)) if match else 0.0}
+        return details
+
+    def _complete(self, pools, zpool_states):
+        for name, state in zpool_states.items():
+            pool = {'type': 'zfs', 'state': state}
+            pool.update(self.zpool_details.get(name, {}))
+            if state != 'ONLINE':
+                pool['thresholds_reached'] = [f"pool {state}"]
+            pools[name] = pool
+        return pools
+
+
+if __name__ == "__main__":
+    import json
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    reader = StoragePoolReader(AgentConfig({"storage_pools": {"enabled": True}}))
+    storage_pools, zfs_arc = reader.read_storage_pools()
+    logging.info(json.dumps({'storage_pools': storage_pools, 'zfs_arc': zfs_arc}, indent=2))
@@ -53,6 +53,13 @@ class SystemInfoReader:
         except FileNotFoundError:
             pass
 
+    def refresh_ip_addresses(self):
+        """Re-reads the IP addresses, e.g. after a DHCP change or a bond failover"""
+        self.info['ipv4_addresses'] = []
+        self.info['ipv6_addresses'] = []
+        self.get_ip_addresses()
+        logging.info(f"Refreshed IP addresses: {', '.join(self.info['ipv4_addresses'] + self.info['ipv6_addresses'])}")
+
     def get_ip_addresses(self):
         """Get all IPv4 and IPv6 addresses, skipping Docker, localhost, and link-local IPv6 addresses"""
         try:
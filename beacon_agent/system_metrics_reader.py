@@ -1,3 +1,4 @@
+import asyncio
 import json
 import subprocess
 import re
@@ -11,33 +12,171 @@ try:
 except ImportError:
     psutil = None
 
+from .agent_config import AgentConfig
+from .async_subprocess import run_process
+from .circuit_breaker import CircuitBreaker
+from .disk_forecast import DiskFillForecaster
+from .disk_inventory import DiskInventory
+from .disk_io_reader import DiskIoReader
 from .docker_reader import DockerReader
+from .kernel_log_reader import KernelLogReader
+from .network_reader import NetworkReader
+from .pressure_reader import PressureReader
+from .process_reader import ProcessReader
 from .smartctl_reader import SmartCtlReader
+from .storage_pool_reader import StoragePoolReader
 from .system_info_reader import SystemInfoReader
+from .temperature_reader import TemperatureReader
+from .uevent_listener import UeventListener
 from .proxmox_reader import ProxmoxReader
 
 
 class SystemMetricsReader:
-    def __init__(self, config):
-        self.system_info_reader = SystemInfoReader()
-        self.docker_reader = DockerReader(config)
-        self.smartctl_reader = SmartCtlReader(config)
-        self.proxmox_reader = ProxmoxReader(config)
+    # Each collector returns a fragment of the metrics, the fragments are merged in the order of COLLECTORS
+    COLLECTORS = ['system_info', 'sys_info', 'load_avg', 'packages', 'smart', 'docker', 'proxmox', 'processes',
+                  'disk_io', 'network', 'disk_inventory', 'storage_pools',
+                  'temperatures', 'pressure', 'kernel_log']
+
+    DF_COMMAND = ['df', '-l', '-x', 'overlay', '-x', 'tmpfs', '-x', 'efivarf', '-x', 'devtmpfs', '-x', 'none']
+    SYNOPKG_COMMAND = ['synopkg', 'checkupdateall']
+    APT_COMMAND = ['apt-get', '--just-print', 'dist-upgrade']
+
+    # reader attribute -> the config sections it is created from, and the collectors it feeds
+    READERS = {
+        'docker_reader': ([['docker']], ['docker']),
+        'smartctl_reader': ([['smartctl'], ['agent', 'state_dir'], ['agent', 'read_only_state'],
+                             ['disk_inventory', 'enabled']], ['smart']),
+        'proxmox_reader': ([['proxmox']], ['proxmox']),
+        'process_reader': ([['processes'], ['agent', 'notify_threshold_percent']], ['processes']),
+        'disk_io_reader': ([['disk_io']], ['disk_io']),
+        'network_reader': ([['network']], ['system_info', 'network']),
+        'disk_inventory': ([['disk_inventory'], ['agent', 'state_dir'], ['agent', 'read_only_state']],
+                           ['disk_inventory']),
+        'uevent_listener': ([['smartctl']], ['smart']),
+        'storage_pool_reader': ([['storage_pools']], ['storage_pools']),
+        'temperature_reader': ([['temperatures']], ['temperatures']),
+        'pressure_reader': ([['pressure']], ['pressure']),
+        'kernel_log_reader': ([['kernel_log'], ['agent', 'state_dir'], ['agent', 'read_only_state']],
+                              ['kernel_log']),
+        'disk_forecaster': ([['disk_forecast']], ['sys_info']),
+    }
+
+    def __init__(self, config, collectors=None):
+        """
+        Args:
+        config (AgentConfig): The configuration
+        collectors (list): Optional names of the only collectors which will be run, e.g. for a one-shot run, the
+                           readers which none of them needs are not initialised
+        """
+        self.collectors = collectors or self.COLLECTORS
+        self.system_info_reader = SystemInfoReader() if 'system_info' in self.collectors else None
+        self.docker_reader = DockerReader(self._reader_config('docker_reader', config))
+        self.smartctl_reader = SmartCtlReader(self._reader_config('smartctl_reader', config))
+        self.proxmox_reader = ProxmoxReader(self._reader_config('proxmox_reader', config))
+        self.process_reader = ProcessReader(self._reader_config('process_reader', config))
+        self.disk_io_reader = DiskIoReader(self._reader_config('disk_io_reader', config))
+        self.network_reader = NetworkReader(self._reader_config('network_reader', config),
+                                            watch_addresses=self.system_info_reader is not None)
+        self.disk_inventory = DiskInventory(self._reader_config('disk_inventory', config))
+        self.uevent_listener = UeventListener(self._reader_config('uevent_listener', config))
+        self.storage_pool_reader = StoragePoolReader(self._reader_config('storage_pool_reader', config))
+        self.temperature_reader = TemperatureReader(self._reader_config('temperature_reader', config))
+        self.pressure_reader = PressureReader(self._reader_config('pressure_reader', config))
+        self.kernel_log_reader = KernelLogReader(self._reader_config('kernel_log_reader', config))
+        self.disk_forecaster = DiskFillForecaster(self._reader_config('disk_forecaster', config))
         self.prev_cpu_times = None
+        self.cpu_load_primed = False
         self.sys_info = {}
         self.last_metrics = {}
+        # the keys of the last fragment of each collector, so that a partial refresh can replace them
+        self.fragment_keys = {}
+        self.partial_refresh = False
+        # collector name -> duration and wall clock time of its last run
+        self.collector_timings = {}
+        # called with the name of each collector which completed, e.g. to ping the systemd watchdog
+        self.on_collected = None
+        # collector name -> the last fragment, which is reported while its circuit breaker is open
+        self.last_fragments = {}
+        self.breakers = {name: CircuitBreaker(*self._breaker_settings(config)) for name in self.COLLECTORS}
+
+    def _reader_config(self, attribute, config):
+        """Returns the config to create the reader with, an empty config disables a reader no collector needs"""
+        if any(name in self.collectors for name in self.READERS[attribute][1]):
+            return config
+        return AgentConfig({})
+
+    @staticmethod
+    def _breaker_settings(config):
+        return (config.get_config_value(["agent", "circuit_breaker", "failure_threshold"], default=3),
+                config.get_config_value(["agent", "circuit_breaker", "backoff_seconds"], default=30),
+                config.get_config_value(["agent", "circuit_breaker", "max_backoff_seconds"], default=1800))
+
+    def reload(self, old_config, new_config):
+        """
+        Re-creates only the readers whose config sections changed, all other readers keep their state, e.g. the
+        previous counters and caches. All new readers are created before any old reader is replaced, if one of them
+        fails, the new readers are closed again and the exception is raised with the old readers still in place.
+
+        Args:
+        old_config (AgentConfig): The configuration the readers were created from
+        new_config (AgentConfig): The new configuration
+
+        Returns:
+        list: The collectors which should be refreshed with the new readers
+        """
+        breaker_settings = self._breaker_settings(new_config)
+        new_readers = {}
+        try:
+            for attribute, (key_paths, _) in self.READERS.items():
+                if any(old_config.differs(new_config, key_path) for key_path in key_paths):
+                    reader_type = type(getattr(self, attribute))
+                    new_readers[attribute] = reader_type(self._reader_config(attribute, new_config))
+        except Exception:
+            for reader in new_readers.values():
+                self._close_reader(reader)
+            raise
+
+        collectors = []
+        for attribute, reader in new_readers.items():
+            self._close_reader(getattr(self, attribute))
+            setattr(self, attribute, reader)
+            logging.info(f"Re-created {type(reader).__name__} with the new configuration")
+            for name in self.READERS[attribute][1]:
+                # the new reader starts with a clean slate, do not hold back its first call
+                self.breakers[name] = CircuitBreaker(*breaker_settings)
+                self.last_fragments.pop(name, None)
+                if name not in collectors:
+                    collectors.append(name)
+
+        if old_config.differs(new_config, ["agent", "circuit_breaker"]):
+            for breaker in self.breakers.values():
+                breaker.failure_threshold, breaker.backoff_seconds, breaker.max_backoff_seconds = breaker_settings
+        return collectors
+
+    @staticmethod
+    def _close_reader(reader):
+        close = getattr(reader, 'close', None)
+        if close is not None:
+            close()
 
     @staticmethod
     def get_disk_usage_from_df():
         logging.debug("Getting disk usage from df")
 
         # Execute the command
-        result = subprocess.run(
-            ['df', '-l', '-x', 'overlay', '-x', 'tmpfs', '-x', 'efivarf', '-x', 'devtmpfs', '-x', 'none'],
-            stdout=subprocess.PIPE, text=True)
+        result = subprocess.run(SystemMetricsReader.DF_COMMAND, stdout=subprocess.PIPE, text=True)
+        return SystemMetricsReader._parse_df_output(result.stdout)
 
+    @staticmethod
+    async def get_disk_usage_from_df_async():
+        logging.debug("Getting disk usage from df")
+        result = await run_process(SystemMetricsReader.DF_COMMAND)
+        return SystemMetricsReader._parse_df_output(result.stdout)
+
+    @staticmethod
+    def _parse_df_output(output):
         # Split the output into lines
-        lines = result.stdout.strip().split('\n')
+        lines = output.strip().split('\n')
 
         # Initialize a list to hold the dictionary entries
         df_dict = []
@@ -107,6 +246,32 @@ class SystemMetricsReader:
             self.sys_info = self.get_sys_info_from_psutil()
         return self.sys_info
 
+    async def read_sys_info_async(self):
+        """
+        Asynchronous variant of read_sys_info(). The CPU load is measured against the previous tick, so only the very
+        first call waits for a second, and without blocking the event loop.
+        """
+        if not self.cpu_load_primed:
+            if psutil is None:
+                self.prev_cpu_times = self.read_cpu_times()
+            else:
+                psutil.cpu_percent(interval=None)
+            await asyncio.sleep(1)
+            self.cpu_load_primed = True
+
+        if psutil is None:
+            cpu_count = self.get_cpu_count()
+            cpu_load_percent = self.calculate_cpu_load()
+            memory_info = self.get_memory_info_from_proc()
+        else:
+            cpu_count = psutil.cpu_count(logical=True)
+            cpu_load_percent = psutil.cpu_percent(interval=None)
+            memory_info = self.get_memory_info_from_psutil()
+
+        self.sys_info = self._build_sys_info(cpu_count, cpu_load_percent, memory_info,
+                                             await self.get_disk_usage_from_df_async())
+        return self.sys_info
+
     def get_sys_info_from_proc(self):
         logging.debug("Getting sys info from proc and df")
 
@@ -114,6 +279,11 @@ class SystemMetricsReader:
         cpu_load_percent = self.calculate_cpu_load()
         logging.debug(f"cpu_load_percent: {cpu_load_percent}")
 
+        return self._build_sys_info(cpu_count, cpu_load_percent, self.get_memory_info_from_proc(),
+                                    self.get_disk_usage_from_df())
+
+    @staticmethod
+    def get_memory_info_from_proc():
         # Get memory information from /proc/meminfo
         with open('/proc/meminfo', 'r') as f:
             meminfo = f.readlines()
@@ -125,98 +295,317 @@ class SystemMetricsReader:
         used_memory = total_memory - available_memory
         memory_percent = int(((used_memory / total_memory) * 100 if total_memory > 0 else 0))
 
-        disk_usage = self.get_disk_usage_from_df()
-
         return {
-            'cpu_load_percent': cpu_load_percent,
-            'num_cpu_cores': cpu_count,
-            'max_cpu_load_percent': 100 * cpu_count,
-            'memory_info': {
-                'total': total_memory,
-                'used': used_memory,
-                'free': free_memory,
-                'available': available_memory,
-                'percent': memory_percent
-            },
-            'disk_usage': disk_usage,
+            'total': total_memory,
+            'used': used_memory,
+            'free': free_memory,
+            'available': available_memory,
+            'percent': memory_percent
         }
 
     def get_sys_info_from_psutil(self):
         logging.debug("Getting sys info from psutil")
         cpu_count = psutil.cpu_count(logical=True)
-        memory = psutil.virtual_memory()
 
         # TODO handle: psutil.disk_partitions
         # disk_usage = psutil.disk_usage('/')
 
         disk_usage = self.get_disk_usage_from_df()
 
+        return self._build_sys_info(cpu_count, psutil.cpu_percent(interval=1), self.get_memory_info_from_psutil(),
+                                    disk_usage)
+
+    @staticmethod
+    def get_memory_info_from_psutil():
+        memory = psutil.virtual_memory()
+        return {
+            'total': memory.total,
+            'used': memory.used,
+            'free': memory.free,
+            'available': memory.available,
+            'percent': memory.percent
+        }
+
+    @staticmethod
+    def _build_sys_info(cpu_count, cpu_load_percent, memory_info, disk_usage):
         return {
-            'cpu_load_percent': psutil.cpu_percent(interval=1),
+            'cpu_load_percent': cpu_load_percent,
             'num_cpu_cores': cpu_count,
             'max_cpu_load_percent': 100 * cpu_count,
-            'memory_info': {
-                'total': memory.total,
-                'used': memory.used,
-                'free': memory.free,
-                'available': memory.available,
-                'percent': memory.percent
-            },
+            'memory_info': memory_info,
             'disk_usage': disk_usage,
         }
 
-    def get_system_metrics(self):
+    def get_system_metrics(self, collectors=None):
+        """
+        Runs all collectors, or only the given collectors, in which case the metrics of the other collectors are kept
+        from the previous refresh.
+        """
         start_time = time.time()
 
-        # read the system info
-        sys_info = self.read_sys_info()
+        self.partial_refresh = collectors is not None
+        fragments = [(name, self._collect(name)) for name in (collectors or self.COLLECTORS)]
+        self._merge_fragments(fragments)
 
-        system_info = self.system_info_reader.get_system_info()
+        elapsed_time = time.time() - start_time
+        logging.debug(f"Metrics load took: {elapsed_time:.3f}s")
+        return self.last_metrics
 
-        # Get CPU load from /proc/loadavg
-        load_avg_1, load_avg_5, load_avg_15 = self.get_load_average()
+    async def get_system_metrics_async(self, collectors=None):
+        """Asynchronous variant of get_system_metrics(), running the collectors concurrently"""
+        start_time = time.time()
 
-        # annoyingly long-running:
-        security_count, non_security_count = self.count_upgradable_packages()
+        self.partial_refresh = collectors is not None
+        names = collectors or self.COLLECTORS
+        fragments = await asyncio.gather(*(self._collect_async(name) for name in names))
+        self._merge_fragments(zip(names, fragments))
 
-        # read S.M.A.R.T data for all devices
-        smart_data, missing_disks = self.smartctl_reader.read_smartdata_for_all_devices()
+        elapsed_time = time.time() - start_time
+        logging.debug(f"Metrics load took: {elapsed_time:.3f}s")
+        return self.last_metrics
 
-        # Fetch all Docker Compose projects
-        docker_projects = self.docker_reader.list_projects()
+    def _merge_fragments(self, fragments):
+        metrics = dict(self.last_metrics) if self.partial_refresh else {}
+        for name, fragment in fragments:
+            for key in self.fragment_keys.get(name, []):
+                metrics.pop(key, None)
+            metrics.update(fragment)
+            self.fragment_keys[name] = list(fragment.keys())
+
+        collector_errors = {name: breaker.get_stats() for name, breaker in self.breakers.items() if breaker.failures}
+        if collector_errors:
+            metrics['collector_errors'] = collector_errors
+        else:
+            metrics.pop('collector_errors', None)
+        self.last_metrics = metrics
 
-        # Fetch proxmox data
-        proxmox_data = self.proxmox_reader.read_proxmox_data()
+    def _collect(self, name):
+        if not self.breakers[name].allow():
+            return self.last_fragments.get(name, {})
+        start = time.monotonic()
+        try:
+            fragment = getattr(self, f'_collect_{name}')()
+        except Exception as e:
+            fragment = self._collector_raised(name, e)
+        else:
+            self._check_fragment(name, fragment)
+        self._record_timing(name, start)
+        return fragment
+
+    async def _collect_async(self, name):
+        if not self.breakers[name].allow():
+            return self.last_fragments.get(name, {})
+        start = time.monotonic()
+        collect_async = getattr(self, f'_collect_{name}_async', None)
+        try:
+            if collect_async is not None:
+                fragment = await collect_async()
+            else:
+                fragment = getattr(self, f'_collect_{name}')()
+        except Exception as e:
+            fragment = self._collector_raised(name, e)
+        else:
+            self._check_fragment(name, fragment)
+        self._record_timing(name, start)
+        return fragment
+
+    def _record_timing(self, name, start):
+        self.collector_timings[name] = {'duration_seconds': round(time.monotonic() - start, 4),
+                                        'collected_at': time.time()}
+        if self.on_collected is not None:
+            self.on_collected(name)
+
+    def _check_fragment(self, name, fragment):
+        """Records the result of a collector in its circuit breaker, a collector fails if it reports an error"""
+        errors = [value['error'] for value in fragment.values() if isinstance(value, dict) and 'error' in value]
+        if errors:
+            self._record_failure(name, str(errors[0]))
+        else:
+            self.breakers[name].record_success()
+        self.last_fragments[name] = fragment
+
+    def _collector_raised(self, name, e):
+        logging.exception(f"Collector {name} failed: {e}")
+        self._record_failure(name, f"{type(e).__name__}: {e}", raised=True)
+        # keep the metrics of the last successful run
+        return self.last_fragments.get(name, {})
+
+    def _record_failure(self, name, error, raised=False):
+        breaker = self.breakers[name]
+        breaker.record_failure(error, raised)
+        if breaker.state == CircuitBreaker.OPEN:
+            logging.warning(f"Collector {name} failed {breaker.failures} times, skipping it for "
+                            f"{breaker.get_stats()['retry_in_seconds']}s: {error}")
+
+    def event_streams(self, on_event):
+        """
+        Returns the coroutines of all enabled readers which follow an event stream and call on_event(reason, collectors)
+        when something changed which should be refreshed without waiting for the next tick.
+        """
+        streams = []
+        if self.docker_reader.enabled:
+            streams.append(self.docker_reader.watch_events(on_event))
+        return streams
+
+    def event_sources(self):
+        """
+        Returns all enabled readers which have a file descriptor to wait on for events. Each has a fileno() and a
+        handle_events() method, which is called when the descriptor is readable and returns a reason if the system
+        state should be refreshed immediately, as well as the refresh_collectors to refresh and whether to
+        push_immediately.
+        """
+        sources = []
+        if self.network_reader.socket is not None:
+            sources.append(self.network_reader)
+        if self.uevent_listener.enabled:
+            sources.append(self.uevent_listener)
+        if self.kernel_log_reader.enabled:
+            sources.append(self.kernel_log_reader)
+        return sources
+
+    def _collect_system_info(self):
+        if self.network_reader.consume_addresses_changed():
+            self.system_info_reader.refresh_ip_addresses()
+        return {'system_info': self.system_info_reader.get_system_info()}
+
+    def _collect_sys_info(self):
+        sys_info = self.read_sys_info()
+        self.disk_forecaster.annotate(sys_info['disk_usage'])
+        return self._sys_info_fragment(sys_info)
 
-        elapsed_time = time.time() - start_time
-        logging.debug(f"Metrics load took: {elapsed_time:.3f}s")
+    async def _collect_sys_info_async(self):
+        sys_info = await self.read_sys_info_async()
+        self.disk_forecaster.annotate(sys_info['disk_usage'])
+        return self._sys_info_fragment(sys_info)
 
-        self.last_metrics = {
-            'system_info': system_info,
+    @staticmethod
+    def _sys_info_fragment(sys_info):
+        return {
             'num_cpu_cores': sys_info['num_cpu_cores'],
             'cpu_load_percent': sys_info['cpu_load_percent'],
             'max_cpu_load_percent': sys_info['max_cpu_load_percent'],
+            'memory_info': sys_info['memory_info'],
+            'disk_usage': sys_info['disk_usage']
+        }
+
+    def _collect_load_avg(self):
+        # Get CPU load from /proc/loadavg
+        load_avg_1, load_avg_5, load_avg_15 = self.get_load_average()
+        return {
             'load_avg': {
                 '1_min': load_avg_1,
                 '5_min': load_avg_5,
                 '15_min': load_avg_15
-            },
+            }
+        }
+
+    def _collect_packages(self):
+        # annoyingly long-running:
+        return self._packages_fragment(*self.count_upgradable_packages())
+
+    async def _collect_packages_async(self):
+        return self._packages_fragment(*await self.count_upgradable_packages_async())
+
+    @staticmethod
+    def _packages_fragment(security_count, non_security_count):
+        return {
             'package_upgrade_count': non_security_count + security_count,
-            'package_security_upgrade_count': security_count,
-            'memory_info': sys_info['memory_info'],
-            'disk_usage': sys_info['disk_usage']
+            'package_security_upgrade_count': security_count
         }
 
+    def _collect_smart(self):
+        # on a refresh due to a hot-plug event only read the affected devices, otherwise all devices
+        pending_devices = self.uevent_listener.take_pending_devices()
+        if self.partial_refresh and pending_devices:
+            return self._smart_fragment(*self.smartctl_reader.read_smartdata_for_devices(pending_devices))
+
+        # read S.M.A.R.T data for all devices
+        return self._smart_fragment(*self.smartctl_reader.read_smartdata_for_all_devices())
+
+    async def _collect_smart_async(self):
+        pending_devices = self.uevent_listener.take_pending_devices()
+        if self.partial_refresh and pending_devices:
+            return self._smart_fragment(
+                *await self.smartctl_reader.read_smartdata_for_devices_async(pending_devices))
+        return self._smart_fragment(*await self.smartctl_reader.read_smartdata_for_all_devices_async())
+
+    @staticmethod
+    def _smart_fragment(smart_data, missing_disks):
+        fragment = {}
         if smart_data is not None:
-            self.last_metrics['smart_monitor_data'] = smart_data
+            fragment['smart_monitor_data'] = smart_data
         if missing_disks is not None:
-            self.last_metrics['missing_disks'] = missing_disks
-        if docker_projects is not None:
-            self.last_metrics['docker_projects'] = docker_projects
-        if proxmox_data is not None:
-            self.last_metrics['proxmox_data'] = proxmox_data
+            fragment['missing_disks'] = missing_disks
+        return fragment
 
-        return self.last_metrics
+    def _collect_docker(self):
+        # Fetch all Docker Compose projects
+        return self._docker_fragment(self.docker_reader.list_projects())
+
+    async def _collect_docker_async(self):
+        return self._docker_fragment(await self.docker_reader.list_projects_async())
+
+    @staticmethod
+    def _docker_fragment(docker_projects):
+        return {} if docker_projects is None else {'docker_projects': docker_projects}
+
+    def _collect_proxmox(self):
+        # Fetch proxmox data
+        return self._proxmox_fragment(self.proxmox_reader.read_proxmox_data())
+
+    async def _collect_proxmox_async(self):
+        return self._proxmox_fragment(await self.proxmox_reader.read_proxmox_data_async())
+
+    @staticmethod
+    def _proxmox_fragment(proxmox_data):
+        return {} if proxmox_data is None else {'proxmox_data': proxmox_data}
+
+    def _collect_processes(self):
+        # uses the sys info of this tick with the blocking engine, and of the previous tick with the asyncio engine
+        if not self.sys_info:
+            return {}
+        top_processes = self.process_reader.read_top_processes(self.sys_info['cpu_load_percent'],
+                                                               self.sys_info['memory_info']['percent'])
+        return {} if top_processes is None else {'top_processes': top_processes}
+
+    def _collect_disk_io(self):
+        disk_io = self.disk_io_reader.read_disk_io()
+        return {} if disk_io is None else {'disk_io': disk_io}
+
+    def _collect_network(self):
+        network = self.network_reader.read_network()
+        return {} if network is None else {'network': network}
+
+    def _collect_disk_inventory(self):
+        removed_disks = self.disk_inventory.read_removed_disks()
+        return {} if removed_disks is None else {'removed_disks': removed_disks}
+
+    def _collect_storage_pools(self):
+        return self._storage_pools_fragment(*self.storage_pool_reader.read_storage_pools())
+
+    async def _collect_storage_pools_async(self):
+        return self._storage_pools_fragment(*await self.storage_pool_reader.read_storage_pools_async())
+
+    def _collect_temperatures(self):
+        temperatures = self.temperature_reader.read_temperatures()
+        return {} if temperatures is None else {'temperatures': temperatures}
+
+    def _collect_pressure(self):
+        pressure = self.pressure_reader.read_pressure()
+        return {} if pressure is None else {'pressure': pressure}
+
+    def _collect_kernel_log(self):
+        kernel_log = self.kernel_log_reader.read_kernel_log()
+        return {} if kernel_log is None else {'kernel_log': kernel_log}
+
+    @staticmethod
+    def _storage_pools_fragment(storage_pools, zfs_arc):
+        fragment = {}
+        if storage_pools:
+            fragment['storage_pools'] = storage_pools
+        if zfs_arc is not None:
+            fragment['zfs_arc'] = zfs_arc
+        return fragment
 
     @staticmethod
     def get_load_average():
@@ -234,6 +623,27 @@ class SystemMetricsReader:
             return self.count_upgradable_packages_synopkg()
         return 0, 0
 
+    async def count_upgradable_packages_async(self):
+        """Asynchronous variant of count_upgradable_packages()"""
+        if shutil.which("apt-get") is not None:
+            command, parse = self.APT_COMMAND, self._parse_apt_output
+        elif shutil.which("synopkg") is not None:
+            command, parse = self.SYNOPKG_COMMAND, self._parse_synopkg_output
+        else:
+            return 0, 0
+
+        try:
+            start_time = time.time()
+            result = await run_process(command)
+            elapsed_time = time.time() - start_time
+            if elapsed_time > 3:
+                logging.debug(f"Process took: {elapsed_time:.3f} seconds")
+            return parse(result.stdout)
+
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+            return 0, 0
+
     @staticmethod
     def count_upgradable_packages_synopkg():
         if shutil.which("synopkg") is None:
@@ -243,25 +653,29 @@ class SystemMetricsReader:
         try:
             # Run the command to simulate upgrade and capture the output
             start_time = time.time()
-            result = subprocess.run(['synopkg', 'checkupdateall'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                    text=True)
+            result = subprocess.run(SystemMetricsReader.SYNOPKG_COMMAND, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, text=True)
             elapsed_time = time.time() - start_time
             if elapsed_time > 3:
                 logging.debug(f"Process took: {elapsed_time:.3f} seconds")
 
-            # Split the output into lines
-            data = json.loads(result.stdout)
-
-            # all packages are security packages on Synology
-            security_count = len(data)
-            non_security_count = 0
-
-            return security_count, non_security_count
+            return SystemMetricsReader._parse_synopkg_output(result.stdout)
 
         except Exception as e:
             logging.error(f"An error occurred: {e}")
             return 0, 0
 
+    @staticmethod
+    def _parse_synopkg_output(output):
+        # Split the output into lines
+        data = json.loads(output)
+
+        # all packages are security packages on Synology
+        security_count = len(data)
+        non_security_count = 0
+
+        return security_count, non_security_count
+
     @staticmethod
     def count_upgradable_packages_apt():
         if shutil.which("apt-get") is None:
@@ -272,7 +686,7 @@ class SystemMetricsReader:
             # Run the command to simulate upgrade and capture the output
             start_time = time.time()
             result = subprocess.run(
-                ['apt-get', '--just-print', 'dist-upgrade'],
+                SystemMetricsReader.APT_COMMAND,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True
@@ -281,27 +695,31 @@ class SystemMetricsReader:
             if elapsed_time > 3:
                 logging.debug(f"Process took: {elapsed_time:.3f} seconds")
 
-            # Split the output into lines
-            lines = result.stdout.strip().split('\n')
+            return SystemMetricsReader._parse_apt_output(result.stdout)
+
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+            return 0, 0
 
-            # Initialize counts
-            security_count = 0
-            non_security_count = 0
+    @staticmethod
+    def _parse_apt_output(output):
+        # Split the output into lines
+        lines = output.strip().split('\n')
 
-            # Regular expression to match package lines
-            package_regex = re.compile(r'^\s*Inst\s+.*')
+        # Initialize counts
+        security_count = 0
+        non_security_count = 0
 
-            for line in lines:
-                match = package_regex.match(line)
-                if match:
-                    # Check if the package has a security upgrade available
-                    if 'security' in line:
-                        security_count += 1
-                    else:
-                        non_security_count += 1
+        # Regular expression to match package lines
+        package_regex = re.compile(r'^\s*Inst\s+.*')
 
-            return security_count, non_security_count
+        for line in lines:
+            match = package_regex.match(line)
+            if match:
+                # Check if the package has a security upgrade available
+                if 'security' in line:
+                    security_count += 1
+                else:
+                    non_security_count += 1
 
-        except Exception as e:
-            logging.error(f"An error occurred: {e}")
-            return 0, 0
+        return security_count, non_security_count
@@ -0,0 +1,60 @@
+import logging
+import os
+import socket
+import time
+
+
+class SystemdNotifier:
+    """
+    Implements the sd_notify protocol of systemd: READY=1 once the agent is up, and WATCHDOG=1 pings while its tick
+    loop makes progress, so that systemd restarts a stalled agent after WatchdogSec. Without NOTIFY_SOCKET, e.g. when
+    not started by systemd with Type=notify, all notifications are ignored.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.address = os.environ.get('NOTIFY_SOCKET')
+        self.socket = None
+        # ping at least twice within WatchdogSec
+        self.watchdog_interval = None
+        self.last_ping = None
+        if not self.address:
+            return
+
+        if self.address.startswith('@'):
+            # abstract namespace
+            self.address = '\0' + self.address[1:]
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+
+        watchdog_usec = os.environ.get('WATCHDOG_USEC')
+        watchdog_pid = os.environ.get('WATCHDOG_PID')
+        if watchdog_usec and watchdog_usec.isdigit() and (not watchdog_pid or int(watchdog_pid) == os.getpid()):
+            self.watchdog_interval = int(watchdog_usec) / 1_000_000 / 2
+            logging.info(f"Enabled systemd watchdog, pinging every {self.watchdog_interval}s")
+
+    def notify(self, state):
+        if self.socket is None:
+            return
+        try:
+            self.socket.sendto(state.encode('utf-8'), self.address)
+        except OSError as e:
+            logging.warning(f"Failed to notify systemd: {e}")
+
+    def ready(self, status=None):
+        self.notify(f"READY=1\nSTATUS={status}" if status else "READY=1")
+        self.last_ping = self.clock()
+
+    def status(self, status):
+        self.notify(f"STATUS={status}")
+
+    def stopping(self):
+        self.notify("STOPPING=1")
+
+    def ping(self):
+        """Pings the watchdog, at most every half watchdog interval, so it can be called on every bit of progress"""
+        if self.watchdog_interval is None:
+            return
+        now = self.clock()
+        if self.last_ping is None or now - self.last_ping >= self.watchdog_interval / 2:
+            self.notify("WATCHDOG=1")
+            self.last_ping = now
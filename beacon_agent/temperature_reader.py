@@ -0,0 +1,139 @@
+import glob
+import logging
+import os
+import re
+
+
+class TemperatureSensor:
+    """A single hwmon temperature sensor with its cached file descriptor and thresholds"""
+
+    def __init__(self, label, input_path, max_celsius):
+        self.label = label
+        self.input_path = input_path
+        self.max_celsius = max_celsius
+        self.fd = os.open(input_path, os.O_RDONLY)
+
+    def read(self):
+        """Returns the temperature in degrees Celsius, or None if the sensor can not be read, e.g. a sleeping disk"""
+        try:
+            return int(os.pread(self.fd, 32, 0)) / 1000
+        except (OSError, ValueError):
+            return None
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class TemperatureReader:
+    """
+    Reads the temperatures of all hwmon sensors, e.g. of the CPU (coretemp, k10temp), NVMe and SATA drives (drivetemp)
+    and the mainboard. The sensors, their labels and hardware limits are discovered once on startup, the input files
+    are kept open and re-read with pread() in one pass on every tick.
+    """
+
+    HWMON = '/sys/class/hwmon'
+    TEMP_INPUT = re.compile(r'^temp(\d+)_input$')
+
+    def __init__(self, config):
+        self.enabled = config.get_config_value(["temperatures", "enabled"], default=False)
+        self.sensors = []
+        if not self.enabled:
+            return
+
+        # a threshold for all sensors, and thresholds per sensor label which take precedence
+        self.max_celsius = config.get_config_value(["temperatures", "max_celsius"], default=0)
+        self.sensor_thresholds = config.get_config_value(["temperatures", "sensors"], default={})
+        # whether to use the crit or max limit reported by the hardware for sensors without a configured threshold
+        self.use_hardware_limits = config.get_config_value(["temperatures", "use_hardware_limits"], default=True)
+
+        self._discover()
+        logging.info(f"Enabled TemperatureReader with {len(self.sensors)} sensors")
+
+    def _discover(self):
+        labels = set()
+        for hwmon_dir in sorted(glob.glob(f'{self.HWMON}/hwmon*')):
+            chip = self._read_file(f'{hwmon_dir}/name') or os.path.basename(hwmon_dir)
+            device = self._device_name(hwmon_dir)
+            for file_name in sorted(os.listdir(hwmon_dir)):
+                match = self.TEMP_INPUT.match(file_name)
+                if not match:
+                    continue
+                prefix = f'{hwmon_dir}/temp{match.group(1)}'
+                label = f"{chip} {self._read_file(f'{prefix}_label') or 'temp' + match.group(1)}"
+                if device:
+                    label = f"{label} ({device})"
+                # several instances of the same chip, e.g. one drivetemp per disk without a block device
+                if label in labels:
+                    label = f"{label} #{os.path.basename(hwmon_dir)}"
+                labels.add(label)
+
+                try:
+                    self.sensors.append(TemperatureSensor(label, f'{prefix}_input', self._threshold(label, prefix)))
+                except OSError as e:
+                    logging.debug(f"Ignoring temperature sensor {label}: {e}")
+
+    def _threshold(self, label, prefix):
+        if label in self.sensor_thresholds:
+            return self.sensor_thresholds[label]
+        if self.max_celsius:
+            return self.max_celsius
+        if self.use_hardware_limits:
+            for limit in ('crit', 'max'):
+                value = self._read_file(f'{prefix}_{limit}')
+                # some drivers report absurd limits, e.g. 255 or 0 if there is none
+                if value and value.lstrip('-').isdigit() and 0 < int(value) < 150000:
+                    return int(value) / 1000
+        return 0
+
+    @staticmethod
+    def _device_name(hwmon_dir):
+        """Returns the name of the block device, e.g. sda for drivetemp, or None"""
+        block_dirs = glob.glob(f'{hwmon_dir}/device/block/*')
+        return os.path.basename(block_dirs[0]) if block_dirs else None
+
+    @staticmethod
+    def _read_file(path):
+        try:
+            with open(path, 'r') as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    def close(self):
+        for sensor in self.sensors:
+            sensor.close()
+        self.sensors = []
+
+    def read_temperatures(self):
+        if not self.enabled or not self.sensors:
+            return None
+
+        sensors = {}
+        thresholds_reached = []
+        for sensor in self.sensors:
+            celsius = sensor.read()
+            if celsius is None:
+                continue
+            sensors[sensor.label] = celsius
+            if sensor.max_celsius and celsius >= sensor.max_celsius:
+                thresholds_reached.append(f"{sensor.label} at {celsius}°C")
+
+        temperatures = {'sensors': sensors, 'max_celsius': max(sensors.values()) if sensors else None}
+        if thresholds_reached:
+            temperatures['thresholds_reached'] = thresholds_reached
+        return temperatures
+
+
+if __name__ == "__main__":
+    import json
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    temperature_reader = TemperatureReader(AgentConfig({"temperatures": {"enabled": True}}))
+    logging.info(json.dumps(temperature_reader.read_temperatures(), indent=2, ensure_ascii=False))
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import random
+import selectors
+import time
+
+
+class TickScheduler:
+    """
+    Fixed-rate scheduler on the monotonic clock. Ticks are aligned to boundaries of start + n * interval, so the
+    collection latency does not add to the period. If a tick overruns, the missed boundaries are skipped instead of
+    being run back to back, and the overrun is counted.
+
+    An optional jitter delays each tick by a random amount of up to jitter_seconds, so that a fleet of agents started
+    at the same time does not push in lockstep. The jitter does not move the boundaries, so it does not accumulate.
+    """
+
+    def __init__(self, interval_seconds, jitter_seconds=0, clock=time.monotonic):
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = min(jitter_seconds, interval_seconds)
+        self.clock = clock
+        self.next_tick = None
+        self.jitter = 0
+        self.tick_count = 0
+        self.overrun_count = 0
+        self.skipped_ticks = 0
+        self.last_overrun_seconds = 0
+        # called at least every heartbeat_seconds while sleeping, e.g. to ping the systemd watchdog
+        self.heartbeat = None
+        self.heartbeat_seconds = None
+
+    def set_heartbeat(self, heartbeat, heartbeat_seconds):
+        self.heartbeat = heartbeat
+        self.heartbeat_seconds = heartbeat_seconds
+
+    def _wait_seconds(self, remaining):
+        """Returns how long to wait at once, which is limited by the heartbeat interval"""
+        if self.heartbeat is not None and self.heartbeat_seconds:
+            return min(remaining, self.heartbeat_seconds)
+        return remaining
+
+    def _beat(self):
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+    def start(self):
+        """Sets the first tick boundary to now, i.e. the first tick is due immediately"""
+        self.next_tick = self.clock()
+        self.jitter = 0
+
+    def next_delay(self):
+        """
+        Returns the number of seconds until the next tick is due. A tick is consumed once its boundary has passed,
+        so calling this early, e.g. after an event triggered an extra refresh, keeps the current boundary.
+        """
+        now = self.clock()
+        if self.next_tick is None:
+            self.next_tick = now
+
+        if now >= self.next_tick:
+            self.tick_count += 1
+            self.next_tick += self.interval_seconds
+            if now >= self.next_tick:
+                missed = int((now - self.next_tick) // self.interval_seconds) + 1
+                self.last_overrun_seconds = round(now - self.next_tick, 3)
+                self.next_tick += missed * self.interval_seconds
+                self.overrun_count += 1
+                self.skipped_ticks += missed
+                logging.warning(f"Tick overran the interval of {self.interval_seconds}s by "
+                                f"{self.last_overrun_seconds}s, skipping {missed} tick(s)")
+            jitter_seconds = min(self.jitter_seconds, self.interval_seconds)
+            self.jitter = random.uniform(0, jitter_seconds) if jitter_seconds > 0 else 0
+
+        return max(0.0, self.next_tick + self.jitter - now)
+
+    def set_interval(self, interval_seconds):
+        """
+        Changes the interval, starting with the current tick: the pending boundary is moved to the previous boundary
+        plus the new interval, or to now if that already passed.
+        """
+        if interval_seconds == self.interval_seconds:
+            return
+        if self.next_tick is not None:
+            self.next_tick = max(self.clock(), self.next_tick - self.interval_seconds + interval_seconds)
+        self.interval_seconds = interval_seconds
+
+    def sleep(self, event_sources=None):
+        """
+        Blocks until the next tick is due, or until one of the optional event sources requests an immediate refresh.
+        An event source has a fileno() and a handle_events() method, which returns the reason for a refresh or None.
+
+        Returns:
+        tuple: The event source and the reason if woken up by an event source, None if the tick is due
+        """
+        delay = self.next_delay()
+        deadline = self.clock() + delay
+        if not event_sources:
+            while True:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return None
+                time.sleep(self._wait_seconds(remaining))
+                self._beat()
+
+        with selectors.DefaultSelector() as selector:
+            for event_source in event_sources:
+                selector.register(event_source, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return None
+                events = selector.select(self._wait_seconds(remaining))
+                self._beat()
+                for key, _ in events:
+                    reason = key.fileobj.handle_events()
+                    if reason:
+                        return key.fileobj, reason
+
+    async def sleep_async(self, wake_event=None):
+        """
+        Waits until the next tick is due, or until the optional wake_event is set.
+
+        Returns:
+        bool: True if woken up by the event, False if the tick is due
+        """
+        delay = self.next_delay()
+        deadline = self.clock() + delay
+        try:
+            while True:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return False
+                if wake_event is None:
+                    await asyncio.sleep(self._wait_seconds(remaining))
+                else:
+                    try:
+                        await asyncio.wait_for(wake_event.wait(), self._wait_seconds(remaining))
+                        return True
+                    except asyncio.TimeoutError:
+                        pass
+                self._beat()
+        finally:
+            if wake_event is not None:
+                wake_event.clear()
+
+    def get_stats(self):
+        return {
+            'interval_seconds': self.interval_seconds,
+            'jitter_seconds': self.jitter_seconds,
+            'tick_count': self.tick_count,
+            'overrun_count': self.overrun_count,
+            'skipped_ticks': self.skipped_ticks,
+            'last_overrun_seconds': self.last_overrun_seconds
+        }
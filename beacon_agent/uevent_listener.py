@@ -0,0 +1,136 @@
+import logging
+import re
+import socket
+
+NETLINK_KOBJECT_UEVENT = 15
+# the multicast group of the kernel, udev re-broadcasts on group 2
+KERNEL_UEVENT_GROUP = 1
+
+
+class UeventListener:
+    """
+    Listens on the kernel uevent netlink socket for disks being added, removed or changed. The affected devices are
+    queued, so that only those need to be read by the S.M.A.R.T. reader, and an immediate refresh of the smart and
+    disk_inventory collectors is requested.
+
+    Messages can also be fed with handle_message(), e.g. to test with synthetic uevents.
+    """
+
+    ACTIONS = ('add', 'remove', 'change')
+    IGNORED_PREFIXES = ('loop', 'ram', 'zram', 'dm-', 'md', 'sr', 'fd', 'nbd')
+    NVME_NAMESPACE = re.compile(r'^(nvme[0-9]+)n[0-9]+$')
+
+    # the collectors to refresh on an event, and the new state is pushed immediately
+    refresh_collectors = ['smart', 'disk_inventory']
+    push_immediately = True
+
+    def __init__(self, config):
+        self.enabled = (config.get_config_value(["smartctl", "enabled"], default=False) and
+                        config.get_config_value(["smartctl", "hotplug"], default=True))
+        self.socket = None
+        # list of (action, device path), in the order of the events
+        self.pending_devices = []
+        if not self.enabled:
+            return
+
+        try:
+            self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK,
+                                        NETLINK_KOBJECT_UEVENT)
+            self.socket.bind((0, KERNEL_UEVENT_GROUP))
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Failed to listen for uevents, disk hot-plug is only noticed on the next tick: {e}")
+            self.socket = None
+            self.enabled = False
+            return
+
+        logging.info("Enabled UeventListener")
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def handle_events(self):
+        """
+        Reads all pending uevents.
+
+        Returns:
+        str: The reason for an immediate refresh if a disk was added, removed or changed, or None
+        """
+        reason = None
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except BlockingIOError:
+                return reason
+            except OSError as e:
+                logging.warning(f"Failed to read uevents: {e}")
+                return reason
+
+            reason = self.handle_message(data) or reason
+
+    def handle_message(self, data):
+        """
+        Parses a single uevent message and queues the device if it is a disk.
+
+        Returns:
+        str: The reason for an immediate refresh, or None if the event is not relevant
+        """
+        event = self.parse_uevent(data)
+        if event is None or event.get('SUBSYSTEM') != 'block' or event.get('DEVTYPE') != 'disk':
+            return None
+
+        action = event.get('ACTION')
+        name = event.get('DEVNAME', '').rsplit('/', 1)[-1]
+        if action not in self.ACTIONS or not name or name.startswith(self.IGNORED_PREFIXES):
+            return None
+
+        # S.M.A.R.T. of NVMe drives is read from the controller, not the namespace
+        match = self.NVME_NAMESPACE.match(name)
+        device = f"/dev/{match.group(1) if match else name}"
+        if (action, device) not in self.pending_devices:
+            self.pending_devices.append((action, device))
+        return f"Disk {device} {action}"
+
+    @staticmethod
+    def parse_uevent(data):
+        """
+        Parses a kernel uevent of the form "add@/devices/...\\0ACTION=add\\0SUBSYSTEM=block\\0..." into a dictionary
+        of its properties. Returns None for messages which are not kernel uevents, e.g. from libudev.
+        """
+        parts = data.split(b'\0')
+        if not parts or b'@' not in parts[0]:
+            return None
+
+        event = {}
+        for part in parts[1:]:
+            key, separator, value = part.partition(b'=')
+            if separator:
+                event[key.decode(errors='replace')] = value.decode(errors='replace')
+        return event
+
+    def take_pending_devices(self):
+        pending_devices = self.pending_devices
+        self.pending_devices = []
+        return pending_devices
+
+
+if __name__ == "__main__":
+    import selectors
+    from .custom_logging import CustomLogging
+    from .agent_config import AgentConfig
+
+    custom_logging = CustomLogging()
+    custom_logging.configure_logging()
+
+    listener = UeventListener(AgentConfig({"smartctl": {"enabled": True}}))
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    while True:
+        selector.select()
+        event_reason = listener.handle_events()
+        if event_reason:
+            logging.info(f"{event_reason}: {listener.take_pending_devices()}")
@@ -7,22 +7,104 @@
 #
 
 import argparse
+import json
 import logging
+import os
+import sys
 
 from beacon_agent.agent import BeaconAgent
+from beacon_agent.agent_config import AgentConfig
+from beacon_agent.custom_logging import CustomLogging
+from beacon_agent.disk_inventory import DiskInventory
+from beacon_agent.relay import Relay
+from beacon_agent.status_server import query_status, format_status
+from beacon_agent.system_metrics_reader import SystemMetricsReader
+
+
+def status(config_file, collector, as_json):
+    """Prints the status of the running agent, read from its status socket"""
+    socket_path = '/run/beacon-agent/status.sock'
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as file:
+            config = AgentConfig(json.load(file))
+        socket_path = config.get_config_value(['agent', 'status_socket'], default=socket_path)
+
+    try:
+        agent_status = query_status(socket_path, collector)
+    except OSError as e:
+        print(f"Failed to query the agent on {socket_path}, is it running? {e}", file=sys.stderr)
+        return 2
+
+    print(json.dumps(agent_status, indent=2) if as_json else format_status(agent_status))
+    return 1 if 'error' in agent_status else 0
+
+
+def acknowledge_disks(config_file):
+    """Accepts the currently present disks as the baseline of the disk inventory of the running agent"""
+    CustomLogging().configure_logging(level='WARNING')
+    disk_inventory = DiskInventory(BeaconAgent.load_config(config_file))
+    if not disk_inventory.enabled:
+        print("The disk inventory is not enabled", file=sys.stderr)
+        return 1
+
+    removed = disk_inventory.acknowledge()
+    print(f"Acknowledged {len(removed)} removed disks{': ' + ', '.join(removed) if removed else ''}, "
+          f"{len(disk_inventory.baseline)} disks in the inventory")
+    return 0
 
 
 def main():
     parser = argparse.ArgumentParser(description="Specify config file using -f")
     parser.add_argument('-f', '--file', type=str, default='/etc/beacon-agent/config.json',
                         help='Path to the config file')
+    parser.add_argument('--relay', action='store_true',
+                        help='Run as relay, forwarding the pushes of other agents to UptimeKuma')
+    parser.add_argument('--once', action='store_true',
+                        help='Run the collectors once, print the result and exit with 0 OK, 1 WARNING, 2 CRITICAL or '
+                             '3 UNKNOWN, e.g. for cron or Nagios')
+    parser.add_argument('--collectors', type=str,
+                        help=f"Comma separated collectors to run with --once, of: "
+                             f"{', '.join(SystemMetricsReader.COLLECTORS)}")
+    parser.add_argument('--format', type=str, choices=['json', 'nagios'], default='json',
+                        help='Output format of --once')
+    parser.add_argument('--push', action='store_true', help='Also push the result of --once to the api_url')
+    commands = parser.add_subparsers(dest='command')
+    status_parser = commands.add_parser('status', help='Show the status of the running agent')
+    status_parser.add_argument('--json', action='store_true', help='Print the status as JSON')
+    status_parser.add_argument('--collector', type=str, help='Show only the metrics of the given collector')
+    commands.add_parser('acknowledge-disks',
+                        help='Accept the present disks as the disk inventory, after a disk was removed on purpose')
     args = parser.parse_args()
 
     config_file = args.file
-    agent = BeaconAgent(config_file=config_file)
+    if args.command == 'status':
+        sys.exit(status(config_file, args.collector, args.json))
+    if args.command == 'acknowledge-disks':
+        sys.exit(acknowledge_disks(config_file))
+
+    if args.once:
+        collectors = None
+        if args.collectors:
+            collectors = [name.strip() for name in args.collectors.split(',') if name.strip()]
+            unknown = [name for name in collectors if name not in SystemMetricsReader.COLLECTORS]
+            if unknown:
+                print(f"Unknown collectors: {', '.join(unknown)}", file=sys.stderr)
+                sys.exit(3)
+        # only warnings and errors on stderr, so that the output can be parsed, and the state files of the daemon are
+        # left alone
+        agent = BeaconAgent(config_file=config_file, collectors=collectors, log_level='WARNING', read_only_state=True)
+        sys.exit(agent.run_once(collectors, args.format, args.push))
 
     try:
-        agent.monitor_system()
+        if args.relay:
+            custom_logging = CustomLogging()
+            custom_logging.configure_logging()
+            config = BeaconAgent.load_config(config_file)
+            custom_logging.configure_logging(config)
+            Relay(config).run()
+        else:
+            agent = BeaconAgent(config_file=config_file)
+            agent.run()
     except KeyboardInterrupt:
         logging.info("\nMonitoring interrupted. Exiting gracefully...")
 